@@ -8,12 +8,47 @@ Esta aplicación proporciona una interfaz web intuitiva para:
 """
 
 import os
+import re
+import time
+import uuid
 from typing import Optional
 import streamlit as st
 from dotenv import load_dotenv
 
-from services.ai_service import WritingAssistant
-from utils.storage_mock import save_draft_to_db
+from services.ai_service import TextStream, WritingAssistant
+from services.chunking import split_paragraphs
+from services.governor import METRIC_LABELS, format_window, get_governor
+from services.incremental import ParagraphHistory
+from services.jobs import (CANCELLED, DONE, FAILED, JOB_RESULT_KEYS, QUEUED, RUNNING,
+                           JobLimitError, get_job_manager)
+from utils.storage import (diff_document_versions, get_document_version, list_documents,
+                           list_versions, load_drafts, save_document_version, search_drafts)
+
+
+# A partir de este tamaño, la corrección y la mejora de estilo se procesan por fragmentos.
+LONG_DOCUMENT_CHARS = 6000
+
+# Parámetro de la URL que conserva el identificador anónimo entre recargas.
+ANONYMOUS_ID_PARAM = "uid"
+ANONYMOUS_ID = re.compile(r"[0-9a-f]{32}")
+
+# Segundos entre consultas del estado de los trabajos en segundo plano.
+JOB_POLL_SECONDS = 2
+
+JOB_STATUS_LABELS = {
+    QUEUED: "🕒 En cola",
+    RUNNING: "⏳ En curso",
+    DONE: "✅ Terminado",
+    FAILED: "❌ Fallido",
+    CANCELLED: "⏹️ Cancelado"
+}
+
+JOB_OPERATION_LABELS = {
+    'fix_grammar': "Corrección",
+    'improve_style': "Estilo",
+    'generate_content': "Generación",
+    'pipeline': "Corrección y estilo"
+}
 
 
 # Cargar variables de entorno desde .env
@@ -30,6 +65,52 @@ def initialize_session_state() -> None:
         st.session_state.current_result = None
     if 'original_text' not in st.session_state:
         st.session_state.original_text = ""
+    if 'paragraph_histories' not in st.session_state:
+        st.session_state.paragraph_histories = {}
+    if 'document_id' not in st.session_state:
+        st.session_state.document_id = None
+    if 'tone_results' not in st.session_state:
+        st.session_state.tone_results = None
+
+
+def get_user_id() -> str:
+    """
+    Devuelve el identificador del usuario de la sesión.
+    
+    Si la aplicación tiene inicio de sesión (st.login) se usa la identidad del
+    usuario. Si no, un identificador anónimo que se guarda en la URL (?uid=...),
+    de modo que recargar la página o abrir el mismo enlace en otra pestaña
+    conserva los borradores, los trabajos y el consumo del usuario.
+    
+    Returns:
+        Identificador del usuario.
+    """
+    if st.user.get('is_logged_in'):
+        identity = st.user.get('email') or st.user.get('sub')
+        if identity:
+            return str(identity)
+    anonymous_id = st.query_params.get(ANONYMOUS_ID_PARAM, "")
+    if not ANONYMOUS_ID.fullmatch(anonymous_id):
+        anonymous_id = uuid.uuid4().hex
+        st.query_params[ANONYMOUS_ID_PARAM] = anonymous_id
+    return f"anonimo-{anonymous_id}"
+
+
+@st.cache_resource(show_spinner=False, ttl=3600, max_entries=32)
+def get_assistant(api_key: str) -> WritingAssistant:
+    """
+    Devuelve un WritingAssistant compartido entre reejecuciones y sesiones.
+    
+    El modelo y su conexión se obtienen del registro de clientes del proceso,
+    aislado por clave API.
+    
+    Args:
+        api_key: Clave API de Google Gemini.
+        
+    Returns:
+        Instancia de WritingAssistant reutilizable.
+    """
+    return WritingAssistant(api_key)
 
 
 def get_openai_api_key() -> Optional[str]:
@@ -48,10 +129,13 @@ def get_openai_api_key() -> Optional[str]:
     return api_key if api_key else os.getenv("GOOGLE_API_KEY")
 
 
-def render_sidebar() -> tuple[str, Optional[str]]:
+def render_sidebar(user_id: str) -> tuple[str, Optional[str]]:
     """
     Renderiza la barra lateral con opciones de configuración.
     
+    Args:
+        user_id: Identificador del usuario de la sesión.
+    
     Returns:
         Tupla con (modo_seleccionado, api_key).
     """
@@ -64,11 +148,12 @@ def render_sidebar() -> tuple[str, Optional[str]]:
     
     mode = st.sidebar.radio(
         "¿Qué deseas hacer?",
-        options=["Corregir Gramática", "Mejorar Estilo", "Generar Contenido"],
+        options=["Corregir Gramática", "Mejorar Estilo", "Corregir y Mejorar Estilo",
+                 "Generar Contenido"],
         help="Selecciona la funcionalidad que necesitas"
     )
     
-    if mode == "Mejorar Estilo":
+    if mode in ("Mejorar Estilo", "Corregir y Mejorar Estilo"):
         tone = st.sidebar.selectbox(
             "Elige el tono deseado:",
             options=["Formal", "Creativo", "Casual"],
@@ -76,55 +161,498 @@ def render_sidebar() -> tuple[str, Optional[str]]:
         )
         st.session_state.tone = tone
     
+    st.session_state.run_in_background = mode == "Generar Contenido" and st.sidebar.checkbox(
+        "🕒 Generar en segundo plano",
+        value=False,
+        help="Envía la generación como trabajo, que sigue aunque recargues la página"
+    )
+    
+    st.session_state.compare_tones = mode == "Mejorar Estilo" and st.sidebar.checkbox(
+        "🎭 Comparar los tres tonos",
+        value=False,
+        help="Genera las versiones Formal, Creativa y Casual a la vez y las muestra lado a lado"
+    )
+    
+    render_drafts(user_id)
+    
+    st.sidebar.markdown("---")
+    st.session_state.bypass_cache = st.sidebar.checkbox(
+        "♻️ Ignorar caché",
+        value=False,
+        help="Fuerza una nueva consulta al modelo aunque el texto ya se haya procesado"
+    )
+    
     return mode, api_key
 
 
-def process_text(assistant: WritingAssistant, mode: str, user_text: str) -> None:
+def render_drafts(user_id: str) -> None:
+    """
+    Muestra en la barra lateral la búsqueda de borradores (o los últimos
+    guardados) y las versiones del documento abierto.
+    
+    Args:
+        user_id: Identificador del usuario.
+    """
+    st.sidebar.markdown("---")
+    with st.sidebar.expander("📂 Mis borradores"):
+        query = st.text_input("🔎 Buscar en borradores", key="draft_search",
+                              placeholder="Palabras clave...")
+        if query.strip():
+            render_search_results(user_id, query)
+        else:
+            render_recent_drafts(user_id)
+    
+    if st.session_state.document_id is not None:
+        render_versions(user_id, st.session_state.document_id)
+
+
+def render_recent_drafts(user_id: str) -> None:
+    """
+    Muestra los últimos documentos y borradores guardados.
+    
+    Args:
+        user_id: Identificador del usuario.
+    """
+    documents = list_documents(user_id, limit=5)
+    # Borradores guardados antes de que existieran las versiones.
+    drafts = load_drafts(user_id, limit=5)
+    if not documents and not drafts:
+        st.caption("Aún no has guardado borradores.")
+    for document in documents:
+        label = f"{document['title']} (v{document['version']})"
+        if st.button(label, key=f"document_{document['id']}", use_container_width=True):
+            st.session_state.current_result = document['text']
+            st.session_state.document_id = document['id']
+    if drafts and documents:
+        st.caption("Borradores anteriores")
+    for draft in drafts:
+        preview = draft['text'][:40] + ("..." if len(draft['text']) > 40 else "")
+        if st.button(preview, key=f"draft_{draft['id']}", use_container_width=True):
+            st.session_state.current_result = draft['text']
+            st.session_state.document_id = None
+
+
+def render_search_results(user_id: str, query: str) -> None:
+    """
+    Muestra los borradores que coinciden con una búsqueda.
+    
+    Args:
+        user_id: Identificador del usuario.
+        query: Palabras clave.
+    """
+    results = search_drafts(user_id, query, limit=10)
+    if not results:
+        st.caption("Ningún borrador coincide con la búsqueda.")
+    for result in results:
+        if st.button(result['title'], key=f"search_{result['source']}_{result['id']}",
+                     use_container_width=True):
+            st.session_state.current_result = result['text']
+            st.session_state.document_id = (result['id'] if result['source'] == 'document'
+                                            else None)
+        st.caption(result['snippet'])
+
+
+def render_versions(user_id: str, document_id: int) -> None:
+    """
+    Muestra las versiones de un documento y la diferencia entre dos de ellas.
+    
+    Args:
+        user_id: Identificador del usuario.
+        document_id: Documento abierto.
+    """
+    versions = list_versions(user_id, document_id)
+    if not versions:
+        return
+    with st.sidebar.expander(f"🕘 Versiones ({len(versions)})"):
+        for version in versions[:10]:
+            label = (f"v{version['version']} · "
+                     f"{time.strftime('%d/%m %H:%M', time.localtime(version['created_at']))} · "
+                     f"{version['chars']} caracteres")
+            if st.button(label, key=f"version_{document_id}_{version['version']}",
+                         use_container_width=True):
+                st.session_state.current_result = get_document_version(
+                    user_id, document_id, version['version'])
+        
+        if len(versions) > 1:
+            numbers = [version['version'] for version in versions]
+            old_version = st.selectbox("Comparar desde", numbers[1:],
+                                       format_func=lambda n: f"v{n}",
+                                       key=f"diff_from_{document_id}")
+            new_version = st.selectbox("hasta", numbers[:numbers.index(old_version)],
+                                       format_func=lambda n: f"v{n}",
+                                       key=f"diff_to_{document_id}")
+            diff = diff_document_versions(user_id, document_id, old_version, new_version)
+            st.code(diff or "Sin cambios", language='diff')
+
+
+def process_text(assistant: WritingAssistant, mode: str, user_text: str, user_id: str) -> None:
     """
     Procesa el texto del usuario según el modo seleccionado.
     
+    El resultado se muestra progresivamente a medida que el modelo lo genera.
+    Los documentos largos, y la generación de contenido si el usuario lo pide,
+    se envían como trabajos en segundo plano, que sobreviven a las
+    reejecuciones del script.
+    
     Args:
         assistant: Instancia de WritingAssistant.
         mode: Modo de procesamiento seleccionado.
         user_text: Texto proporcionado por el usuario.
+        user_id: Identificador del usuario, dueño de los trabajos que se envíen.
+    """
+    bypass_cache = st.session_state.get('bypass_cache', False)
+    st.session_state.tone_results = None
+    
+    if mode == "Corregir y Mejorar Estilo":
+        process_pipeline(assistant, user_text, bypass_cache)
+        return
+    
+    if mode == "Generar Contenido":
+        if st.session_state.get('run_in_background') or len(user_text) > LONG_DOCUMENT_CHARS:
+            submit_job(assistant, user_id, 'generate_content', user_text,
+                       bypass_cache=bypass_cache)
+        else:
+            render_stream(assistant.generate_content_stream(user_text,
+                                                            bypass_cache=bypass_cache))
+        return
+    
+    if (mode == "Mejorar Estilo" and st.session_state.get('compare_tones')
+            and len(user_text) <= LONG_DOCUMENT_CHARS):
+        process_all_tones(assistant, user_text, bypass_cache)
+        return
+    
+    # Primero la longitud total: un documento largo de muchos párrafos no debe
+    # procesarse en la sesión con una llamada por párrafo.
+    if len(user_text) > LONG_DOCUMENT_CHARS:
+        process_long_text(assistant, user_id, mode, user_text, bypass_cache)
+        return
+    if len(split_paragraphs(user_text.strip())) > 1:
+        process_incremental(assistant, mode, user_text, bypass_cache)
+        return
+    
+    if mode == "Corregir Gramática":
+        stream = assistant.fix_grammar_stream(user_text, bypass_cache=bypass_cache)
+    elif mode == "Mejorar Estilo":
+        tone = st.session_state.get('tone', 'Formal')
+        stream = assistant.improve_style_stream(user_text, tone, bypass_cache=bypass_cache)
+    else:
+        return
+    render_stream(stream)
+
+
+def render_stream(stream: TextStream) -> None:
+    """
+    Muestra una respuesta en streaming a medida que llega y guarda el resultado.
+    
+    Args:
+        stream: Respuesta en streaming del asistente.
     """
+    placeholder = st.empty()
+    received = ""
     with st.spinner("⏳ Procesando tu texto..."):
+        for chunk in stream:
+            received += chunk
+            placeholder.markdown(received + "▌")
+    
+    result = stream.result
+    if result['success']:
+        placeholder.empty()
+        st.session_state.current_result = result[stream.result_key]
+    elif result.get('partial'):
+        placeholder.markdown(result[stream.result_key])
+        st.error(f"❌ {result['error']}")
+    else:
+        placeholder.empty()
+        st.error(f"❌ Error: {result['error']}")
+
+
+def process_pipeline(assistant: WritingAssistant, user_text: str, bypass_cache: bool = False) -> None:
+    """
+    Corrige la gramática y mejora el estilo con una sola llamada al modelo.
+    
+    Muestra la latencia ahorrada frente a ejecutar ambas operaciones por separado.
+    
+    Args:
+        assistant: Instancia de WritingAssistant.
+        user_text: Texto proporcionado por el usuario.
+        bypass_cache: Si es True, ignora la caché de respuestas.
+    """
+    tone = st.session_state.get('tone', 'Formal')
+    with st.spinner("⏳ Corrigiendo y mejorando el estilo..."):
+        result = assistant.run_pipeline(user_text, ['grammar', f'style:{tone}'],
+                                        bypass_cache=bypass_cache)
+    
+    if not result['success']:
+        st.error(f"❌ Error: {result['error']}")
+        return
+    
+    st.session_state.current_result = result['final_text']
+    with st.expander("🔍 Texto corregido (paso intermedio)"):
+        st.write(result['steps'][0]['text'])
+    
+    elapsed = result['elapsed_seconds']
+    saved = result['saved_seconds']
+    if not result['fused']:
+        st.caption(f"⚠️ Respuesta combinada no válida; se ejecutaron los pasos por separado "
+                   f"({elapsed:.1f} s)")
+    elif saved is not None:
+        st.caption(f"⚡ Una sola llamada en {elapsed:.1f} s; "
+                   f"unos {saved:.1f} s menos que en dos pasos")
+    else:
+        st.caption(f"⚡ Una sola llamada en {elapsed:.1f} s")
+
+
+def process_all_tones(
+    assistant: WritingAssistant,
+    user_text: str,
+    bypass_cache: bool = False
+) -> None:
+    """
+    Mejora el estilo en todos los tonos a la vez para compararlos.
+    
+    Los resultados se guardan en la sesión y los muestra render_tone_results.
+    
+    Args:
+        assistant: Instancia de WritingAssistant.
+        user_text: Texto proporcionado por el usuario.
+        bypass_cache: Si es True, ignora la caché de respuestas.
+    """
+    start = time.perf_counter()
+    with st.spinner("⏳ Generando los tres tonos..."):
+        result = assistant.improve_style_all(user_text, bypass_cache=bypass_cache)
+    elapsed = time.perf_counter() - start
+    
+    if not result['success']:
+        st.error(f"❌ Error: {result['error']}")
+        return
+    
+    st.session_state.tone_results = result['results']
+    st.caption(f"⚡ {len(result['results'])} tonos en paralelo en {elapsed:.1f} s")
+
+
+def render_tone_results() -> None:
+    """
+    Muestra lado a lado las versiones de cada tono.
+    
+    El botón de cada columna elige esa versión como resultado.
+    """
+    results = st.session_state.get('tone_results')
+    if not results:
+        return
+    
+    st.markdown("---")
+    st.subheader("🎭 Comparación de tonos")
+    for column, (tone, result) in zip(st.columns(len(results)), results.items()):
+        with column:
+            st.markdown(f"**{tone}**")
+            if not result['success']:
+                st.error(f"❌ {result['error']}")
+                continue
+            st.text_area(
+                f"Versión {tone}:",
+                value=result['improved_text'],
+                height=200,
+                disabled=True,
+                label_visibility="collapsed"
+            )
+            if st.button("✅ Usar esta versión", key=f"use_tone_{tone}",
+                         use_container_width=True):
+                st.session_state.current_result = result['improved_text']
+                st.rerun()
+
+
+def process_incremental(
+    assistant: WritingAssistant,
+    mode: str,
+    user_text: str,
+    bypass_cache: bool = False
+) -> None:
+    """
+    Procesa un texto de varios párrafos reenviando solo los que cambiaron.
+    
+    El historial de párrafos se guarda en la sesión por operación y tono.
+    
+    Args:
+        assistant: Instancia de WritingAssistant.
+        mode: "Corregir Gramática" o "Mejorar Estilo".
+        user_text: Texto proporcionado por el usuario.
+        bypass_cache: Si es True, recalcula todos los párrafos.
+    """
+    histories = st.session_state.paragraph_histories
+    
+    with st.spinner("⏳ Procesando párrafos modificados..."):
         if mode == "Corregir Gramática":
-            result = assistant.fix_grammar(user_text)
-            if result['success']:
-                st.session_state.current_result = result['corrected_text']
-            else:
-                st.error(f"❌ Error: {result['error']}")
-        
-        elif mode == "Mejorar Estilo":
+            history = histories.setdefault(('fix_grammar', None), ParagraphHistory())
+            result = assistant.fix_grammar(user_text, bypass_cache=bypass_cache,
+                                           history=history)
+            result_key = 'corrected_text'
+        else:
             tone = st.session_state.get('tone', 'Formal')
-            result = assistant.improve_style(user_text, tone)
-            if result['success']:
-                st.session_state.current_result = result['improved_text']
-            else:
-                st.error(f"❌ Error: {result['error']}")
+            history = histories.setdefault(('improve_style', tone), ParagraphHistory())
+            result = assistant.improve_style(user_text, tone, bypass_cache=bypass_cache,
+                                             history=history)
+            result_key = 'improved_text'
+    
+    if result['success']:
+        st.session_state.current_result = result[result_key]
+        st.caption(
+            f"♻️ {result['reused_paragraphs']} párrafos reutilizados, "
+            f"{result['recomputed_paragraphs']} recalculados"
+        )
+    else:
+        st.error(f"❌ Error: {result['error']}")
+
+
+def process_long_text(
+    assistant: WritingAssistant,
+    user_id: str,
+    mode: str,
+    user_text: str,
+    bypass_cache: bool = False
+) -> None:
+    """
+    Envía un documento largo como trabajo en segundo plano.
+    
+    El trabajo lo procesa por fragmentos en paralelo y muestra el progreso
+    en el panel de trabajos.
+    
+    Args:
+        assistant: Instancia de WritingAssistant.
+        user_id: Identificador del usuario.
+        mode: "Corregir Gramática" o "Mejorar Estilo".
+        user_text: Texto proporcionado por el usuario.
+        bypass_cache: Si es True, ignora la caché de respuestas.
+    """
+    if mode == "Corregir Gramática":
+        submit_job(assistant, user_id, 'fix_grammar', user_text, bypass_cache=bypass_cache)
+    else:
+        submit_job(assistant, user_id, 'improve_style', user_text,
+                   tone=st.session_state.get('tone', 'Formal'), bypass_cache=bypass_cache)
+
+
+def submit_job(
+    assistant: WritingAssistant,
+    user_id: str,
+    operation: str,
+    user_text: str,
+    tone: Optional[str] = None,
+    bypass_cache: bool = False
+) -> None:
+    """
+    Envía una operación como trabajo en segundo plano.
+    
+    Args:
+        assistant: Instancia de WritingAssistant.
+        user_id: Identificador del usuario, dueño del trabajo.
+        operation: Operación del trabajo.
+        user_text: Texto o tema proporcionado por el usuario.
+        tone: Tono deseado, si la operación lo usa.
+        bypass_cache: Si es True, ignora la caché de respuestas.
+    """
+    try:
+        get_job_manager().submit(assistant, user_id, operation, user_text, tone=tone,
+                                 bypass_cache=bypass_cache)
+    except JobLimitError as e:
+        st.warning(f"⚠️ {e}")
+        return
+    st.info("🕒 Trabajo enviado: puedes seguir usando la aplicación mientras se procesa")
+
+
+def render_jobs(user_id: str) -> None:
+    """
+    Muestra los trabajos en segundo plano del usuario.
+    
+    Mientras haya trabajos pendientes, el panel se actualiza solo cada
+    JOB_POLL_SECONDS segundos sin volver a ejecutar el resto del script.
+    
+    Args:
+        user_id: Identificador del usuario.
+    """
+    manager = get_job_manager()
+    pending = any(job['status'] in (QUEUED, RUNNING) for job in manager.list_jobs(user_id))
+    
+    @st.fragment(run_every=JOB_POLL_SECONDS if pending else None)
+    def jobs_panel() -> None:
+        jobs = manager.list_jobs(user_id)
+        if not jobs:
+            return
+        if any(job['status'] in (QUEUED, RUNNING) for job in jobs) != pending:
+            # Un trabajo empezó o terminó: se reprograma la frecuencia de consulta.
+            st.rerun()
         
-        elif mode == "Generar Contenido":
-            result = assistant.generate_content(user_text)
-            if result['success']:
-                st.session_state.current_result = result['generated_text']
-            else:
-                st.error(f"❌ Error: {result['error']}")
+        st.markdown("---")
+        st.subheader("🗂️ Trabajos en segundo plano")
+        for job in jobs:
+            preview = job['input'][:60] + ("..." if len(job['input']) > 60 else "")
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.markdown(f"**{JOB_STATUS_LABELS[job['status']]}** · "
+                            f"{JOB_OPERATION_LABELS.get(job['operation'], job['operation'])} · "
+                            f"{preview}")
+                if job['status'] == RUNNING:
+                    st.progress(job['progress'])
+                elif job['status'] == FAILED and job['error']:
+                    st.caption(job['error'])
+            with col2:
+                if job['status'] in (QUEUED, RUNNING):
+                    if st.button("Cancelar", key=f"cancel_{job['id']}"):
+                        manager.cancel(job['id'], user_id)
+                        st.rerun()
+                elif job['status'] == DONE and job['result']:
+                    if st.button("Ver resultado", key=f"show_{job['id']}"):
+                        st.session_state.current_result = (
+                            job['result'][JOB_RESULT_KEYS[job['operation']]])
+                        st.rerun(scope='app')
+    
+    jobs_panel()
 
 
-def save_draft(user_id: str = "usuario_anonimo") -> None:
+def render_usage(user_id: str) -> None:
     """
-    Guarda el borrador actual en la base de datos simulada.
+    Muestra en la barra lateral el consumo reciente del usuario y sus límites.
     
     Args:
-        user_id: Identificador del usuario (por defecto: anónimo).
+        user_id: Identificador del usuario.
+    """
+    usage = get_governor().usage(user_id)
+    with st.sidebar.expander("📊 Tu consumo"):
+        st.caption(
+            f"Ventana de {format_window(usage['window_seconds'])}: {usage['requests']} peticiones, "
+            f"{usage['input_tokens']} tokens de entrada y {usage['output_tokens']} de salida"
+        )
+        for limit in usage['limits']:
+            st.progress(
+                min(1.0, limit['used'] / limit['limit']),
+                text=(f"{limit['used']} / {limit['limit']} {METRIC_LABELS[limit['metric']]} "
+                      f"cada {format_window(limit['window_seconds'])}")
+            )
+        if usage['rejected']:
+            st.caption(f"⛔ {usage['rejected']} peticiones rechazadas por superar un límite")
+
+
+def save_draft(user_id: str) -> None:
+    """
+    Guarda el borrador actual como nueva versión del documento abierto.
+    
+    Si no hay ningún documento abierto se crea uno nuevo. La versión la
+    escribe el hilo escritor del almacén; aquí solo se espera a que se
+    confirme para mostrar su número.
+    
+    Args:
+        user_id: Identificador del usuario.
     """
     if st.session_state.current_result:
-        success = save_draft_to_db(user_id, st.session_state.current_result)
-        if success:
-            st.success("✅ Borrador guardado en la BD simulada")
+        try:
+            saved = save_document_version(user_id, st.session_state.current_result,
+                                          st.session_state.document_id)
+        except Exception as e:
+            st.error(f"❌ Error al guardar el borrador: {str(e)}")
+            return
+        st.session_state.document_id = saved['document_id']
+        if saved['unchanged']:
+            st.info(f"ℹ️ Sin cambios desde la versión {saved['version']}")
         else:
-            st.error("❌ Error al guardar el borrador")
+            st.success(f"✅ Borrador guardado (versión {saved['version']})")
     else:
         st.warning("⚠️ No hay contenido para guardar. Procesa un texto primero.")
 
@@ -143,9 +671,10 @@ def main() -> None:
     
     # Inicializar sesión
     initialize_session_state()
+    user_id = get_user_id()
     
     # Renderizar barra lateral
-    mode, api_key = render_sidebar()
+    mode, api_key = render_sidebar(user_id)
     
     # Contenido principal
     st.title("✍️ Asistente de Escritura Automática")
@@ -162,8 +691,8 @@ def main() -> None:
         )
         st.stop()
     
-    # Crear instancia de WritingAssistant
-    assistant = WritingAssistant(api_key)
+    # Obtener instancia compartida de WritingAssistant (con el consumo cargado al usuario)
+    assistant = get_assistant(api_key).for_user(user_id)
     
     # Área de entrada de usuario
     st.subheader(f"📝 {mode}")
@@ -192,20 +721,25 @@ def main() -> None:
         if st.button("🚀 Procesar", use_container_width=True):
             if user_input.strip():
                 st.session_state.original_text = user_input
-                process_text(assistant, mode, user_input)
+                process_text(assistant, mode, user_input, user_id)
             else:
                 st.warning("⚠️ Por favor, ingresa algo para procesar.")
     
     with col2:
         if st.button("💾 Guardar Borrador", use_container_width=True):
-            save_draft()
+            save_draft(user_id)
     
     with col3:
         if st.button("🔄 Limpiar", use_container_width=True):
             st.session_state.current_result = None
             st.session_state.original_text = ""
+            st.session_state.document_id = None
+            st.session_state.tone_results = None
             st.rerun()
     
+    render_jobs(user_id)
+    render_tone_results()
+    
     # Mostrar resultados
     if st.session_state.current_result:
         st.markdown("---")
@@ -227,6 +761,9 @@ def main() -> None:
                 st.write(st.session_state.current_result)
                 st.write("```")
                 st.info("Selecciona el texto y cópialo manualmente")
+    
+    # Al final, para que incluya las llamadas de esta ejecución
+    render_usage(user_id)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,3 @@
+"""
+Módulo benchmarks - Pruebas de rendimiento sin red contra un modelo simulado.
+"""
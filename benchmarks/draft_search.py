@@ -0,0 +1,99 @@
+"""
+Benchmark de la búsqueda de borradores.
+
+Crea una base de datos temporal con borradores sintéticos repartidos entre
+varios usuarios y mide la latencia (p50/p95/p99) de search_drafts con
+consultas de una y varias palabras, con y sin tildes, y el coste de mantener
+el índice al guardar.
+
+Uso:
+    python -m benchmarks.draft_search --drafts 100000 --users 500
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from benchmarks.run import _summary
+from utils.storage import DraftStore
+
+
+VOCABULARY = ('casa perro canción corrección información documento proyecto reunión '
+              'mañana cliente informe presupuesto equipo viaje correo empresa plan '
+              'diseño texto escritura análisis página capítulo médico árbol').split()
+QUERIES = ('informe', 'correccion', 'Cliente presupuesto', 'proy', 'reunión mañana',
+           'analisis capitulo', 'palabra123', 'inexistente')
+
+
+def run_search(drafts: int, users: int, queries: int, seed: int) -> dict:
+    """
+    Llena un almacén temporal y mide las búsquedas.
+
+    Args:
+        drafts: Borradores a guardar.
+        users: Usuarios entre los que se reparten.
+        queries: Búsquedas a medir.
+        seed: Semilla del generador aleatorio.
+
+    Returns:
+        Diccionario con el tiempo de carga, el tamaño de la base de datos y
+        las latencias de búsqueda en milisegundos.
+    """
+    rng = random.Random(seed)
+    vocabulary = VOCABULARY + [f'palabra{i}' for i in range(5000)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'drafts.db')
+        store = DraftStore(path)
+        start = time.perf_counter()
+        for i in range(drafts):
+            words = rng.randint(30, 150)
+            store.save(f'usuario{i % users}', ' '.join(rng.choice(vocabulary)
+                                                       for _ in range(words)))
+        store.flush()
+        load_seconds = time.perf_counter() - start
+
+        latencies = []
+        results = 0
+        for _ in range(queries):
+            query = rng.choice(QUERIES)
+            start = time.perf_counter()
+            results += len(store.search(f'usuario{rng.randrange(users)}', query, 10))
+            latencies.append(time.perf_counter() - start)
+        store.close()
+        size = os.path.getsize(path)
+
+    return {
+        'drafts': drafts,
+        'users': users,
+        'queries': queries,
+        'load_seconds': round(load_seconds, 3),
+        'saves_per_second': round(drafts / load_seconds, 1),
+        'db_mb': round(size / 1e6, 2),
+        'mean_results': round(results / queries, 2),
+        'search_latency': _summary(latencies)
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark de la búsqueda de borradores.")
+    parser.add_argument('--drafts', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    report = run_search(args.drafts, args.users, args.queries, args.seed)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
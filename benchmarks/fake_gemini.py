@@ -0,0 +1,167 @@
+"""
+Modelo de Gemini simulado para pruebas de rendimiento sin red ni clave API.
+
+FakeGenerativeModel imita la interfaz de genai.GenerativeModel que usa el
+proyecto (generate_content, con y sin streaming, y generate_content_async) con
+latencias, tasas de error y tamaños de salida configurables. Los prompts
+agrupados de varias correcciones reciben una respuesta JSON con cada elemento.
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+
+@dataclass
+class FakeUsage:
+    prompt_token_count: int
+    candidates_token_count: int
+    total_token_count: int
+    cached_content_token_count: int = 0
+
+
+@dataclass
+class FakeCandidate:
+    finish_reason: str = 'STOP'
+
+
+@dataclass
+class FakeResponse:
+    text: str
+    usage_metadata: FakeUsage
+    candidates: list = field(default_factory=lambda: [FakeCandidate()])
+
+
+class FakeQuotaError(Exception):
+    """Error de cuota simulado (equivalente a un 429 RESOURCE_EXHAUSTED)."""
+    code = 429
+
+
+@dataclass
+class FakeModelConfig:
+    """
+    Parámetros del modelo simulado.
+
+    Attributes:
+        latency_ms: Mediana de la latencia de cada llamada.
+        latency_sigma: Dispersión de la distribución log-normal de latencias.
+        error_rate: Probabilidad de que una llamada devuelva un error de cuota.
+        output_chars: Tamaño de la respuesta en caracteres (None para repetir la entrada).
+        stream_chunks: Número de fragmentos en las respuestas en streaming.
+        seed: Semilla del generador aleatorio.
+    """
+    latency_ms: float = 300.0
+    latency_sigma: float = 0.3
+    error_rate: float = 0.0
+    output_chars: Optional[int] = None
+    stream_chunks: int = 8
+    seed: Optional[int] = 1234
+
+
+class FakeGenerativeModel:
+    """
+    Sustituto local de genai.GenerativeModel.
+
+    Attributes:
+        model_name (str): Nombre del modelo simulado.
+        config (FakeModelConfig): Parámetros de latencia, errores y salida.
+        calls (int): Llamadas recibidas.
+        simulated_seconds (float): Suma de las latencias simuladas.
+    """
+
+    def __init__(self, model_name: str, config: Optional[FakeModelConfig] = None,
+                 **model_kwargs: Any) -> None:
+        self.model_name = model_name
+        self.config = config or FakeModelConfig()
+        self.model_kwargs = model_kwargs
+        self.calls = 0
+        self.simulated_seconds = 0.0
+        self._client = None
+        self._async_client = None
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+
+    def _sample(self) -> tuple[float, bool]:
+        with self._lock:
+            latency = self._random.lognormvariate(0, self.config.latency_sigma)
+            latency *= self.config.latency_ms / 1000.0
+            failed = self._random.random() < self.config.error_rate
+            self.calls += 1
+            self.simulated_seconds += latency
+        return latency, failed
+
+    def _response(self, prompt: Any) -> FakeResponse:
+        prompt = str(prompt)
+        body = prompt.rsplit('Texto: ', 1)[-1]
+        if 'Textos: ' in prompt:
+            # Prompt agrupado (services.microbatch): se devuelve cada elemento.
+            items = json.loads(prompt.rsplit('Textos: ', 1)[-1])
+            body = json.dumps({'items': items}, ensure_ascii=False)
+        elif self.config.output_chars is not None:
+            body = (body * (self.config.output_chars // max(len(body), 1) + 1))
+            body = body[:self.config.output_chars]
+        # Como la API, prompt_token_count incluye la instrucción de sistema y
+        # el contenido en caché; este último se informa además por separado.
+        system = str(self.model_kwargs.get('system_instruction') or '')
+        cached = ''
+        if 'cached_contents' in self.model_kwargs:
+            cached = system + ''.join(self.model_kwargs['cached_contents'])
+        prompt_tokens = (len(system) + len(prompt)) // 4 + 1
+        output_tokens = len(body) // 4 + 1
+        return FakeResponse(body, FakeUsage(prompt_tokens, output_tokens,
+                                            prompt_tokens + output_tokens,
+                                            len(cached) // 4 if cached else 0))
+
+    def generate_content(self, prompt: Any, stream: bool = False, **kwargs: Any) -> Any:
+        latency, failed = self._sample()
+        if stream:
+            return self._stream(prompt, latency, failed)
+        time.sleep(latency)
+        if failed:
+            raise FakeQuotaError('429 RESOURCE_EXHAUSTED (simulado). Please retry in 0.05s.')
+        return self._response(prompt)
+
+    def _stream(self, prompt: Any, latency: float, failed: bool) -> Iterator[FakeResponse]:
+        response = self._response(prompt)
+        chunks = max(1, self.config.stream_chunks)
+        size = len(response.text) // chunks + 1
+        for i in range(chunks):
+            time.sleep(latency / chunks)
+            if failed and i == chunks // 2:
+                raise FakeQuotaError('429 RESOURCE_EXHAUSTED (simulado)')
+            piece = response.text[i * size:(i + 1) * size]
+            if piece:
+                yield FakeResponse(piece, response.usage_metadata)
+
+    async def generate_content_async(self, prompt: Any, **kwargs: Any) -> FakeResponse:
+        latency, failed = self._sample()
+        await asyncio.sleep(latency)
+        if failed:
+            raise FakeQuotaError('429 RESOURCE_EXHAUSTED (simulado). Please retry in 0.05s.')
+        return self._response(prompt)
+
+    def count_tokens(self, contents: Any, **kwargs: Any) -> Any:
+        return FakeUsage(len(str(contents)) // 4 + 1, 0, len(str(contents)) // 4 + 1)
+
+
+def fake_model_factory(config: Optional[FakeModelConfig] = None):
+    """
+    Devuelve una fábrica de modelos simulados para ClientRegistry(model_factory=...).
+
+    Args:
+        config: Parámetros comunes a todos los modelos creados.
+
+    Returns:
+        Función (model_name, **kwargs) -> FakeGenerativeModel. Su atributo
+        `models` guarda los modelos creados, para sumar llamadas y latencias.
+    """
+    def factory(model_name: str, **model_kwargs: Any) -> FakeGenerativeModel:
+        model = FakeGenerativeModel(model_name, config, **model_kwargs)
+        factory.models.append(model)
+        return model
+    factory.models = []
+    return factory
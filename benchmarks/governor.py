@@ -0,0 +1,98 @@
+"""
+Benchmark del gobernador de consumo por usuario.
+
+Mide la sobrecarga de admit() + settle() por llamada con muchos usuarios
+activos y límites en varias ventanas, y la memoria que ocupa cada usuario.
+
+Uso:
+    python -m benchmarks.governor --users 10000 --calls 200000
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from typing import Optional
+
+from benchmarks.run import _summary
+from services.governor import BATCH, INTERACTIVE, BudgetExceededError, Governor, UsageLimit
+
+
+LIMITS = [
+    UsageLimit(60, requests=30, input_tokens=60_000),
+    UsageLimit(3600, input_tokens=500_000, output_tokens=200_000),
+    UsageLimit(86400, input_tokens=2_000_000)
+]
+
+
+def run_governor(users: int, calls: int, seed: int) -> dict:
+    """
+    Reparte llamadas entre usuarios y mide el coste del gobernador.
+
+    Args:
+        users: Usuarios distintos.
+        calls: Llamadas a admitir.
+        seed: Semilla del generador aleatorio.
+
+    Returns:
+        Diccionario con la latencia por llamada en microsegundos, las
+        llamadas rechazadas y la memoria por usuario (medida aparte con
+        1000 usuarios).
+    """
+    rng = random.Random(seed)
+    # Sin esperas: se mide el coste de decidir, no el de esperar a la ventana.
+    governor = Governor(LIMITS, [UsageLimit(60, requests=calls * 2)], max_batch_wait=0)
+    latencies = []
+    rejected = 0
+    for _ in range(calls):
+        user_id = f'usuario{rng.randrange(users)}'
+        priority = BATCH if rng.random() < 0.2 else INTERACTIVE
+        estimated = rng.randint(50, 3000)
+        start = time.perf_counter()
+        try:
+            governor.admit(user_id, priority, estimated)
+        except BudgetExceededError:
+            rejected += 1
+        else:
+            governor.settle(user_id, estimated, int(estimated * 1.1), estimated)
+        latencies.append(time.perf_counter() - start)
+    active = governor.stats()['users']
+
+    tracemalloc.start()
+    sample = Governor(LIMITS)
+    for i in range(1000):
+        sample.admit(f'usuario{i}', INTERACTIVE, 100)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    summary = _summary(latencies)
+    return {
+        'users': users,
+        'calls': calls,
+        'active_users': active,
+        'rejected': rejected,
+        'call_us': {key.replace('_ms', '_us'): round(value * 1000, 2)
+                    for key, value in summary.items()},
+        'bytes_per_user': round(current / 1000)
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark del gobernador de consumo.")
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--calls', type=int, default=200_000)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    report = run_governor(args.users, args.calls, args.seed)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
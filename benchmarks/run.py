@@ -0,0 +1,374 @@
+"""
+Benchmark de WritingAssistant contra un modelo de Gemini simulado.
+
+Mide, para cada operación, la latencia (p50/p95/p99), el rendimiento según la
+concurrencia, la memoria por petición, la sobrecarga propia del proyecto
+(latencia observada menos latencia simulada), el efecto de la caché y el coste
+de la comprobación local de fix_grammar, y los tokens de entrada con
+instrucciones de sistema y guía de estilo en caché frente a los prompts en
+línea, y la latencia de improve_style_all frente a pedir los tonos uno a uno.
+No necesita red ni clave API. El
+resultado se emite en JSON para comparar ejecuciones entre commits.
+
+Uso:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --requests 400 --concurrency 1,8,32 --latency-ms 50
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from benchmarks.fake_gemini import FakeModelConfig, fake_model_factory
+from services.ai_service import TONES, WritingAssistant
+from services.cache import ResponseCache
+from services.client_registry import ClientRegistry
+from services.context_cache import ContextCachePolicy
+from services.local_check import LocalChecker
+from services.rate_limit import RateLimiter
+
+
+OPERATIONS = ('fix_grammar', 'improve_style', 'generate_content')
+SAMPLE_TEXT = ("Hola, me gustaria saber como puedo mejorar mi escritura. "
+               "Mi gramatica no es muy buena y quiero aprender. ")
+# Textos cortos típicos para la comprobación local: unos correctos, otros con
+# errores que solo corrige el modelo y otros con correcciones locales seguras.
+LOCAL_SAMPLES = (
+    "Hoy trabajamos en el proyecto con el equipo.",
+    "Necesito revisar la informacion antes del viernes.",
+    "La reunión es mañana por la tarde.",
+    "Gracias por tu ayuda con el documento.",
+    "me gustaria saber si podemos hablar",
+    "Ayer fuimos al cine y la pelicula fue muy buena.",
+    "Quiero mejorar mi escritura en español.",
+    "Como estas?",
+    "El cliente pidió una nueva versión  del plan .",
+    "Tengo muchas ideas para el proyecto.",
+)
+# Guía de estilo sintética, por encima del mínimo de la caché de contexto.
+STYLE_GUIDE = '\n'.join(
+    f"{i}. Escribe frases de menos de treinta palabras, usa la voz activa, evita los "
+    f"anglicismos cuando exista un término en español y respeta el manual de la casa."
+    for i in range(1, 41)
+)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """
+    Percentil por el método del rango más cercano.
+
+    Args:
+        values: Muestras.
+        pct: Percentil entre 0 y 100.
+
+    Returns:
+        Valor del percentil (0.0 si no hay muestras).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _summary(latencies: list[float]) -> dict:
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0
+    }
+
+
+def make_assistant(
+    config: FakeModelConfig,
+    cache: Optional[ResponseCache] = None,
+    **kwargs
+) -> WritingAssistant:
+    """
+    Crea un WritingAssistant conectado a un modelo simulado.
+
+    Args:
+        config: Parámetros del modelo simulado.
+        cache: Caché a usar (None para desactivarla).
+        **kwargs: Argumentos adicionales de WritingAssistant.
+
+    Returns:
+        Asistente listo para medir.
+    """
+    # Sin comprobación local, para que las llamadas de fix_grammar lleguen al
+    # modelo simulado y las cifras de caché midan algo.
+    kwargs.setdefault('use_local_check', False)
+    return WritingAssistant(
+        'benchmark',
+        cache=cache,
+        use_cache=cache is not None,
+        registry=ClientRegistry(model_factory=fake_model_factory(config)),
+        rate_limiter=RateLimiter(max_retries=3, base_delay=0.01, max_delay=0.1),
+        **kwargs
+    )
+
+
+def _fake_models(assistant: WritingAssistant) -> list:
+    """Devuelve los modelos simulados creados por el registro del asistente."""
+    return assistant.registry.model_factory.models
+
+
+def _call(assistant: WritingAssistant, operation: str, text: str) -> tuple[float, bool]:
+    start = time.perf_counter()
+    if operation == 'improve_style':
+        result = assistant.improve_style(text, 'Formal')
+    else:
+        result = getattr(assistant, operation)(text)
+    return time.perf_counter() - start, result['success']
+
+
+def run_load(
+    config: FakeModelConfig,
+    operation: str,
+    requests: int,
+    concurrency: int,
+    text_size: int
+) -> dict:
+    """
+    Lanza `requests` llamadas distintas con `concurrency` hilos.
+
+    Args:
+        config: Parámetros del modelo simulado.
+        operation: Operación a medir.
+        requests: Número de llamadas.
+        concurrency: Hilos concurrentes.
+        text_size: Tamaño aproximado del texto de entrada.
+
+    Returns:
+        Latencias, rendimiento, errores, sobrecarga y memoria por petición.
+    """
+    assistant = make_assistant(config)
+    base = (SAMPLE_TEXT * (text_size // len(SAMPLE_TEXT) + 1))[:text_size]
+    texts = [f"{i}: {base}" for i in range(requests)]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda t: _call(assistant, operation, t), texts))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = [latency for latency, _ in results]
+    limiter_stats = assistant.rate_limiter.stats()
+    # Sobrecarga propia: tiempo observado menos el tiempo simulado del modelo
+    # y las esperas de reintento, repartido por petición.
+    simulated = sum(model.simulated_seconds for model in _fake_models(assistant))
+    overhead = (sum(latencies) - simulated
+                - limiter_stats['wait_seconds']) / requests
+    return {
+        'operation': operation,
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': sum(1 for _, ok in results if not ok),
+        'throughput_rps': round(requests / elapsed, 3),
+        **_summary(latencies),
+        'overhead_ms': round(overhead * 1000, 3),
+        'peak_memory_per_request_kb': round(peak / requests / 1024, 3),
+        'retries': limiter_stats['retries']
+    }
+
+
+def run_cache(config: FakeModelConfig, operation: str, requests: int, repeat_ratio: float) -> dict:
+    """
+    Mide el efecto de la caché con una fracción de textos repetidos.
+
+    Args:
+        config: Parámetros del modelo simulado.
+        operation: Operación a medir.
+        requests: Número de llamadas secuenciales.
+        repeat_ratio: Fracción de llamadas que repiten un texto ya visto.
+
+    Returns:
+        Aciertos, fallos y latencias de aciertos y fallos.
+    """
+    cache = ResponseCache(memory_size=requests)
+    assistant = make_assistant(config, cache)
+    unique = max(1, int(requests * (1 - repeat_ratio)))
+    hit_latencies, miss_latencies = [], []
+    for i in range(requests):
+        text = f"{i % unique}: {SAMPLE_TEXT}"
+        hits_before = cache.stats.hits
+        latency, _ = _call(assistant, operation, text)
+        (hit_latencies if cache.stats.hits > hits_before else miss_latencies).append(latency)
+
+    stats = cache.stats
+    return {
+        'operation': operation,
+        'requests': requests,
+        'repeat_ratio': repeat_ratio,
+        'hits': stats.hits,
+        'misses': stats.misses,
+        'hit_latency': _summary(hit_latencies),
+        'miss_latency': _summary(miss_latencies),
+        'model_calls': sum(model.calls for model in _fake_models(assistant))
+    }
+
+
+def run_prompt_savings(config: FakeModelConfig, requests: int, text_size: int) -> dict:
+    """
+    Compara los tokens de entrada de los prompts en línea con los de las
+    instrucciones de sistema y la guía de estilo en caché.
+
+    Args:
+        config: Parámetros del modelo simulado.
+        requests: Llamadas por operación y variante.
+        text_size: Tamaño aproximado del texto de entrada.
+
+    Returns:
+        Diccionario {variante: informe de prompt_savings() por operación}.
+    """
+    base = (SAMPLE_TEXT * (text_size // len(SAMPLE_TEXT) + 1))[:text_size]
+    variants = {
+        'inline': {'use_system_instructions': False},
+        'system_instruction': {'use_system_instructions': True},
+        'style_guide_inline': {'context_cache': ContextCachePolicy(STYLE_GUIDE, enabled=False)},
+        'style_guide_cached': {'context_cache': ContextCachePolicy(STYLE_GUIDE)}
+    }
+    report = {}
+    for name, kwargs in variants.items():
+        assistant = make_assistant(config, **kwargs)
+        for i in range(requests):
+            for operation in OPERATIONS:
+                _call(assistant, operation, f"{i}: {base}")
+        report[name] = assistant.prompt_savings()
+    return report
+
+
+def run_tone_fanout(config: FakeModelConfig, requests: int, text_size: int) -> dict:
+    """
+    Compara pedir los tres tonos uno tras otro con improve_style_all.
+
+    Args:
+        config: Parámetros del modelo simulado.
+        requests: Textos distintos medidos con cada variante.
+        text_size: Tamaño aproximado del texto de entrada.
+
+    Returns:
+        Latencias de ambas variantes y la aceleración de la mediana.
+    """
+    base = (SAMPLE_TEXT * (text_size // len(SAMPLE_TEXT) + 1))[:text_size]
+    assistant = make_assistant(config)
+    sequential, fanout = [], []
+    for i in range(requests):
+        start = time.perf_counter()
+        for tone in TONES:
+            assistant.improve_style(f"{i}: {base}", tone)
+        sequential.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        assistant.improve_style_all(f"{i} bis: {base}")
+        fanout.append(time.perf_counter() - start)
+    sequential_p50 = percentile(sequential, 50)
+    fanout_p50 = percentile(fanout, 50)
+    return {
+        'tones': len(TONES),
+        'sequential': _summary(sequential),
+        'fanout': _summary(fanout),
+        'speedup_p50': round(sequential_p50 / fanout_p50, 2) if fanout_p50 else None
+    }
+
+
+def run_local_check(repeat: int) -> dict:
+    """
+    Mide el coste por llamada de la comprobación local y la fracción de
+    textos que modifica.
+
+    Args:
+        repeat: Veces que se comprueba cada texto de muestra.
+
+    Returns:
+        Latencias en microsegundos y fracción de textos corregidos localmente.
+    """
+    checker = LocalChecker()
+    paragraph = ' '.join(LOCAL_SAMPLES)
+    checker.check(paragraph)
+    latencies = []
+    for _ in range(repeat):
+        for text in LOCAL_SAMPLES + (paragraph,):
+            result = checker.check(text)
+            latencies.append(result.seconds)
+    fixed = sum(bool(checker.check(text).fixes) for text in LOCAL_SAMPLES)
+    return {
+        'samples': len(LOCAL_SAMPLES),
+        'fix_rate': round(fixed / len(LOCAL_SAMPLES), 3),
+        'p50_us': round(percentile(latencies, 50) * 1e6, 1),
+        'p99_us': round(percentile(latencies, 99) * 1e6, 1),
+        'paragraph_chars': len(paragraph)
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark offline de WritingAssistant.")
+    parser.add_argument('--output', help="Archivo JSON de salida (por defecto, stdout)")
+    parser.add_argument('--operations', default=','.join(OPERATIONS))
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', default='1,4,16')
+    parser.add_argument('--text-size', type=int, default=400)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--latency-sigma', type=float, default=0.3)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--output-chars', type=int, default=None)
+    parser.add_argument('--repeat-ratio', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    config = FakeModelConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        output_chars=args.output_chars,
+        seed=args.seed
+    )
+    operations = [op for op in args.operations.split(',') if op]
+    levels = [int(level) for level in args.concurrency.split(',') if level]
+
+    report = {
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'params': vars(args),
+        'load': [run_load(config, op, args.requests, level, args.text_size)
+                 for op in operations for level in levels],
+        'cache': [run_cache(config, op, args.requests, args.repeat_ratio)
+                  for op in operations],
+        'local_check': run_local_check(max(1, args.requests // 10)),
+        'prompt_savings': run_prompt_savings(config, max(1, args.requests // 20),
+                                             args.text_size),
+        'tone_fanout': run_tone_fanout(config, max(1, args.requests // 10), args.text_size)
+    }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"✅ Resultados guardados en {args.output}")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Prueba de carga del servidor HTTP del asistente.
+
+Lanza peticiones concurrentes contra un servidor en ejecución (por ejemplo,
+`python -m services.server --fake`) con conexiones persistentes y emite en
+JSON los códigos de estado, el rendimiento y la latencia (p50/p95/p99) de las
+respuestas correctas y de los rechazos por control de admisión.
+
+Uso:
+    python -m services.server --fake --fake-latency-ms 300 --workers 8 --queue-size 16
+    python -m benchmarks.server_load --requests 500 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+from typing import Optional
+
+from benchmarks.run import SAMPLE_TEXT, _summary
+
+
+async def _request(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    host: str,
+    path: str,
+    payload: dict
+) -> int:
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    writer.write((f'POST {path} HTTP/1.1\r\nHost: {host}\r\n'
+                  f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n')
+                 .encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def run_load(
+    host: str,
+    port: int,
+    operation: str,
+    requests: int,
+    concurrency: int,
+    deadline_ms: Optional[float] = None
+) -> dict:
+    """
+    Envía `requests` peticiones desde `concurrency` clientes simultáneos.
+
+    Args:
+        host: Dirección del servidor.
+        port: Puerto del servidor.
+        operation: Endpoint a probar (fix_grammar, improve_style o generate_content).
+        requests: Número total de peticiones.
+        concurrency: Conexiones simultáneas.
+        deadline_ms: Plazo enviado en cada petición (None para el del servidor).
+
+    Returns:
+        Diccionario con los códigos de estado, peticiones por segundo y las
+        latencias de las respuestas 200 y de los rechazos.
+    """
+    field_name = 'topic' if operation == 'generate_content' else 'text'
+    statuses: Counter = Counter()
+    ok: list[float] = []
+    rejected: list[float] = []
+    remaining = iter(range(requests))
+
+    async def client() -> None:
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for i in remaining:
+                # Textos distintos para que la caché no oculte la carga.
+                payload = {field_name: f'{SAMPLE_TEXT} ({i})', 'tone': 'Formal'}
+                if deadline_ms is not None:
+                    payload['deadline_ms'] = deadline_ms
+                start = time.perf_counter()
+                status = await _request(reader, writer, host, f'/v1/{operation}', payload)
+                elapsed = time.perf_counter() - start
+                statuses[status] += 1
+                (ok if status == 200 else rejected).append(elapsed)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        'operation': operation,
+        'requests': requests,
+        'concurrency': concurrency,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'requests_per_second': requests / elapsed,
+        'ok_per_second': len(ok) / elapsed,
+        'ok_latency': _summary(ok) if ok else None,
+        'rejected_latency': _summary(rejected) if rejected else None
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    """
+    parser = argparse.ArgumentParser(description="Prueba de carga del servidor HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--operation', default='fix_grammar')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--deadline-ms', type=float, default=None)
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_load(args.host, args.port, args.operation, args.requests,
+                                  args.concurrency, args.deadline_ms))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+Benchmark del tiempo de arranque de los puntos de entrada.
+
+Lanza cada punto de entrada en un intérprete nuevo varias veces y mide el
+tiempo total hasta que termina (importaciones incluidas), junto con el perfil
+de importación de `python -X importtime`: tiempo acumulado, módulos más
+costosos y si se llegó a cargar el SDK de Gemini. Con --baseline compara con
+una ejecución anterior y termina con código 1 si algún punto de entrada es
+más lento que el umbral, para detectar regresiones.
+
+Uso:
+    python -m benchmarks.startup --output startup.json
+    python -m benchmarks.startup --baseline startup.json --threshold 1.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Módulo cuya carga se quiere evitar en el arranque.
+SDK_MODULE = 'google.generativeai'
+
+# Punto de entrada -> argumentos del intérprete.
+ENTRY_POINTS = {
+    'ai_service': ['-c', 'import services.ai_service'],
+    # Importaciones de nivel de módulo de app.py (streamlit run ejecuta el
+    # script dentro de su propio servidor, que no se puede medir así).
+    'app_imports': ['-c', 'import streamlit, services.ai_service, services.chunking, '
+                          'services.incremental, utils.storage'],
+    'batch_cli': ['-m', 'services.batch', '--help'],
+    'server_cli': ['-m', 'services.server', '--help'],
+    'validate_setup': ['validate_setup.py', '--no-profile'],
+}
+
+
+def import_profile(args: list[str], top: int = 5) -> dict:
+    """
+    Ejecuta un intérprete con -X importtime y resume sus importaciones.
+
+    Args:
+        args: Argumentos del intérprete (p. ej. ['-c', 'import services.ai_service']).
+        top: Número de módulos de primer nivel más costosos a devolver.
+
+    Returns:
+        Diccionario con 'import_ms' (suma de los módulos de primer nivel),
+        'modules' (número de módulos importados), 'sdk_loaded' y 'top'
+        (lista de {'module', 'ms'}).
+    """
+    completed = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=ROOT,
+                               capture_output=True, text=True)
+    roots = []
+    modules = 0
+    sdk_loaded = False
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules += 1
+        if name.strip() == SDK_MODULE:
+            sdk_loaded = True
+        # Los módulos de primer nivel no llevan sangría tras el separador.
+        if not name[1:].startswith(' '):
+            roots.append((name.strip(), int(cumulative) / 1000))
+    roots.sort(key=lambda item: item[1], reverse=True)
+    return {
+        'import_ms': round(sum(ms for _, ms in roots), 1),
+        'modules': modules,
+        'sdk_loaded': sdk_loaded,
+        'top': [{'module': name, 'ms': round(ms, 1)} for name, ms in roots[:top]]
+    }
+
+
+def measure(args: list[str], runs: int) -> dict:
+    """
+    Mide el tiempo de arranque de un punto de entrada.
+
+    Args:
+        args: Argumentos del intérprete.
+        runs: Ejecuciones medidas (tras una de calentamiento).
+
+    Returns:
+        Diccionario con la mediana, el mínimo y el máximo en milisegundos,
+        el código de salida y el perfil de importación.
+    """
+    command = [sys.executable, *args]
+    env = dict(os.environ, PYTHONWARNINGS='ignore')
+    subprocess.run(command, cwd=ROOT, capture_output=True, env=env)
+    times = []
+    returncode = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(command, cwd=ROOT, capture_output=True, env=env)
+        times.append((time.perf_counter() - start) * 1000)
+        returncode = completed.returncode
+    return {
+        'median_ms': round(statistics.median(times), 1),
+        'min_ms': round(min(times), 1),
+        'max_ms': round(max(times), 1),
+        'returncode': returncode,
+        'profile': import_profile(args)
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Compara un informe con uno anterior.
+
+    Args:
+        report: Informe actual.
+        baseline: Informe de referencia.
+        threshold: Cociente máximo admitido entre la mediana actual y la de referencia.
+
+    Returns:
+        Descripción de cada regresión encontrada (vacía si no hay ninguna).
+    """
+    regressions = []
+    for name, current in report['entry_points'].items():
+        previous = baseline.get('entry_points', {}).get(name)
+        if previous is None:
+            continue
+        ratio = current['median_ms'] / max(previous['median_ms'], 0.001)
+        if ratio > threshold:
+            regressions.append(f"{name}: {previous['median_ms']} ms -> "
+                               f"{current['median_ms']} ms (x{ratio:.2f})")
+        if current['profile']['sdk_loaded'] and not previous['profile']['sdk_loaded']:
+            regressions.append(f"{name}: ahora importa {SDK_MODULE} al arrancar")
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    """
+    parser = argparse.ArgumentParser(description="Tiempo de arranque de los puntos de entrada.")
+    parser.add_argument('--output', help="Archivo JSON de salida (por defecto, stdout)")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--entry-points', default=','.join(ENTRY_POINTS))
+    parser.add_argument('--baseline', help="Informe anterior con el que comparar")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="Regresión máxima admitida respecto a la referencia")
+    args = parser.parse_args(argv)
+
+    names = [name for name in args.entry_points.split(',') if name]
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'runs': args.runs,
+        'entry_points': {name: measure(ENTRY_POINTS[name], args.runs) for name in names}
+    }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"✅ Resultados guardados en {args.output}")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"❌ Regresión de arranque: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Calibración del estimador local de tokens frente a recuentos reales.
+
+Lee muestras (texto, tokens reales) de un registro JSONL escrito con
+WRITING_TOKEN_LOG (prompt_token_count y candidates_token_count de
+usage_metadata) o generado con --count-tokens, ajusta los coeficientes con
+una parte de las muestras y mide en el resto el error del estimador por
+defecto y del calibrado. El resultado se emite en JSON.
+
+Uso:
+    WRITING_TOKEN_LOG=data/token_log.jsonl streamlit run app.py
+    python -m benchmarks.token_calibration --log data/token_log.jsonl
+    python -m benchmarks.token_calibration --count-tokens textos.txt --log data/token_log.jsonl
+    python -m benchmarks.token_calibration --log data/token_log.jsonl \
+        --save data/token_calibration.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from typing import Optional
+
+from services.tokens import FEATURES, TokenEstimator, load_samples
+
+
+def count_tokens(path: str, log_path: str, model_name: str) -> int:
+    """
+    Obtiene recuentos reales con count_tokens de la API y los añade al registro.
+
+    Args:
+        path: Archivo de texto con una muestra por línea.
+        log_path: Registro JSONL donde se añaden las muestras.
+        model_name: Modelo cuyo tokenizador se usa.
+
+    Returns:
+        Número de muestras añadidas.
+    """
+    import google.generativeai as genai
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise RuntimeError("GOOGLE_API_KEY no está configurada en .env")
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(model_name)
+
+    added = 0
+    with open(path, 'r', encoding='utf-8') as source, \
+            open(log_path, 'a', encoding='utf-8') as log:
+        for line in source:
+            text = line.strip()
+            if not text:
+                continue
+            tokens = model.count_tokens(text).total_tokens
+            log.write(json.dumps({'text': text, 'tokens': tokens}, ensure_ascii=False) + '\n')
+            added += 1
+    return added
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    """
+    parser = argparse.ArgumentParser(
+        description="Mide y calibra el estimador local de tokens con recuentos reales.")
+    parser.add_argument('--log', required=True, help="Registro JSONL de muestras")
+    parser.add_argument('--count-tokens', metavar='TEXTOS',
+                        help="Añade al registro recuentos de count_tokens para cada línea")
+    parser.add_argument('--model', default='gemini-2.5-flash')
+    parser.add_argument('--holdout', type=float, default=0.3,
+                        help="Fracción de muestras reservada para medir el error")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--save', help="Guarda los coeficientes ajustados con todas las muestras")
+    args = parser.parse_args(argv)
+
+    if args.count_tokens:
+        added = count_tokens(args.count_tokens, args.log, args.model)
+        print(f"✅ {added} muestras añadidas a {args.log}", file=sys.stderr)
+
+    samples = load_samples(args.log)
+    if len(samples) < 10:
+        print(f"❌ Error: se necesitan al menos 10 muestras (hay {len(samples)})",
+              file=sys.stderr)
+        return 1
+
+    shuffled = samples[:]
+    random.Random(args.seed).shuffle(shuffled)
+    cut = max(1, int(len(shuffled) * args.holdout))
+    test, train = shuffled[:cut], shuffled[cut:]
+    fitted = TokenEstimator.fit(train)
+
+    report = {
+        'samples': len(samples),
+        'train': len(train),
+        'test': len(test),
+        'default': TokenEstimator().error_report(test),
+        'calibrated': fitted.error_report(test),
+        'coefficients': dict(zip(FEATURES, fitted.coefficients))
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.save:
+        TokenEstimator.fit(samples).save(args.save)
+        print(f"✅ Coeficientes guardados en {args.save}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
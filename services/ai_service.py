@@ -6,8 +6,295 @@ para proporcionar servicios de corrección de gramática, mejora de estilo y gen
 de contenido.
 """
 
-from typing import Optional
-import google.generativeai as genai
+import copy
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Any, Callable, Iterator, Optional
+
+from services.cache import ResponseCache, get_default_cache, make_cache_key
+from services.chunking import reassemble, split_into_chunks, split_paragraphs
+from services.client_registry import ClientRegistry, get_registry, hash_api_key
+from services.context_cache import ContextCachePolicy, get_context_cache_policy
+from services.governor import (INTERACTIVE, PRIORITIES, BudgetExceededError, Governor,
+                               get_governor)
+from services.incremental import ParagraphHistory
+from services.local_check import LocalChecker, get_local_checker
+from services.microbatch import build_batch_prompt, parse_batch_response
+from services.metrics import CallRecord, Metrics, get_metrics, response_details
+from services.pipeline import (JSON_GENERATION_CONFIG, PipelineStep, build_fused_prompt,
+                               parse_fused_response, parse_steps)
+from services.rate_limit import RateLimiter, get_rate_limiter
+from services.routing import (HedgePolicy, Hedger, RoutingPolicy, get_hedge_policy,
+                              get_routing_policy)
+from services.singleflight import SingleFlight, get_single_flight
+from services.tokens import (OutputTruncatedError, PromptSavings, TokenBudget,
+                             get_token_estimator, get_token_log, is_truncated)
+
+
+# Versión de las plantillas de prompt. Incrementarla invalida la caché.
+PROMPT_VERSION = "2"
+
+# Clave del texto producido en el diccionario de resultado de cada operación.
+RESULT_KEYS = {
+    'fix_grammar': 'corrected_text',
+    'improve_style': 'improved_text',
+    'generate_content': 'generated_text'
+}
+
+TONE_INSTRUCTIONS = {
+    'Formal': 'Usa un lenguaje profesional y cortés. Mantén estructuras de oraciones complejas.',
+    'Creativo': 'Usa un lenguaje imaginativo y expresivo. Incluye metáforas y descripción vivida.',
+    'Casual': 'Usa un lenguaje relajado y conversacional. Como si hablaras con un amigo.'
+}
+
+TONES = tuple(TONE_INSTRUCTIONS)
+
+
+@lru_cache(maxsize=None)
+def system_instruction(operation: str, tone: Optional[str] = None) -> str:
+    """
+    Devuelve las instrucciones fijas de una operación.
+    
+    Son iguales en todas las peticiones de la misma operación y tono, por lo
+    que se configuran una vez como system_instruction del modelo en lugar de
+    repetirse en cada prompt.
+    
+    Args:
+        operation: Operación (fix_grammar, improve_style o generate_content).
+        tone: Tono deseado (solo para improve_style).
+        
+    Returns:
+        Instrucción de sistema de la operación.
+    """
+    if operation == 'fix_grammar':
+        return """Eres un experto corrector de gramática y ortografía en español.
+Corrige el texto que te envíe el usuario manteniendo el mismo significado y tono.
+Devuelve solo el texto corregido sin explicaciones adicionales."""
+    
+    if operation == 'improve_style':
+        instructions = TONE_INSTRUCTIONS.get(tone, TONE_INSTRUCTIONS['Formal'])
+        return f"""Eres un experto editor de textos en español.
+Reescribe el texto que te envíe el usuario manteniendo el contenido pero cambiando el estilo.
+Instrucción de tono: {instructions}
+Devuelve solo el texto reescrito sin explicaciones."""
+    
+    if operation == 'generate_content':
+        return """Eres un escritor talentoso en español.
+Crea contenido original, bien estructurado y atractivo basado en el tema que te indique el usuario.
+Devuelve el contenido generado."""
+    
+    raise ValueError(f"Operación desconocida: {operation}")
+
+
+def build_user_prompt(operation: str, text: str, context: Optional[str] = None) -> str:
+    """
+    Construye la parte variable del prompt de una operación.
+    
+    Args:
+        operation: Operación (fix_grammar, improve_style o generate_content).
+        text: Texto o tema proporcionado por el usuario.
+        context: Texto que precede al fragmento en un documento largo. Se envía
+            solo como referencia y no forma parte de la respuesta.
+        
+    Returns:
+        Mensaje del usuario, sin las instrucciones de la operación.
+    """
+    if operation == 'generate_content':
+        return f"Tema: {text}"
+    
+    context_block = ""
+    if context:
+        context_block = (f"Contexto anterior del documento (solo como referencia, "
+                         f"no lo incluyas en la respuesta): {context}\n\n")
+    return f"{context_block}Texto: {text}"
+
+
+def with_style_guide(instruction: str, style_guide: Optional[str]) -> str:
+    """
+    Añade la guía de estilo de la casa a una instrucción de sistema.
+    
+    Args:
+        instruction: Instrucción de sistema de la operación.
+        style_guide: Texto de la guía (None o vacío para no añadir nada).
+        
+    Returns:
+        Instrucción con la guía al final.
+    """
+    if not style_guide:
+        return instruction
+    return (f"{instruction}\n\nGuía de estilo de la casa (síguela en todas las "
+            f"respuestas):\n{style_guide}")
+
+
+def build_prompt(
+    operation: str,
+    text: str,
+    tone: Optional[str] = None,
+    context: Optional[str] = None
+) -> str:
+    """
+    Construye el prompt completo de una operación, con las instrucciones en línea.
+    
+    Es el prompt equivalente a enviar system_instruction() como instrucción de
+    sistema y build_user_prompt() como mensaje; lo usan los clientes que no
+    configuran instrucciones de sistema y las estimaciones de tokens.
+    
+    Args:
+        operation: Operación (fix_grammar, improve_style o generate_content).
+        text: Texto o tema proporcionado por el usuario.
+        tone: Tono deseado (solo para improve_style).
+        context: Texto que precede al fragmento en un documento largo. Se envía
+            solo como referencia y no forma parte de la respuesta.
+        
+    Returns:
+        Prompt completo a enviar al modelo.
+    """
+    return join_prompt(system_instruction(operation, tone),
+                       build_user_prompt(operation, text, context))
+
+
+def join_prompt(instruction: str, message: str) -> str:
+    """Une una instrucción y un mensaje en un único prompt en línea."""
+    return f"{instruction}\n\n{message}"
+
+
+def step_instruction(step: PipelineStep) -> str:
+    """
+    Devuelve la instrucción de un paso dentro de un prompt fusionado.
+    
+    Args:
+        step: Paso de la canalización.
+        
+    Returns:
+        Instrucción en una línea, equivalente al prompt de la operación.
+    """
+    if step.operation == 'fix_grammar':
+        return 'Corrige la gramática y la ortografía manteniendo el mismo significado y tono.'
+    instructions = TONE_INSTRUCTIONS.get(step.tone, TONE_INSTRUCTIONS['Formal'])
+    return ('Reescribe el texto manteniendo el contenido pero cambiando el estilo. '
+            f'Instrucción de tono: {instructions}')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimación local de tokens de un texto, sin llamar a la API.
+    
+    Usa el estimador del proceso (calibrado si WRITING_TOKEN_CALIBRATION
+    apunta a unos coeficientes ajustados).
+    
+    Args:
+        text: Texto a medir.
+        
+    Returns:
+        Número estimado de tokens.
+    """
+    return get_token_estimator().estimate(text)
+
+
+def total_tokens(response: Any) -> Optional[int]:
+    """Devuelve los tokens totales informados por la API, o None si no vienen."""
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'total_token_count', None) or None
+
+
+def _chunk_text(chunk: Any) -> str:
+    """Devuelve el texto de un fragmento de respuesta, o '' si no trae texto."""
+    try:
+        return chunk.text
+    except ValueError:
+        return ''
+
+
+class TextStream:
+    """
+    Respuesta en streaming de una operación del asistente.
+    
+    Se itera para obtener los fragmentos de texto a medida que el modelo los
+    produce. Al terminar la iteración, el atributo `result` contiene el mismo
+    diccionario que devolvería el método síncrono. Si el stream se interrumpe,
+    `result` indica el error e incluye el texto parcial recibido con
+    'partial': True.
+    
+    Attributes:
+        result_key (str): Clave del texto en el diccionario de resultado.
+        result (Optional[dict]): Resultado final (None hasta terminar la iteración).
+    """
+    
+    def __init__(
+        self,
+        result_key: str,
+        open_stream: Callable[[], Iterator[Any]],
+        on_success: Optional[Callable[[dict], None]] = None,
+        cached: Optional[dict] = None
+    ) -> None:
+        """
+        Prepara el stream sin contactar todavía con el modelo.
+        
+        Args:
+            result_key: Clave del texto en el diccionario de resultado.
+            open_stream: Función que inicia la generación y devuelve los fragmentos.
+            on_success: Función a invocar con el resultado si la generación termina bien.
+            cached: Resultado en caché; si existe, se emite como un único fragmento.
+        """
+        self.result_key = result_key
+        self.result: Optional[dict] = None
+        self._open_stream = open_stream
+        self._on_success = on_success
+        self._cached = cached
+    
+    def __iter__(self) -> Iterator[str]:
+        if self._cached is not None:
+            self.result = self._cached
+            yield self._cached[self.result_key]
+            return
+        
+        parts: list[str] = []
+        try:
+            for chunk in self._open_stream():
+                text = _chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+        
+        except Exception as e:
+            partial = ''.join(parts).strip()
+            if partial:
+                self.result = {
+                    'success': False,
+                    self.result_key: partial,
+                    'error': f'Error: respuesta interrumpida tras {len(partial)} caracteres '
+                             f'(resultado parcial): {str(e)}',
+                    'partial': True
+                }
+            else:
+                self.result = {
+                    'success': False,
+                    self.result_key: None,
+                    'error': f'Error: {str(e)}'
+                }
+            return
+        
+        self.result = {
+            'success': True,
+            self.result_key: ''.join(parts).strip(),
+            'error': None
+        }
+        if self._on_success is not None:
+            self._on_success(self.result)
+    
+    def text(self) -> str:
+        """
+        Consume el stream completo y devuelve el texto acumulado.
+        
+        Returns:
+            Texto final, o el texto parcial si el stream se interrumpió.
+        """
+        for _ in self:
+            pass
+        return self.result.get(self.result_key) or ''
 
 
 class WritingAssistant:
@@ -17,134 +304,1268 @@ class WritingAssistant:
     Attributes:
         api_key (str): Clave API de Google Gemini.
         model_name (str): Nombre del modelo a utilizar (por defecto: gemini-pro).
+        cache (Optional[ResponseCache]): Caché de respuestas (None si está desactivada).
     """
     
-    def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash") -> None:
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = "gemini-2.5-flash",
+        cache: Optional[ResponseCache] = None,
+        use_cache: bool = True,
+        registry: Optional[ClientRegistry] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        metrics: Optional[Metrics] = None,
+        single_flight: Optional[SingleFlight] = None,
+        routing: Optional[RoutingPolicy] = None,
+        hedging: Optional[HedgePolicy] = None,
+        local_checker: Optional[LocalChecker] = None,
+        use_local_check: bool = True,
+        max_input_tokens: Optional[int] = None,
+        use_system_instructions: Optional[bool] = None,
+        context_cache: Optional[ContextCachePolicy] = None,
+        governor: Optional[Governor] = None
+    ) -> None:
         """
         Inicializa el asistente de escritura.
         
         Args:
             api_key: Clave API de Google Gemini (API gratuita).
             model_name: Nombre del modelo a utilizar. Por defecto es gemini-2.5-flash.
+            cache: Caché de respuestas. Si es None se usa la caché compartida del proceso.
+            use_cache: Si es False, no se usa ninguna caché.
+            registry: Registro de clientes. Si es None se usa el registro del proceso,
+                que reutiliza el modelo y su conexión para la misma clave API.
+            rate_limiter: Limitador de tasa y reintentos. Si es None se usa el
+                limitador compartido por todos los asistentes con la misma clave API.
+            metrics: Registro de métricas. Si es None se usa el del proceso
+                (desactivado salvo que WRITING_METRICS=1).
+            single_flight: Grupo que agrupa llamadas idénticas simultáneas. Si es
+                None se usa el del proceso, compartido por todas las sesiones.
+            routing: Política de elección de modelo por operación y tamaño de
+                entrada. Si es None se lee del entorno (GEMINI_LIGHT_MODEL).
+            hedging: Política de peticiones cubiertas contra la latencia de
+                cola. Si es None se lee del entorno (GEMINI_HEDGE=1).
+            local_checker: Correcciones locales previas a fix_grammar. Si es None
+                se usa el del proceso (desactivado salvo que WRITING_LOCAL_CHECK=1).
+            use_local_check: Si es False, fix_grammar no aplica correcciones locales.
+            max_input_tokens: Límite propio de tokens de entrada por llamada,
+                menor que el del modelo. Si es None se lee del entorno
+                (WRITING_MAX_INPUT_TOKENS) o se usa el del modelo.
+            use_system_instructions: Si es True, las instrucciones fijas de
+                cada operación y tono se configuran como system_instruction de
+                un modelo reutilizado en lugar de repetirse en cada prompt. Si
+                es None se lee del entorno (WRITING_SYSTEM_INSTRUCTIONS=0 las
+                desactiva).
+            context_cache: Guía de estilo de la casa y su caché de contexto.
+                Si es None se lee del entorno (WRITING_STYLE_GUIDE).
+            governor: Límites de consumo por usuario que se aplican a las
+                vistas creadas con for_user. Si es None se usa el del proceso
+                (WRITING_USER_LIMITS, WRITING_GLOBAL_LIMITS).
         """
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
+        self.metrics = metrics if metrics is not None else get_metrics()
+        self.single_flight = (single_flight if single_flight is not None
+                              else get_single_flight())
+        self.registry = registry if registry is not None else get_registry()
+        self.rate_limiter = (rate_limiter if rate_limiter is not None
+                             else get_rate_limiter(hash_api_key(api_key)))
+        self.model_name = model_name
+        # El modelo (y con él el SDK de Gemini) se crea en la primera llamada.
+        self._model: Any = None
+        self._api_key = api_key
+        self.routing = routing if routing is not None else get_routing_policy()
+        hedging = hedging if hedging is not None else get_hedge_policy()
+        self.hedger = Hedger(hedging) if hedging is not None else None
+        # Latencia media móvil por operación (para estimar el ahorro de las
+        # canalizaciones fusionadas frente a las llamadas secuenciales).
+        self._latency: dict[str, float] = {}
+        if max_input_tokens is None and os.getenv('WRITING_MAX_INPUT_TOKENS'):
+            max_input_tokens = int(os.getenv('WRITING_MAX_INPUT_TOKENS'))
+        self.max_input_tokens = max_input_tokens
+        self._budgets: dict[str, TokenBudget] = {}
+        self.token_log = get_token_log()
+        if use_system_instructions is None:
+            use_system_instructions = os.getenv('WRITING_SYSTEM_INSTRUCTIONS', '1') != '0'
+        self.use_system_instructions = use_system_instructions
+        self.context_cache = (context_cache if context_cache is not None
+                              else get_context_cache_policy())
+        self.prompt_version = PROMPT_VERSION
+        if self.context_cache is not None:
+            # Cambiar la guía de estilo invalida las respuestas en caché.
+            digest = hashlib.sha256(self.context_cache.style_guide.encode('utf-8')).hexdigest()
+            self.prompt_version = f'{PROMPT_VERSION}+{digest[:12]}'
+        self.savings = PromptSavings()
+        self.governor = governor if governor is not None else get_governor()
+        # Usuario al que se cargan las llamadas (solo en las vistas de for_user).
+        self.user_id: Optional[str] = None
+        self.priority = INTERACTIVE
+        if use_local_check:
+            self.local_checker = (local_checker if local_checker is not None
+                                  else get_local_checker())
+        else:
+            self.local_checker = None
+        if use_cache:
+            self.cache = cache if cache is not None else get_default_cache()
+        else:
+            self.cache = None
+    
+    def _record(
+        self,
+        operation: str,
+        prompt: str,
+        start: float,
+        response: Any = None,
+        response_chars: int = 0,
+        ttfb: Optional[float] = None,
+        error: Optional[BaseException] = None,
+        model_name: Optional[str] = None,
+        savings: Optional[dict] = None
+    ) -> None:
+        """Registra una llamada en las métricas, si están activadas."""
+        if not self.metrics.enabled:
+            return
+        details = response_details(response) if response is not None else {}
+        if savings is not None:
+            details['instruction_tokens'] = savings['instruction_tokens']
+        self.metrics.record(CallRecord(
+            operation=operation,
+            model=model_name or self.model_name,
+            wall_seconds=time.perf_counter() - start,
+            ttfb_seconds=ttfb,
+            prompt_chars=len(prompt),
+            response_chars=response_chars,
+            error_class=type(error).__name__ if error is not None else None,
+            **details
+        ))
     
-    def fix_grammar(self, text: str) -> dict:
+    def route(self, operation: str, text: str) -> str:
         """
-        Corrige la gramática y la ortografía del texto proporcionado.
+        Devuelve el modelo que atiende una operación según la política de enrutamiento.
         
         Args:
-            text: Texto a corregir.
+            operation: Operación del asistente.
+            text: Texto de entrada del usuario.
             
         Returns:
-            Diccionario con las claves:
-            - 'success': Boolean indicando si fue exitoso.
-            - 'corrected_text': Texto corregido.
-            - 'error': Mensaje de error (si ocurrió).
+            Nombre del modelo.
+        """
+        if self.routing is None:
+            return self.model_name
+        return self.routing.choose(operation, text, self.model_name)
+    
+    @property
+    def model(self) -> Any:
+        """Modelo por defecto del asistente, obtenido del registro al primer uso."""
+        if self._model is None:
+            self._model = self.registry.get_model(self._api_key, self.model_name)
+        return self._model
+    
+    def for_user(self, user_id: str, priority: str = INTERACTIVE) -> 'WritingAssistant':
         """
+        Devuelve una vista del asistente que carga sus llamadas a un usuario.
+        
+        La vista comparte modelos, cachés, limitador y métricas con este
+        asistente; solo añade el usuario y la prioridad con los que el
+        gobernador admite cada llamada al modelo. Las respuestas en caché no
+        consumen cuota. Si una llamada supera un límite, la operación
+        devuelve 'success': False con el motivo en 'error'.
+        
+        Args:
+            user_id: Identificador del usuario.
+            priority: INTERACTIVE (por defecto) o BATCH para trabajos en
+                segundo plano, que solo pueden usar parte de cada límite.
+            
+        Returns:
+            Nuevo WritingAssistant ligado al usuario.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Prioridad desconocida: {priority}")
+        view = copy.copy(self)
+        view.user_id = user_id
+        view.priority = priority
+        return view
+    
+    def usage(self) -> Optional[dict]:
+        """
+        Devuelve el consumo del usuario de esta vista.
+        
+        Returns:
+            Informe de Governor.usage, o None si el asistente no es una vista
+            de for_user.
+        """
+        if self.user_id is None:
+            return None
+        return self.governor.usage(self.user_id)
+    
+    def _admit(self, estimated: int) -> None:
+        """Carga una llamada al usuario de la vista (ver for_user)."""
+        if self.user_id is not None:
+            self.governor.admit(self.user_id, self.priority, estimated)
+    
+    def _try_admit(self, estimated: int) -> bool:
+        """Como _admit, pero sin esperar: devuelve False si no queda margen."""
+        if self.user_id is None:
+            return True
         try:
-            prompt = f"""Eres un experto corrector de gramática y ortografía en español. 
-Corrige el siguiente texto manteniendo el mismo significado y tono. 
-Devuelve solo el texto corregido sin explicaciones adicionales.
-
-Texto: {text}"""
+            self.governor.admit(self.user_id, self.priority, estimated, wait=False)
+        except BudgetExceededError:
+            return False
+        return True
+    
+    def _settle(self, estimated: int, response: Any = None, failed: bool = False) -> None:
+        """Corrige el consumo cargado por _admit con los tokens de la respuesta."""
+        if self.user_id is None:
+            return
+        if failed:
+            self.governor.settle(self.user_id, estimated, 0, None)
+            return
+        details = response_details(response) if response is not None else {}
+        self.governor.settle(self.user_id, estimated, details.get('input_tokens'),
+                             details.get('output_tokens'))
+    
+    def _get_model(self, model_name: str, instruction: Optional[str] = None) -> Any:
+        """
+        Devuelve el modelo indicado desde el registro de clientes.
+        
+        Args:
+            model_name: Nombre del modelo.
+            instruction: Instrucción de sistema del modelo. Si incluye la guía
+                de estilo y esta alcanza el mínimo de la caché de contexto, se
+                devuelve un modelo ligado a una caché explícita.
             
-            response = self.model.generate_content(prompt)
-            corrected_text = response.text.strip()
+        Returns:
+            Instancia de GenerativeModel reutilizable.
+        """
+        if instruction is None:
+            if model_name == self.model_name:
+                return self.model
+            return self.registry.get_model(self._api_key, model_name)
+        policy = self.context_cache
+        if policy is not None and policy.should_cache(model_name, estimate_tokens(instruction)):
+            try:
+                return self.registry.get_cached_model(
+                    self._api_key, model_name, instruction,
+                    ttl_seconds=policy.ttl_seconds, refresh_seconds=policy.refresh_seconds
+                )
+            except Exception:
+                # Sin caché la guía sigue yendo en la instrucción de sistema.
+                policy.record_failure(model_name)
+        return self.registry.get_model(self._api_key, model_name, system_instruction=instruction)
+    
+    def _prompt(
+        self,
+        operation: str,
+        text: str,
+        tone: Optional[str] = None,
+        context: Optional[str] = None
+    ) -> tuple[str, str]:
+        """
+        Devuelve la instrucción fija y el mensaje variable de una operación.
+        
+        Args:
+            operation: Operación del asistente.
+            text: Texto o tema del usuario.
+            tone: Tono solicitado, si la operación lo usa.
+            context: Contexto anterior del fragmento en un documento largo.
             
-            return {
-                'success': True,
-                'corrected_text': corrected_text,
-                'error': None
-            }
+        Returns:
+            Tupla (instrucción con la guía de estilo, mensaje del usuario).
+        """
+        style_guide = self.context_cache.style_guide if self.context_cache is not None else None
+        return (with_style_guide(system_instruction(operation, tone), style_guide),
+                build_user_prompt(operation, text, context))
+    
+    def _guide_instruction(self) -> Optional[str]:
+        """
+        Devuelve la instrucción de sistema con solo la guía de estilo.
+        
+        La usan los prompts que ya llevan sus propias instrucciones
+        (canalizaciones y lotes); None si no hay guía de estilo.
+        """
+        if self.context_cache is None:
+            return None
+        return with_style_guide('Eres un asistente de escritura en español.',
+                                self.context_cache.style_guide)
+    
+    def _request(self, model_name: str, prompt: str, instruction: Optional[str]) -> tuple[Any, str]:
+        """
+        Devuelve el modelo y el contenido a enviar para una llamada.
+        
+        Con instrucciones de sistema, la instrucción va en el modelo; sin
+        ellas, se antepone al prompt como antes.
+        """
+        if instruction is None:
+            return self._get_model(model_name), prompt
+        if self.use_system_instructions:
+            return self._get_model(model_name, instruction), prompt
+        return self._get_model(model_name), join_prompt(instruction, prompt)
+    
+    def _record_savings(
+        self,
+        operation: str,
+        full_prompt: str,
+        instruction: Optional[str],
+        response: Any
+    ) -> Optional[dict]:
+        """Registra los tokens de entrada de una llamada frente al prompt en línea."""
+        details = response_details(response) if response is not None else {}
+        input_tokens = details.get('input_tokens') or estimate_tokens(full_prompt)
+        return self.savings.record(operation,
+                                   estimate_tokens(instruction) if instruction else 0,
+                                   input_tokens, details.get('cached_tokens') or 0)
+    
+    def prompt_savings(self) -> dict:
+        """
+        Devuelve los tokens de entrada ahorrados frente a los prompts en línea.
+        
+        Returns:
+            Diccionario {operación: {...}} con las claves de
+            PromptSavings.report().
+        """
+        return self.savings.report()
+    
+    def _alternate_model(self, primary: str) -> Optional[str]:
+        """Devuelve el modelo al que se envía la petición de respaldo."""
+        candidates = [self.hedger.policy.alternate_model, self.model_name,
+                      self.routing.light_model if self.routing is not None else None]
+        return next((name for name in candidates if name and name != primary), None)
+    
+    def hedge_stats(self) -> dict:
+        """
+        Devuelve las estadísticas de hedging por modelo.
+        
+        Returns:
+            Diccionario {modelo: {'requests', 'hedges', 'hedge_rate', 'races',
+            'wins', 'win_rate'}}; vacío si el hedging está desactivado.
+        """
+        return self.hedger.stats.stats() if self.hedger is not None else {}
+    
+    def budget(self, model_name: Optional[str] = None) -> TokenBudget:
+        """
+        Devuelve el presupuesto de tokens de un modelo.
+        
+        Args:
+            model_name: Modelo (por defecto, el del asistente).
+            
+        Returns:
+            TokenBudget con los límites del modelo.
+        """
+        model_name = model_name or self.model_name
+        budget = self._budgets.get(model_name)
+        if budget is None:
+            budget = self._budgets[model_name] = TokenBudget(
+                model_name, max_input_tokens=self.max_input_tokens)
+        return budget
+    
+    def _output_config(
+        self,
+        operation: str,
+        text: str,
+        model_name: str,
+        base: Optional[dict] = None,
+        items: int = 1
+    ) -> dict:
+        """Añade a la configuración de generación el max_output_tokens planificado."""
+        return dict(base or {},
+                    max_output_tokens=self.budget(model_name).output_tokens(operation, text, items))
+    
+    def _generate_planned(
+        self,
+        prompt: str,
+        operation: str,
+        text: str,
+        model_name: Optional[str] = None,
+        base_config: Optional[dict] = None,
+        items: int = 1,
+        instruction: Optional[str] = None
+    ) -> Any:
+        """
+        Llama al modelo tras validar el prompt y planificar la salida.
+        
+        Si la respuesta se corta por max_output_tokens, se repite una vez con
+        el límite de salida del modelo.
+        
+        Args:
+            prompt: Prompt completo.
+            operation: Operación que origina la llamada.
+            text: Texto de entrada del usuario (mide la salida esperada).
+            model_name: Modelo a usar (por defecto, el del asistente).
+            base_config: Configuración de generación adicional.
+            items: Resultados que debe producir la respuesta.
+            instruction: Instrucción fija de la operación (ver _generate).
+            
+        Returns:
+            Respuesta del SDK de Gemini.
+            
+        Raises:
+            PromptTooLargeError: Si el prompt supera el límite de entrada.
+        """
+        model_name = model_name or self.model_name
+        budget = self.budget(model_name)
+        # La instrucción de sistema cuenta para el límite igual que en línea.
+        budget.check_input(join_prompt(instruction, prompt) if instruction else prompt)
+        config = self._output_config(operation, text, model_name, base_config, items)
+        response = self._generate(prompt, operation, config, model_name, instruction)
+        if is_truncated(response) and config['max_output_tokens'] < budget.max_output_tokens:
+            config['max_output_tokens'] = budget.max_output_tokens
+            response = self._generate(prompt, operation, config, model_name, instruction)
+        return response
+    
+    def _generate(
+        self,
+        prompt: str,
+        operation: str = 'generate',
+        generation_config: Optional[dict] = None,
+        model_name: Optional[str] = None,
+        instruction: Optional[str] = None
+    ) -> Any:
+        """
+        Llama al modelo a través del limitador de tasa.
+        
+        Los errores transitorios (cuota, sobrecarga) se reintentan con espera
+        exponencial; los permanentes se propagan. Con hedging activado, si el
+        modelo no responde tras el percentil de latencia configurado se lanza
+        una segunda petición a un modelo alternativo y se usa la primera
+        respuesta.
+        
+        Args:
+            prompt: Prompt completo, o solo el mensaje del usuario si se
+                indica instruction.
+            operation: Operación que origina la llamada (para las métricas).
+            generation_config: Configuración de generación para esta llamada.
+            model_name: Modelo a usar (por defecto, el del asistente).
+            instruction: Instrucción fija de la operación. Se envía como
+                system_instruction de un modelo reutilizado (o en línea si
+                use_system_instructions es False).
+            
+        Returns:
+            Respuesta del SDK de Gemini.
+        """
+        model_name = model_name or self.model_name
+        full_prompt = join_prompt(instruction, prompt) if instruction else prompt
+        estimated = estimate_tokens(full_prompt)
+        kwargs = {'generation_config': generation_config} if generation_config else {}
+        
+        # Cada petición, también la de respaldo del hedging, liquida su propio
+        # consumo en el gobernador y el limitador.
+        def call(name: str) -> Any:
+            try:
+                model, contents = self._request(name, prompt, instruction)
+                response = self.rate_limiter.call(
+                    lambda: model.generate_content(contents, **kwargs), estimated
+                )
+            except Exception:
+                self._settle(estimated, failed=True)
+                raise
+            self._settle(estimated, response)
+            self.rate_limiter.record_usage(estimated, total_tokens(response))
+            return response
+        
+        def hedge(name: str) -> bool:
+            return (self.rate_limiter.has_headroom(estimated)
+                    and self._try_admit(estimated))
+        
+        self._admit(estimated)
+        start = time.perf_counter()
+        try:
+            if self.hedger is not None:
+                response = self.hedger.call(
+                    model_name, self._alternate_model(model_name), call,
+                    self.metrics.record_hedge, on_hedge=hedge,
+                    on_cancel=lambda name: self._settle(estimated, failed=True)
+                )
+            else:
+                response = call(model_name)
+        except Exception as e:
+            self._record(operation, full_prompt, start, error=e, model_name=model_name)
+            raise
+        self._observe_latency(operation, time.perf_counter() - start)
+        if self.token_log is not None:
+            self.token_log.record(full_prompt, response)
+        savings = self._record_savings(operation, full_prompt, instruction, response)
+        if self.metrics.enabled:
+            self._record(operation, full_prompt, start, response, len(_chunk_text(response)),
+                         model_name=model_name, savings=savings)
+        return response
+    
+    def _observe_latency(self, operation: str, seconds: float, alpha: float = 0.2) -> None:
+        """Actualiza la media móvil exponencial de latencia de una operación."""
+        previous = self._latency.get(operation)
+        self._latency[operation] = (seconds if previous is None
+                                    else previous + alpha * (seconds - previous))
+    
+    def expected_seconds(self, operation: str) -> Optional[float]:
+        """
+        Devuelve la latencia esperada de una operación según las llamadas previas.
+        
+        Args:
+            operation: Operación del asistente.
+            
+        Returns:
+            Segundos esperados, o None si todavía no hay observaciones.
+        """
+        mean = self.metrics.mean_duration(operation) if self.metrics.enabled else None
+        return mean if mean is not None else self._latency.get(operation)
+    
+    def _generate_stream(
+        self,
+        prompt: str,
+        operation: str = 'generate',
+        model_name: Optional[str] = None,
+        generation_config: Optional[dict] = None,
+        instruction: Optional[str] = None
+    ) -> Iterator[Any]:
+        """
+        Versión en streaming de _generate: produce los fragmentos de la respuesta.
+        
+        Solo se reintenta el inicio de la llamada; un corte a mitad del stream
+        se propaga al consumidor. Si la respuesta termina por MAX_TOKENS se
+        lanza OutputTruncatedError tras el último fragmento, de modo que
+        TextStream la marca como parcial. Las respuestas en streaming no se
+        cubren con hedging.
         
+        Args:
+            prompt: Prompt completo.
+            operation: Operación que origina la llamada (para las métricas).
+            model_name: Modelo a usar (por defecto, el del asistente).
+            generation_config: Configuración de generación para esta llamada.
+            instruction: Instrucción fija de la operación (ver _generate).
+            
+        Yields:
+            Fragmentos de respuesta del SDK de Gemini.
+        """
+        model_name = model_name or self.model_name
+        model, contents = self._request(model_name, prompt, instruction)
+        full_prompt = join_prompt(instruction, prompt) if instruction else prompt
+        estimated = estimate_tokens(full_prompt)
+        kwargs = {'generation_config': generation_config} if generation_config else {}
+        self._admit(estimated)
+        start = time.perf_counter()
+        ttfb = None
+        last = None
+        chars = 0
+        try:
+            response = self.rate_limiter.call(
+                lambda: model.generate_content(contents, stream=True, **kwargs), estimated
+            )
+            for chunk in response:
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                last = chunk
+                chars += len(_chunk_text(chunk))
+                yield chunk
         except Exception as e:
+            self._settle(estimated, last, failed=last is None)
+            self._record(operation, full_prompt, start, last, chars, ttfb, error=e,
+                         model_name=model_name)
+            raise
+        self._settle(estimated, last)
+        self.rate_limiter.record_usage(estimated, total_tokens(last))
+        savings = self._record_savings(operation, full_prompt, instruction, last)
+        self._record(operation, full_prompt, start, last, chars, ttfb, model_name=model_name,
+                     savings=savings)
+        if is_truncated(last):
+            raise OutputTruncatedError(
+                'la respuesta alcanzó el límite de tokens de salida del modelo'
+            )
+    
+    def _local_fix(self, text: str) -> str:
+        """
+        Aplica las correcciones locales seguras de fix_grammar.
+        
+        Args:
+            text: Texto a corregir.
+            
+        Returns:
+            Texto con las correcciones aplicadas, que se envía al modelo.
+        """
+        if self.local_checker is None:
+            return text
+        return self.local_checker.check(text).text
+    
+    def _split_oversize(
+        self,
+        operation: str,
+        text: str,
+        tone: Optional[str] = None,
+        bypass_cache: bool = False
+    ) -> Optional[dict]:
+        """
+        Procesa por fragmentos un texto cuyo prompt no cabe en el límite de entrada.
+        
+        Args:
+            operation: 'fix_grammar' o 'improve_style'.
+            text: Texto de entrada del usuario.
+            tone: Tono solicitado, si la operación lo usa.
+            bypass_cache: Si es True, ignora la caché de respuestas.
+            
+        Returns:
+            Resultado de process_long_document, o None si el texto cabe en
+            una sola llamada.
+        """
+        budget = self.budget(self.route(operation, text))
+        if budget.fits(join_prompt(*self._prompt(operation, text, tone))):
+            return None
+        # Cada fragmento lleva además las instrucciones y hasta 200 caracteres
+        # de contexto (el solapamiento por defecto de process_long_document).
+        overhead = estimate_tokens(join_prompt(*self._prompt(operation, '', tone,
+                                                             context='x' * 200)))
+        return self.process_long_document(text, operation, tone,
+                                          max_chars=budget.max_chunk_chars(text, overhead),
+                                          bypass_cache=bypass_cache)
+    
+    def _run(
+        self,
+        operation: str,
+        result_key: str,
+        text: str,
+        tone: Optional[str] = None,
+        bypass_cache: bool = False,
+        context: Optional[str] = None
+    ) -> dict:
+        """
+        Ejecuta una operación consultando antes la caché de respuestas.
+        
+        Si otro hilo ya está enviando el mismo prompt al mismo modelo, se
+        espera su resultado en lugar de hacer una llamada nueva.
+        
+        Args:
+            operation: Nombre de la operación (se usa en la clave de caché).
+            result_key: Clave del diccionario de resultado con el texto producido.
+            text: Texto de entrada del usuario.
+            tone: Tono solicitado, si la operación lo usa.
+            bypass_cache: Si es True, ignora la caché para esta llamada.
+            context: Contexto anterior del fragmento en un documento largo.
+            
+        Returns:
+            Diccionario con las claves 'success', result_key y 'error'.
+        """
+        instruction, prompt = self._prompt(operation, text, tone, context)
+        model_name = self.route(operation, text)
+        key = None
+        if self.cache is not None and not bypass_cache:
+            key = make_cache_key(operation, text, tone, model_name, self.prompt_version)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.metrics.record_cache_hit(operation)
+                return cached
+        
+        def call_model() -> dict:
+            try:
+                response = self._generate_planned(prompt, operation, text, model_name,
+                                                  instruction=instruction)
+                output_text = response.text.strip()
+                
+                result = {
+                    'success': True,
+                    result_key: output_text,
+                    'error': None
+                }
+            
+            except Exception as e:
+                return {
+                    'success': False,
+                    result_key: None,
+                    'error': f'Error: {str(e)}'
+                }
+            
+            if key is not None:
+                self.cache.set(key, result)
+            return result
+        
+        # Las llamadas simultáneas con el mismo prompt y modelo comparten una
+        # única petición al modelo y reciben el mismo resultado.
+        flight_key = make_cache_key(operation, prompt, tone, model_name, self.prompt_version)
+        result, _ = self.single_flight.do(flight_key, call_model)
+        return dict(result)
+    
+    def _run_incremental(
+        self,
+        operation: str,
+        text: str,
+        history: ParagraphHistory,
+        tone: Optional[str] = None,
+        bypass_cache: bool = False,
+        max_workers: int = 4
+    ) -> dict:
+        """
+        Procesa solo los párrafos que cambiaron desde la ejecución anterior.
+        
+        Cada párrafo se identifica por el hash de (operación, tono, modelo,
+        versión del prompt, texto). Los que ya están en el historial se
+        reutilizan; el resto se envía al modelo en paralelo y los resultados
+        se intercalan con los separadores originales.
+        
+        Args:
+            operation: 'fix_grammar' o 'improve_style'.
+            text: Texto completo.
+            history: Historial de la ejecución anterior (se actualiza).
+            tone: Tono solicitado, si la operación lo usa.
+            bypass_cache: Si es True, recalcula todos los párrafos.
+            max_workers: Número máximo de párrafos procesados a la vez.
+            
+        Returns:
+            Diccionario con 'success', la clave del texto y 'error', más
+            'reused_paragraphs' y 'recomputed_paragraphs'.
+        """
+        result_key = RESULT_KEYS[operation]
+        leading = text[:len(text) - len(text.lstrip())]
+        trailing = text[len(text.rstrip()):]
+        paragraphs = split_paragraphs(text.strip())
+        keys = [make_cache_key(operation, paragraph, tone, self.route(operation, paragraph),
+                               self.prompt_version)
+                for paragraph, _ in paragraphs]
+        
+        outputs: list[Optional[str]] = [
+            None if bypass_cache else history.get(key) for key in keys
+        ]
+        changed = [i for i, output in enumerate(outputs) if output is None]
+        reused = len(paragraphs) - len(changed)
+        
+        def process(index: int) -> dict:
+            paragraph = paragraphs[index][0]
+            if operation == 'fix_grammar':
+                paragraph = self._local_fix(paragraph)
+            return self._run(operation, result_key, paragraph, tone=tone,
+                             bypass_cache=bypass_cache)
+        
+        errors = []
+        if changed:
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                for index, result in zip(changed, executor.map(process, changed)):
+                    if result['success']:
+                        outputs[index] = result[result_key]
+                    else:
+                        errors.append(result['error'])
+        
+        if errors:
             return {
                 'success': False,
-                'corrected_text': None,
-                'error': f'Error: {str(e)}'
+                result_key: None,
+                'error': errors[0],
+                'reused_paragraphs': reused,
+                'recomputed_paragraphs': len(changed)
             }
+        
+        history.replace(dict(zip(keys, outputs)), reused, len(changed))
+        body = ''.join(output.strip() + separator
+                       for output, (_, separator) in zip(outputs, paragraphs))
+        return {
+            'success': True,
+            result_key: leading + body + trailing,
+            'error': None,
+            'reused_paragraphs': reused,
+            'recomputed_paragraphs': len(changed)
+        }
+    
+    def process_long_document(
+        self,
+        text: str,
+        operation: str = 'fix_grammar',
+        tone: Optional[str] = None,
+        max_chars: int = 4000,
+        overlap_chars: int = 200,
+        max_workers: int = 4,
+        max_retries: int = 2,
+        bypass_cache: bool = False,
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> dict:
+        """
+        Procesa un documento largo dividiéndolo en fragmentos en paralelo.
+        
+        El texto se divide por párrafos y oraciones en fragmentos de como máximo
+        max_chars caracteres. Cada fragmento se envía con el final del anterior
+        como contexto, los fragmentos se procesan concurrentemente y solo los
+        que fallan se reintentan. El resultado se reensambla en orden
+        conservando los separadores originales.
+        
+        Args:
+            text: Documento completo.
+            operation: 'fix_grammar' o 'improve_style'.
+            tone: Tono deseado (solo para improve_style).
+            max_chars: Tamaño máximo de cada fragmento.
+            overlap_chars: Caracteres del fragmento anterior enviados como contexto.
+            max_workers: Número máximo de fragmentos procesados a la vez.
+            max_retries: Reintentos por fragmento fallido.
+            bypass_cache: Si es True, ignora la caché de respuestas.
+            on_progress: Función a invocar con (fragmentos terminados, total)
+                cada vez que termina uno. Si lanza una excepción, no se envían
+                más fragmentos y la excepción se propaga.
+            
+        Returns:
+            Diccionario con 'success', la clave del texto de la operación y
+            'error', más 'chunks' (número de fragmentos) y 'failed_chunks'
+            (índices que fallaron tras los reintentos). Si algún fragmento falla,
+            el texto devuelto conserva el original en esos fragmentos y se
+            marca con 'partial': True.
+        """
+        if operation not in ('fix_grammar', 'improve_style'):
+            raise ValueError(f"Operación no admitida para documentos largos: {operation}")
+        
+        result_key = RESULT_KEYS[operation]
+        chunks = split_into_chunks(text, max_chars, overlap_chars)
+        outputs: list[Optional[str]] = [None] * len(chunks)
+        errors: dict[int, str] = {}
+        
+        def process(index: int) -> dict:
+            chunk = chunks[index]
+            return self._run(operation, result_key, chunk.text, tone=tone,
+                             bypass_cache=bypass_cache, context=chunk.context)
+        
+        pending = list(range(len(chunks)))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            for _ in range(max_retries + 1):
+                if not pending:
+                    break
+                futures = {executor.submit(process, index): index for index in pending}
+                failed = []
+                try:
+                    for future in as_completed(futures):
+                        index, result = futures[future], future.result()
+                        if result['success']:
+                            outputs[index] = result[result_key]
+                            errors.pop(index, None)
+                            if on_progress is not None:
+                                on_progress(sum(output is not None for output in outputs),
+                                            len(chunks))
+                        else:
+                            errors[index] = result['error']
+                            failed.append(index)
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+                pending = sorted(failed)
+        
+        if not errors:
+            return {
+                'success': True,
+                result_key: reassemble(text, chunks, outputs),
+                'error': None,
+                'chunks': len(chunks),
+                'failed_chunks': []
+            }
+        
+        merged = [output if output is not None else chunk.text
+                  for chunk, output in zip(chunks, outputs)]
+        failed_chunks = sorted(errors)
+        return {
+            'success': False,
+            result_key: reassemble(text, chunks, merged),
+            'error': (f'Error: fallaron {len(failed_chunks)} de {len(chunks)} fragmentos '
+                      f'(se conserva el texto original en ellos). '
+                      f'Último error: {errors[failed_chunks[-1]]}'),
+            'partial': True,
+            'chunks': len(chunks),
+            'failed_chunks': failed_chunks
+        }
+    
+    def run_pipeline(self, text: str, steps: list, bypass_cache: bool = False) -> dict:
+        """
+        Ejecuta varias operaciones encadenadas en una sola llamada al modelo.
+        
+        Los pasos se combinan en un prompt fusionado que pide el resultado de
+        cada paso como JSON estructurado, de modo que el texto se envía una
+        sola vez. Si la respuesta no es un JSON válido con un resultado por
+        paso, se ejecutan los pasos uno tras otro con las operaciones normales.
+        Los resultados intermedios se guardan también en la caché de cada
+        operación.
+        
+        Args:
+            text: Texto de entrada.
+            steps: Pasos en orden, p. ej. ['grammar', 'style:Formal'].
+            bypass_cache: Si es True, consulta siempre al modelo.
+            
+        Returns:
+            Diccionario con las claves:
+            - 'success': Boolean indicando si fue exitoso.
+            - 'final_text': Resultado del último paso.
+            - 'steps': Lista de {'step', 'text'} con cada resultado intermedio.
+            - 'error': Mensaje de error (si ocurrió).
+            - 'fused': True si se resolvió con una sola llamada.
+            - 'elapsed_seconds': Duración de la canalización.
+            - 'sequential_estimate_seconds': Duración estimada (o medida, si se
+              recurrió a ellas) de las llamadas secuenciales; None sin datos.
+            - 'saved_seconds': Diferencia entre ambas; None sin datos.
+        """
+        parsed = parse_steps(steps)
+        names = [step.name for step in parsed]
+        start = time.perf_counter()
+        
+        def finish(result: dict, sequential: Optional[float]) -> dict:
+            elapsed = time.perf_counter() - start
+            return dict(
+                result,
+                elapsed_seconds=elapsed,
+                sequential_estimate_seconds=sequential,
+                saved_seconds=sequential - elapsed if sequential is not None else None
+            )
+        
+        # Estimación previa: suma de las latencias medias de cada operación.
+        expected = [self.expected_seconds(step.operation) for step in parsed]
+        estimate = sum(expected) if None not in expected else None
+        
+        key = None
+        if self.cache is not None and not bypass_cache:
+            key = make_cache_key('pipeline', text, '|'.join(names), self.model_name,
+                                 self.prompt_version)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.metrics.record_cache_hit('pipeline')
+                return finish(cached, estimate)
+        
+        prompt = build_fused_prompt(text, [step_instruction(step) for step in parsed])
+        
+        def call_model() -> Optional[list[str]]:
+            try:
+                response = self._generate_planned(prompt, 'pipeline', text,
+                                                  base_config=JSON_GENERATION_CONFIG,
+                                                  items=len(parsed),
+                                                  instruction=self._guide_instruction())
+            except Exception:
+                return None
+            return parse_fused_response(_chunk_text(response), len(parsed))
+        
+        flight_key = make_cache_key('pipeline', prompt, None, self.model_name, self.prompt_version)
+        outputs, _ = self.single_flight.do(flight_key, call_model)
+        
+        if outputs is not None:
+            step_input = text
+            for step, output in zip(parsed, outputs):
+                if self.cache is not None:
+                    self.cache.set(
+                        make_cache_key(step.operation, step_input, step.tone,
+                                       self.route(step.operation, step_input), self.prompt_version),
+                        {'success': True, RESULT_KEYS[step.operation]: output, 'error': None}
+                    )
+                step_input = output
+            result = {
+                'success': True,
+                'final_text': outputs[-1],
+                'steps': [{'step': name, 'text': output} for name, output in zip(names, outputs)],
+                'error': None,
+                'fused': True
+            }
+            if key is not None:
+                self.cache.set(key, result)
+            return finish(result, estimate)
+        
+        # Respuesta no estructurada o fallida: se recurre a las llamadas secuenciales.
+        sequential_start = time.perf_counter()
+        step_input = text
+        results = []
+        for step, name in zip(parsed, names):
+            result_key = RESULT_KEYS[step.operation]
+            result = self._run(step.operation, result_key, step_input, tone=step.tone,
+                               bypass_cache=bypass_cache)
+            if not result['success']:
+                return finish({
+                    'success': False,
+                    'final_text': None,
+                    'steps': results,
+                    'error': result['error'],
+                    'fused': False
+                }, None)
+            step_input = result[result_key]
+            results.append({'step': name, 'text': step_input})
+        
+        result = {
+            'success': True,
+            'final_text': step_input,
+            'steps': results,
+            'error': None,
+            'fused': False
+        }
+        if key is not None:
+            self.cache.set(key, result)
+        return finish(result, time.perf_counter() - sequential_start)
+    
+    def _stream(
+        self,
+        operation: str,
+        text: str,
+        tone: Optional[str] = None,
+        bypass_cache: bool = False
+    ) -> TextStream:
+        """
+        Prepara la versión en streaming de una operación.
+        
+        Args:
+            operation: Nombre de la operación.
+            text: Texto de entrada del usuario.
+            tone: Tono solicitado, si la operación lo usa.
+            bypass_cache: Si es True, ignora la caché para esta llamada.
+            
+        Returns:
+            TextStream listo para iterar.
+        """
+        result_key = RESULT_KEYS[operation]
+        instruction, prompt = self._prompt(operation, text, tone)
+        model_name = self.route(operation, text)
+        
+        key = None
+        cached = None
+        if self.cache is not None and not bypass_cache:
+            key = make_cache_key(operation, text, tone, model_name, self.prompt_version)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.metrics.record_cache_hit(operation)
+        
+        def open_stream() -> Iterator[Any]:
+            # Sin el max_output_tokens planificado: un stream ya mostrado no se
+            # puede repetir con más margen como en _generate_planned.
+            self.budget(model_name).check_input(join_prompt(instruction, prompt))
+            return self._generate_stream(prompt, operation, model_name,
+                                         instruction=instruction)
+        
+        def on_success(result: dict) -> None:
+            if key is not None:
+                self.cache.set(key, result)
+        
+        return TextStream(result_key, open_stream, on_success, cached)
+    
+    def fix_grammar_stream(self, text: str, bypass_cache: bool = False) -> TextStream:
+        """
+        Versión en streaming de fix_grammar.
+        
+        Args:
+            text: Texto a corregir.
+            bypass_cache: Si es True, consulta siempre al modelo.
+            
+        Returns:
+            TextStream cuyo resultado final usa la clave 'corrected_text'.
+        """
+        return self._stream('fix_grammar', self._local_fix(text), bypass_cache=bypass_cache)
+    
+    def improve_style_stream(self, text: str, tone: str, bypass_cache: bool = False) -> TextStream:
+        """
+        Versión en streaming de improve_style.
+        
+        Args:
+            text: Texto a mejorar.
+            tone: Tono deseado (Formal, Creativo, Casual).
+            bypass_cache: Si es True, consulta siempre al modelo.
+            
+        Returns:
+            TextStream cuyo resultado final usa la clave 'improved_text'.
+        """
+        return self._stream('improve_style', text, tone=tone, bypass_cache=bypass_cache)
+    
+    def generate_content_stream(self, topic: str, bypass_cache: bool = False) -> TextStream:
+        """
+        Versión en streaming de generate_content.
+        
+        Args:
+            topic: Tema o idea para generar contenido.
+            bypass_cache: Si es True, genera siempre un texto nuevo.
+            
+        Returns:
+            TextStream cuyo resultado final usa la clave 'generated_text'.
+        """
+        return self._stream('generate_content', topic, bypass_cache=bypass_cache)
     
-    def improve_style(self, text: str, tone: str) -> dict:
+    def fix_grammar(
+        self,
+        text: str,
+        bypass_cache: bool = False,
+        history: Optional[ParagraphHistory] = None
+    ) -> dict:
+        """
+        Corrige la gramática y la ortografía del texto proporcionado.
+        
+        Antes se aplican las correcciones locales seguras (tildes, espacios,
+        signos de apertura) y el texto corregido se envía al modelo. Si el
+        prompt no cabe en el límite de tokens de entrada, el texto se procesa
+        por fragmentos con process_long_document.
+        
+        Args:
+            text: Texto a corregir.
+            bypass_cache: Si es True, consulta siempre al modelo.
+            history: Si se indica, activa el modo incremental: solo se envían
+                los párrafos que cambiaron desde la ejecución anterior.
+            
+        Returns:
+            Diccionario con las claves:
+            - 'success': Boolean indicando si fue exitoso.
+            - 'corrected_text': Texto corregido.
+            - 'error': Mensaje de error (si ocurrió).
+            En modo incremental incluye además 'reused_paragraphs' y
+            'recomputed_paragraphs'.
+        """
+        if history is not None:
+            return self._run_incremental('fix_grammar', text, history,
+                                         bypass_cache=bypass_cache)
+        text = self._local_fix(text)
+        split = self._split_oversize('fix_grammar', text, bypass_cache=bypass_cache)
+        if split is not None:
+            return split
+        return self._run('fix_grammar', 'corrected_text', text, bypass_cache=bypass_cache)
+    
+    def fix_grammar_many(self, texts: list[str], bypass_cache: bool = False) -> list[dict]:
+        """
+        Corrige varios textos cortos con una sola llamada al modelo.
+        
+        Tras las correcciones locales, los textos que no están en caché se
+        envían juntos como una lista JSON indexada. Los elementos que faltan o
+        no son válidos en la respuesta, o todos si falla la llamada del lote,
+        se reintentan uno a uno con fix_grammar.
+        
+        Args:
+            texts: Textos a corregir.
+            bypass_cache: Si es True, consulta siempre al modelo.
+            
+        Returns:
+            Un diccionario por texto, en el mismo orden, con las claves de
+            fix_grammar. Los que pasaron por el lote incluyen 'batched': True
+            si se resolvieron en él o False si se reintentaron por separado.
+        """
+        results: list[Optional[dict]] = [None] * len(texts)
+        texts = [self._local_fix(text) for text in texts]
+        model_name = self.route('fix_grammar', max(texts, key=len, default=''))
+        keys: list[Optional[str]] = [None] * len(texts)
+        if self.cache is not None:
+            for i, text in enumerate(texts):
+                keys[i] = make_cache_key('fix_grammar', text, None, model_name, self.prompt_version)
+                if not bypass_cache:
+                    cached = self.cache.get(keys[i])
+                    if cached is not None:
+                        self.metrics.record_cache_hit('fix_grammar')
+                        results[i] = cached
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        if len(missing) == 1:
+            results[missing[0]] = self.fix_grammar(texts[missing[0]], bypass_cache=bypass_cache)
+        elif missing:
+            prompt = build_batch_prompt([texts[i] for i in missing])
+            try:
+                response = self._generate_planned(prompt, 'fix_grammar_batch',
+                                                  '\n'.join(texts[i] for i in missing),
+                                                  model_name, JSON_GENERATION_CONFIG,
+                                                  instruction=self._guide_instruction())
+                outputs = parse_batch_response(_chunk_text(response), len(missing))
+            except Exception:
+                # Si falla el lote entero (reintentos agotados, respuesta
+                # ilegible), cada texto se reintenta por separado.
+                outputs = [None] * len(missing)
+            
+            retry = []
+            for i, output in zip(missing, outputs):
+                if output is None:
+                    retry.append(i)
+                    continue
+                result = {'success': True, 'corrected_text': output, 'error': None}
+                if keys[i] is not None:
+                    self.cache.set(keys[i], result)
+                results[i] = dict(result, batched=True)
+            
+            if retry:
+                with ThreadPoolExecutor(max_workers=min(4, len(retry))) as executor:
+                    retried = executor.map(
+                        lambda i: self.fix_grammar(texts[i], bypass_cache=bypass_cache), retry
+                    )
+                    for i, result in zip(retry, retried):
+                        results[i] = dict(result, batched=False)
+        return results
+    
+    def improve_style(
+        self,
+        text: str,
+        tone: str,
+        bypass_cache: bool = False,
+        history: Optional[ParagraphHistory] = None
+    ) -> dict:
         """
         Mejora el estilo del texto según el tono especificado.
         
+        Si el prompt no cabe en el límite de tokens de entrada, el texto se
+        procesa por fragmentos con process_long_document.
+        
         Args:
             text: Texto a mejorar.
             tone: Tono deseado (Formal, Creativo, Casual).
+            bypass_cache: Si es True, consulta siempre al modelo.
+            history: Si se indica, activa el modo incremental. Debe usarse un
+                historial distinto para cada tono.
             
         Returns:
             Diccionario con las claves:
             - 'success': Boolean indicando si fue exitoso.
             - 'improved_text': Texto mejorado.
             - 'error': Mensaje de error (si ocurrió).
+            En modo incremental incluye además 'reused_paragraphs' y
+            'recomputed_paragraphs'.
         """
-        tone_instructions = {
-            'Formal': 'Usa un lenguaje profesional y cortés. Mantén estructuras de oraciones complejas.',
-            'Creativo': 'Usa un lenguaje imaginativo y expresivo. Incluye metáforas y descripción vivida.',
-            'Casual': 'Usa un lenguaje relajado y conversacional. Como si hablaras con un amigo.'
-        }
+        if history is not None:
+            return self._run_incremental('improve_style', text, history, tone=tone,
+                                         bypass_cache=bypass_cache)
+        split = self._split_oversize('improve_style', text, tone, bypass_cache)
+        if split is not None:
+            return split
+        return self._run('improve_style', 'improved_text', text, tone=tone,
+                         bypass_cache=bypass_cache)
+    
+    def improve_style_all(
+        self,
+        text: str,
+        tones: Optional[list[str]] = None,
+        bypass_cache: bool = False
+    ) -> dict:
+        """
+        Mejora el estilo del texto en varios tonos a la vez.
         
-        instructions = tone_instructions.get(tone, tone_instructions['Formal'])
+        Cada tono se procesa con improve_style en su propio hilo, de modo que
+        la latencia total se acerca a la del tono más lento y no a la suma.
+        El fallo de un tono no afecta a los demás.
         
-        try:
-            prompt = f"""Eres un experto editor de textos en español. 
-Reescribe el siguiente texto manteniendo el contenido pero cambiando el estilo. 
-Instrucción de tono: {instructions}
-Devuelve solo el texto reescrito sin explicaciones.
-
-Texto: {text}"""
-            
-            response = self.model.generate_content(prompt)
-            improved_text = response.text.strip()
+        Args:
+            text: Texto a mejorar.
+            tones: Tonos deseados. Si es None se usan todos (Formal, Creativo, Casual).
+            bypass_cache: Si es True, consulta siempre al modelo.
             
-            return {
-                'success': True,
-                'improved_text': improved_text,
-                'error': None
-            }
+        Returns:
+            Diccionario con las claves:
+            - 'success': True si al menos un tono se resolvió.
+            - 'results': Diccionario tono → resultado de improve_style, en el
+              orden de tones.
+            - 'error': Mensaje de error si fallaron todos los tonos.
+        """
+        tones = list(dict.fromkeys(tones if tones is not None else TONES))
+        results: dict[str, dict] = {}
+        if tones:
+            with ThreadPoolExecutor(max_workers=len(tones)) as executor:
+                futures = {
+                    tone: executor.submit(self.improve_style, text, tone, bypass_cache)
+                    for tone in tones
+                }
+                for tone, future in futures.items():
+                    try:
+                        results[tone] = future.result()
+                    except Exception as e:
+                        results[tone] = {'success': False, 'improved_text': None,
+                                         'error': f'Error: {str(e)}'}
         
-        except Exception as e:
-            return {
-                'success': False,
-                'improved_text': None,
-                'error': f'Error: {str(e)}'
-            }
+        failed = [tone for tone, result in results.items() if not result['success']]
+        success = len(failed) < len(tones)
+        return {
+            'success': success,
+            'results': results,
+            'error': None if success else (results[failed[0]]['error'] if failed
+                                           else 'Error: no se indicó ningún tono')
+        }
     
-    def generate_content(self, topic: str) -> dict:
+    def generate_content(self, topic: str, bypass_cache: bool = False) -> dict:
         """
         Genera contenido nuevo basado en un tema o idea proporcionada.
         
         Args:
             topic: Tema o idea para generar contenido.
+            bypass_cache: Si es True, genera siempre un texto nuevo.
             
         Returns:
             Diccionario con las claves:
             - 'success': Boolean indicando si fue exitoso.
             - 'generated_text': Contenido generado.
-            - 'error': Mensaje de error (si ocurrió).
+            - 'error': Mensaje de error (si ocurrió). Un tema que supera el
+              límite de tokens de entrada se rechaza sin llamar al modelo.
         """
-        try:
-            prompt = f"""Eres un escritor talentoso en español. 
-Crea contenido original, bien estructurado y atractivo basado en el siguiente tema:
-
-Tema: {topic}
-
-Devuelve el contenido generado."""
-            
-            response = self.model.generate_content(prompt)
-            generated_text = response.text.strip()
-            
-            return {
-                'success': True,
-                'generated_text': generated_text,
-                'error': None
-            }
-        
-        except Exception as e:
-            return {
-                'success': False,
-                'generated_text': None,
-                'error': f'Error: {str(e)}'
-            }
+        return self._run('generate_content', 'generated_text', topic, bypass_cache=bypass_cache)
@@ -0,0 +1,342 @@
+"""
+Módulo de servicio de IA asíncrono para el Asistente de Escritura.
+
+Este módulo contiene la clase AsyncWritingAssistant, equivalente asíncrono de
+WritingAssistant basado en la ruta de generación asíncrona del SDK de Gemini.
+Limita el número de llamadas simultáneas con un semáforo y aplica tiempos de
+espera por llamada que cancelan la petición en curso.
+"""
+
+import asyncio
+import copy
+import time
+import weakref
+from typing import Any, Optional
+
+from services.ai_service import (
+    RESULT_KEYS, TONES, WritingAssistant, estimate_tokens, join_prompt, total_tokens
+)
+from services.cache import ResponseCache, get_default_cache, make_cache_key
+from services.client_registry import (ClientRegistry, hash_api_key,
+                                      make_async_generative_client)
+from services.context_cache import ContextCachePolicy
+from services.metrics import CallRecord, Metrics, get_metrics, response_details
+from services.rate_limit import RateLimiter, get_rate_limiter
+from services.routing import RoutingPolicy
+
+
+class AsyncWritingAssistant:
+    """
+    Asistente de escritura asíncrono que utiliza Google Gemini.
+
+    Devuelve los mismos diccionarios que WritingAssistant, por lo que los
+    llamadores pueden migrar de forma gradual.
+
+    Attributes:
+        model_name (str): Nombre del modelo a utilizar.
+        max_concurrency (int): Número máximo de llamadas simultáneas al modelo.
+        timeout (Optional[float]): Tiempo máximo por llamada en segundos.
+        cache (Optional[ResponseCache]): Caché de respuestas (None si está desactivada).
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = "gemini-2.5-flash",
+        max_concurrency: int = 16,
+        timeout: Optional[float] = 60.0,
+        cache: Optional[ResponseCache] = None,
+        use_cache: bool = True,
+        rate_limiter: Optional[RateLimiter] = None,
+        metrics: Optional[Metrics] = None,
+        registry: Optional[ClientRegistry] = None,
+        use_system_instructions: Optional[bool] = None,
+        context_cache: Optional[ContextCachePolicy] = None,
+        routing: Optional[RoutingPolicy] = None
+    ) -> None:
+        """
+        Inicializa el asistente asíncrono.
+
+        Args:
+            api_key: Clave API de Google Gemini.
+            model_name: Nombre del modelo a utilizar. Por defecto es gemini-2.5-flash.
+            max_concurrency: Número máximo de llamadas simultáneas al modelo.
+            timeout: Tiempo máximo por llamada en segundos (None para no limitar).
+            cache: Caché de respuestas. Si es None se usa la caché compartida del proceso.
+            use_cache: Si es False, no se usa ninguna caché.
+            rate_limiter: Limitador de tasa y reintentos. Si es None se usa el
+                limitador compartido por la misma clave API.
+            metrics: Registro de métricas. Si es None se usa el del proceso.
+            registry: Registro de clientes. Si es None se usa el del proceso.
+            use_system_instructions: Como en WritingAssistant (por defecto,
+                según WRITING_SYSTEM_INSTRUCTIONS).
+            context_cache: Guía de estilo de la casa y su caché de contexto
+                (por defecto, la del entorno).
+            routing: Política de elección de modelo (por defecto, la del entorno).
+        """
+        self._api_key = api_key
+        self.metrics = metrics if metrics is not None else get_metrics()
+        self.rate_limiter = (rate_limiter if rate_limiter is not None
+                             else get_rate_limiter(hash_api_key(api_key)))
+        self.model_name = model_name
+        # Los prompts, los modelos (del registro, con su instrucción de sistema
+        # o caché de contexto) y la versión de prompt son los de la ruta síncrona,
+        # así que ambas comparten las entradas de la caché de respuestas.
+        self._prompts = WritingAssistant(
+            api_key, model_name, use_cache=False, registry=registry,
+            rate_limiter=self.rate_limiter, metrics=self.metrics, use_local_check=False,
+            use_system_instructions=use_system_instructions, context_cache=context_cache,
+            routing=routing
+        )
+        # Clientes asíncronos de esta clave, uno por bucle de eventos: cada
+        # cliente queda ligado al bucle en el que se creó.
+        self._async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self.prompt_version = self._prompts.prompt_version
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        if use_cache:
+            self.cache = cache if cache is not None else get_default_cache()
+        else:
+            self.cache = None
+
+    @property
+    def model(self) -> Any:
+        """Modelo de Gemini sin instrucción de sistema, del registro de clientes."""
+        return self._prompts._get_model(self.model_name)
+
+    def _async_client(self) -> Any:
+        """Devuelve el cliente asíncrono de esta clave API para el bucle en curso."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = make_async_generative_client(self._api_key)
+        return client
+
+    def _request(
+        self,
+        operation: str,
+        text: str,
+        tone: Optional[str],
+        model_name: str
+    ) -> tuple[Any, str, str]:
+        """
+        Devuelve el modelo, el contenido a enviar y el prompt completo de una operación.
+
+        El modelo sale del registro con la instrucción de sistema de la
+        operación, igual que en WritingAssistant. Se usa una copia con el
+        cliente asíncrono de este asistente y este bucle: el modelo del
+        registro lo comparten otros asistentes y bucles, y no se modifica.
+        """
+        instruction, message = self._prompts._prompt(operation, text, tone)
+        model, contents = self._prompts._request(model_name, message, instruction)
+        model = copy.copy(model)
+        model._async_client = self._async_client()
+        return model, contents, join_prompt(instruction, message)
+
+    async def _generate(self, model: Any, contents: str, estimated: int):
+        """
+        Llama al modelo respetando las cubetas y el límite de concurrencia
+        adaptativo del limitador, y reintentando los errores transitorios con
+        espera exponencial.
+
+        Args:
+            model: Modelo de Gemini de la operación.
+            contents: Contenido a enviar.
+            estimated: Tokens estimados del prompt completo.
+
+        Returns:
+            Respuesta del SDK de Gemini.
+        """
+        response = await self.rate_limiter.call_async(
+            lambda: model.generate_content_async(contents), estimated
+        )
+        self.rate_limiter.record_usage(estimated, total_tokens(response))
+        return response
+
+    def _record_error(self, operation: str, model_name: str, prompt: str, start: float,
+                      error: BaseException) -> None:
+        """Registra una llamada fallida en las métricas, si están activadas."""
+        if self.metrics.enabled:
+            self.metrics.record(CallRecord(
+                operation=operation, model=model_name,
+                wall_seconds=time.perf_counter() - start,
+                prompt_chars=len(prompt), error_class=type(error).__name__
+            ))
+
+    async def _run(
+        self,
+        operation: str,
+        text: str,
+        tone: Optional[str] = None,
+        bypass_cache: bool = False,
+        timeout: Optional[float] = None
+    ) -> dict:
+        """
+        Ejecuta una operación respetando la caché, el semáforo y el tiempo de espera.
+
+        Si la tarea que llama es cancelada, la cancelación se propaga a la
+        petición en curso y la excepción CancelledError se vuelve a lanzar.
+
+        Args:
+            operation: Nombre de la operación.
+            text: Texto de entrada del usuario.
+            tone: Tono solicitado, si la operación lo usa.
+            bypass_cache: Si es True, ignora la caché para esta llamada.
+            timeout: Tiempo máximo para esta llamada (por defecto, self.timeout).
+
+        Returns:
+            Diccionario con las claves 'success', la clave del texto y 'error'.
+        """
+        result_key = RESULT_KEYS[operation]
+        timeout = self.timeout if timeout is None else timeout
+
+        model_name = self._prompts.route(operation, text)
+        key = None
+        if self.cache is not None and not bypass_cache:
+            key = make_cache_key(operation, text, tone, model_name, self.prompt_version)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.metrics.record_cache_hit(operation)
+                return cached
+
+        prompt = text
+        start = time.perf_counter()
+        try:
+            model, contents, prompt = self._request(operation, text, tone, model_name)
+            async with self._semaphore:
+                start = time.perf_counter()
+                response = await asyncio.wait_for(
+                    self._generate(model, contents, estimate_tokens(prompt)), timeout
+                )
+            output_text = response.text.strip()
+            if self.metrics.enabled:
+                self.metrics.record(CallRecord(
+                    operation=operation, model=model_name,
+                    wall_seconds=time.perf_counter() - start,
+                    prompt_chars=len(prompt), response_chars=len(output_text),
+                    **response_details(response)
+                ))
+
+            result = {
+                'success': True,
+                result_key: output_text,
+                'error': None
+            }
+
+        except asyncio.TimeoutError as e:
+            self._record_error(operation, model_name, prompt, start, e)
+            return {
+                'success': False,
+                result_key: None,
+                'error': f'Error: tiempo de espera agotado ({timeout} s)'
+            }
+
+        except Exception as e:
+            self._record_error(operation, model_name, prompt, start, e)
+            return {
+                'success': False,
+                result_key: None,
+                'error': f'Error: {str(e)}'
+            }
+
+        if key is not None:
+            self.cache.set(key, result)
+        return result
+
+    async def fix_grammar(
+        self,
+        text: str,
+        bypass_cache: bool = False,
+        timeout: Optional[float] = None
+    ) -> dict:
+        """
+        Corrige la gramática y la ortografía del texto proporcionado.
+
+        Args:
+            text: Texto a corregir.
+            bypass_cache: Si es True, consulta siempre al modelo.
+            timeout: Tiempo máximo para esta llamada en segundos.
+
+        Returns:
+            Diccionario con las claves 'success', 'corrected_text' y 'error'.
+        """
+        return await self._run('fix_grammar', text, bypass_cache=bypass_cache,
+                               timeout=timeout)
+
+    async def improve_style(
+        self,
+        text: str,
+        tone: str,
+        bypass_cache: bool = False,
+        timeout: Optional[float] = None
+    ) -> dict:
+        """
+        Mejora el estilo del texto según el tono especificado.
+
+        Args:
+            text: Texto a mejorar.
+            tone: Tono deseado (Formal, Creativo, Casual).
+            bypass_cache: Si es True, consulta siempre al modelo.
+            timeout: Tiempo máximo para esta llamada en segundos.
+
+        Returns:
+            Diccionario con las claves 'success', 'improved_text' y 'error'.
+        """
+        return await self._run('improve_style', text, tone=tone,
+                               bypass_cache=bypass_cache, timeout=timeout)
+
+    async def improve_style_all(
+        self,
+        text: str,
+        tones: Optional[list[str]] = None,
+        bypass_cache: bool = False,
+        timeout: Optional[float] = None
+    ) -> dict:
+        """
+        Mejora el estilo del texto en varios tonos de forma concurrente.
+
+        Args:
+            text: Texto a mejorar.
+            tones: Tonos deseados. Si es None se usan todos (Formal, Creativo, Casual).
+            bypass_cache: Si es True, consulta siempre al modelo.
+            timeout: Tiempo máximo de cada tono en segundos.
+
+        Returns:
+            Diccionario con 'success' (al menos un tono resuelto), 'results'
+            (tono → resultado de improve_style) y 'error' (si fallaron todos).
+        """
+        tones = list(dict.fromkeys(tones if tones is not None else TONES))
+        outputs = await asyncio.gather(*(
+            self.improve_style(text, tone, bypass_cache=bypass_cache, timeout=timeout)
+            for tone in tones
+        ))
+        results = dict(zip(tones, outputs))
+        failed = [tone for tone, result in results.items() if not result['success']]
+        success = len(failed) < len(tones)
+        return {
+            'success': success,
+            'results': results,
+            'error': None if success else (results[failed[0]]['error'] if failed
+                                           else 'Error: no se indicó ningún tono')
+        }
+
+    async def generate_content(
+        self,
+        topic: str,
+        bypass_cache: bool = False,
+        timeout: Optional[float] = None
+    ) -> dict:
+        """
+        Genera contenido nuevo basado en un tema o idea proporcionada.
+
+        Args:
+            topic: Tema o idea para generar contenido.
+            bypass_cache: Si es True, genera siempre un texto nuevo.
+            timeout: Tiempo máximo para esta llamada en segundos.
+
+        Returns:
+            Diccionario con las claves 'success', 'generated_text' y 'error'.
+        """
+        return await self._run('generate_content', topic, bypass_cache=bypass_cache,
+                               timeout=timeout)
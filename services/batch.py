@@ -0,0 +1,307 @@
+"""
+Procesamiento por lotes para el Asistente de Escritura.
+
+Este módulo permite aplicar fix_grammar, improve_style o generate_content sobre
+un directorio de archivos .txt/.md o un archivo JSONL, usando un grupo de hilos
+y escribiendo cada resultado en un JSONL de salida en cuanto está disponible.
+
+El propio archivo de salida actúa como punto de control: al relanzar el mismo
+comando se omiten los documentos que ya se procesaron con éxito.
+
+Uso:
+    python -m services.batch entrada/ salida.jsonl --operation fix_grammar
+    python -m services.batch corpus.jsonl salida.jsonl --operation improve_style --tone Formal
+    python -m services.batch frases.jsonl salida.jsonl --micro-batch 20 --workers 40
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Iterator, Optional
+
+from dotenv import load_dotenv
+
+from services.ai_service import RESULT_KEYS, WritingAssistant
+from services.microbatch import MicroBatcher
+
+
+TEXT_EXTENSIONS = ('.txt', '.md')
+
+
+@dataclass
+class BatchStats:
+    """
+    Resumen de una ejecución por lotes.
+
+    Attributes:
+        processed: Documentos procesados en esta ejecución.
+        failed: Documentos cuyo procesamiento falló.
+        skipped: Documentos omitidos por estar ya completados.
+        chars: Caracteres de entrada procesados.
+        elapsed: Duración de la ejecución en segundos.
+    """
+    processed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    chars: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def chars_per_second(self) -> float:
+        return self.chars / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data['docs_per_second'] = round(self.docs_per_second, 3)
+        data['chars_per_second'] = round(self.chars_per_second, 1)
+        return data
+
+
+def iter_documents(
+    source: str,
+    text_field: str = 'text',
+    id_field: str = 'id'
+) -> Iterator[tuple[str, Optional[str]]]:
+    """
+    Recorre los documentos de entrada sin cargarlos todos en memoria.
+
+    Args:
+        source: Directorio con archivos .txt/.md o archivo JSONL.
+        text_field: Campo con el texto en cada línea JSONL.
+        id_field: Campo con el identificador en cada línea JSONL.
+
+    Yields:
+        Tuplas (identificador, texto). En directorios el identificador es la
+        ruta relativa; en JSONL, el campo id_field o el número de línea. El
+        texto es None si la línea JSONL no tiene el campo text_field.
+    """
+    path = Path(source)
+    if path.is_dir():
+        for file in sorted(path.rglob('*')):
+            if file.is_file() and file.suffix.lower() in TEXT_EXTENSIONS:
+                yield str(file.relative_to(path)), file.read_text(encoding='utf-8')
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            doc_id = record.get(id_field, line_number)
+            yield str(doc_id), record.get(text_field)
+
+
+def load_checkpoint(output_path: str) -> set[str]:
+    """
+    Lee los identificadores ya completados con éxito en el archivo de salida.
+
+    Si la ejecución anterior se interrumpió a mitad de una línea, el archivo
+    se trunca hasta la última línea completa.
+
+    Args:
+        output_path: Ruta del JSONL de salida.
+
+    Returns:
+        Conjunto de identificadores completados.
+    """
+    done: set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+
+    valid_size = 0
+    with open(output_path, 'rb') as f:
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            valid_size += len(raw)
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                continue
+            if record.get('success'):
+                done.add(str(record['id']))
+
+    if valid_size != os.path.getsize(output_path):
+        with open(output_path, 'r+b') as f:
+            f.truncate(valid_size)
+    return done
+
+
+def _process_one(
+    assistant: WritingAssistant,
+    operation: str,
+    doc_id: str,
+    text: str,
+    tone: Optional[str],
+    micro_batcher: Optional[MicroBatcher] = None
+) -> dict:
+    if operation == 'fix_grammar' and micro_batcher is not None:
+        result = micro_batcher.fix_grammar(text)
+    elif operation == 'improve_style':
+        result = assistant.improve_style(text, tone or 'Formal')
+    else:
+        result = getattr(assistant, operation)(text)
+    return {
+        'id': doc_id,
+        'operation': operation,
+        'success': result['success'],
+        'output': result[RESULT_KEYS[operation]],
+        'error': result['error'],
+        'chars': len(text)
+    }
+
+
+def run_batch(
+    assistant: WritingAssistant,
+    source: str,
+    output_path: str,
+    operation: str = 'fix_grammar',
+    tone: Optional[str] = None,
+    workers: int = 8,
+    text_field: str = 'text',
+    id_field: str = 'id',
+    micro_batcher: Optional[MicroBatcher] = None
+) -> BatchStats:
+    """
+    Procesa todos los documentos de entrada y escribe los resultados en JSONL.
+
+    Como máximo hay 2 * workers documentos en vuelo, de modo que el uso de
+    memoria no depende del tamaño del corpus.
+
+    Args:
+        assistant: Instancia de WritingAssistant compartida por los hilos.
+        source: Directorio o archivo JSONL de entrada.
+        output_path: JSONL de salida (también sirve de punto de control).
+        operation: fix_grammar, improve_style o generate_content.
+        tone: Tono para improve_style.
+        workers: Número de hilos.
+        text_field: Campo con el texto en la entrada JSONL.
+        id_field: Campo con el identificador en la entrada JSONL.
+        micro_batcher: Si se indica, las correcciones gramaticales se agrupan
+            en prompts de varios elementos. Conviene que workers sea al menos
+            el tamaño de lote para llenarlos.
+
+    Returns:
+        Estadísticas de la ejecución.
+    """
+    if operation not in RESULT_KEYS:
+        raise ValueError(f"Operación desconocida: {operation}")
+
+    stats = BatchStats()
+    done = load_checkpoint(output_path)
+    max_in_flight = workers * 2
+    start = time.perf_counter()
+
+    with open(output_path, 'a', encoding='utf-8') as out, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: set[Future] = set()
+
+        def write(record: dict) -> None:
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+            stats.processed += 1
+            stats.chars += record['chars']
+            if not record['success']:
+                stats.failed += 1
+
+        def drain(return_when: str) -> None:
+            nonlocal pending
+            finished, pending = wait(pending, return_when=return_when)
+            for future in finished:
+                write(future.result())
+
+        for doc_id, text in iter_documents(source, text_field, id_field):
+            if doc_id in done:
+                stats.skipped += 1
+                continue
+            if text is None:
+                write({
+                    'id': doc_id,
+                    'operation': operation,
+                    'success': False,
+                    'output': None,
+                    'error': f"Error: el registro no tiene el campo '{text_field}'",
+                    'chars': 0
+                })
+                continue
+            pending.add(executor.submit(_process_one, assistant, operation, doc_id, text, tone,
+                                        micro_batcher))
+            if len(pending) >= max_in_flight:
+                drain(FIRST_COMPLETED)
+
+        if pending:
+            drain('ALL_COMPLETED')
+
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    """
+    parser = argparse.ArgumentParser(
+        description="Procesa por lotes archivos .txt/.md o un corpus JSONL."
+    )
+    parser.add_argument('source', help="Directorio con .txt/.md o archivo JSONL")
+    parser.add_argument('output', help="Archivo JSONL de salida (se reanuda si existe)")
+    parser.add_argument('--operation', default='fix_grammar', choices=sorted(RESULT_KEYS))
+    parser.add_argument('--tone', default='Formal', help="Tono para improve_style")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--model', default='gemini-2.5-flash')
+    parser.add_argument('--text-field', default='text')
+    parser.add_argument('--id-field', default='id')
+    parser.add_argument('--micro-batch', type=int, default=0,
+                        help="Correcciones por prompt en fix_grammar (0 para desactivar)")
+    parser.add_argument('--batch-wait-ms', type=float, default=20.0,
+                        help="Espera máxima para completar un lote")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        print("❌ Error: GOOGLE_API_KEY no está configurada en .env", file=sys.stderr)
+        return 1
+
+    assistant = WritingAssistant(api_key, model_name=args.model)
+    micro_batcher = None
+    if args.micro_batch > 1 and args.operation == 'fix_grammar':
+        micro_batcher = MicroBatcher(assistant, max_items=args.micro_batch,
+                                     max_wait_ms=args.batch_wait_ms)
+    stats = run_batch(
+        assistant,
+        args.source,
+        args.output,
+        operation=args.operation,
+        tone=args.tone,
+        workers=args.workers,
+        text_field=args.text_field,
+        id_field=args.id_field,
+        micro_batcher=micro_batcher
+    )
+
+    print(f"✅ Procesados: {stats.processed} | ❌ Fallidos: {stats.failed} | "
+          f"⏭️  Omitidos: {stats.skipped}")
+    print(f"⏱️  {stats.elapsed:.1f} s | {stats.docs_per_second:.2f} docs/s | "
+          f"{stats.chars_per_second:.0f} caracteres/s")
+    if micro_batcher is not None:
+        micro_batcher.close()
+        batch_stats = micro_batcher.stats()
+        print(f"📦 {batch_stats['batches']} lotes | "
+              f"{batch_stats['items_per_batch']:.1f} correcciones por lote | "
+              f"{batch_stats['fallback_items']} reintentadas por separado")
+    return 0 if stats.failed == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
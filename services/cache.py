@@ -0,0 +1,349 @@
+"""
+Módulo de caché de respuestas para el Asistente de Escritura.
+
+Este módulo proporciona una caché direccionada por contenido para los resultados
+de WritingAssistant: una capa en memoria con desalojo LRU y una capa persistente
+opcional en SQLite con TTL y límite de tamaño.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Optional, Protocol
+
+
+@dataclass
+class CacheStats:
+    """
+    Contadores de uso de la caché.
+
+    Attributes:
+        hits: Consultas resueltas por la caché.
+        misses: Consultas que no estaban en la caché.
+        evictions: Entradas desalojadas por tamaño o por TTL.
+        persistent_hits: Aciertos servidos por la capa persistente.
+    """
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    persistent_hits: int = 0
+
+    def as_dict(self) -> dict:
+        """Devuelve los contadores como diccionario."""
+        return asdict(self)
+
+
+class CacheBackend(Protocol):
+    """Interfaz mínima que debe cumplir una capa de caché."""
+
+    def get(self, key: str) -> Optional[dict]:
+        ...
+
+    def set(self, key: str, value: dict) -> None:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza un texto para usarlo como parte de la clave de caché.
+
+    Solo se aplican cambios que no alteran el resultado del modelo: forma
+    Unicode NFC, saltos de línea uniformes y espacios de los extremos.
+
+    Args:
+        text: Texto original.
+
+    Returns:
+        Texto normalizado.
+    """
+    text = unicodedata.normalize('NFC', text)
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text.strip()
+
+
+def make_cache_key(
+    operation: str,
+    text: str,
+    tone: Optional[str],
+    model_name: str,
+    prompt_version: str
+) -> str:
+    """
+    Construye la clave de caché de una llamada.
+
+    Args:
+        operation: Operación del asistente (fix_grammar, improve_style, ...).
+        text: Texto de entrada.
+        tone: Tono solicitado, o None si la operación no lo usa.
+        model_name: Modelo de Gemini utilizado.
+        prompt_version: Versión de las plantillas de prompt.
+
+    Returns:
+        Hash SHA-256 en hexadecimal.
+    """
+    payload = json.dumps(
+        [operation, tone or '', model_name, prompt_version, normalize_text(text)],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MemoryCache:
+    """
+    Caché en memoria acotada con desalojo LRU.
+
+    Attributes:
+        max_entries (int): Número máximo de entradas.
+        ttl_seconds (Optional[float]): Vida de cada entrada, o None para no expirar.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Inicializa la caché en memoria.
+
+        Args:
+            max_entries: Número máximo de entradas antes de desalojar.
+            ttl_seconds: Segundos de vida de cada entrada (None para no expirar).
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    Capa persistente de la caché sobre SQLite.
+
+    Attributes:
+        path (str): Ruta del archivo de base de datos.
+        max_entries (int): Número máximo de entradas almacenadas.
+        ttl_seconds (Optional[float]): Vida de cada entrada, o None para no expirar.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 10000,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600
+    ) -> None:
+        """
+        Abre (o crea) la base de datos de la caché.
+
+        Args:
+            path: Ruta del archivo SQLite.
+            max_entries: Número máximo de entradas antes de desalojar las menos usadas.
+            ttl_seconds: Segundos de vida de cada entrada (None para no expirar).
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed_at)'
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._conn.commit()
+                self.evictions += 1
+                return None
+            self._conn.execute(
+                'UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key)
+            )
+            self._conn.commit()
+        return json.loads(value)
+
+    def set(self, key: str, value: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            count = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    'DELETE FROM responses WHERE key IN ('
+                    'SELECT key FROM responses ORDER BY accessed_at LIMIT ?)',
+                    (excess,)
+                )
+                self.evictions += excess
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+
+
+class ResponseCache:
+    """
+    Caché de respuestas en dos niveles: memoria (LRU) y persistente (opcional).
+
+    Attributes:
+        memory (MemoryCache): Capa en memoria.
+        persistent (Optional[CacheBackend]): Capa persistente, si está configurada.
+    """
+
+    def __init__(
+        self,
+        memory_size: int = 256,
+        persistent: Optional[CacheBackend] = None,
+        ttl_seconds: Optional[float] = None
+    ) -> None:
+        """
+        Inicializa la caché de respuestas.
+
+        Args:
+            memory_size: Número máximo de entradas en memoria.
+            persistent: Capa persistente opcional (por ejemplo, SQLiteCache).
+            ttl_seconds: Segundos de vida de las entradas en memoria.
+        """
+        self.memory = MemoryCache(memory_size, ttl_seconds)
+        self.persistent = persistent
+        self._stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Busca una respuesta en la caché.
+
+        Args:
+            key: Clave generada con make_cache_key.
+
+        Returns:
+            Copia del resultado almacenado, o None si no existe.
+        """
+        value = self.memory.get(key)
+        from_persistent = False
+        if value is None and self.persistent is not None:
+            value = self.persistent.get(key)
+            if value is not None:
+                from_persistent = True
+                self.memory.set(key, value)
+
+        with self._lock:
+            if value is None:
+                self._stats.misses += 1
+                return None
+            self._stats.hits += 1
+            if from_persistent:
+                self._stats.persistent_hits += 1
+        return dict(value)
+
+    def set(self, key: str, value: dict) -> None:
+        """
+        Guarda una respuesta en todas las capas.
+
+        Args:
+            key: Clave generada con make_cache_key.
+            value: Diccionario de resultado a almacenar.
+        """
+        value = dict(value)
+        self.memory.set(key, value)
+        if self.persistent is not None:
+            self.persistent.set(key, value)
+
+    def clear(self) -> None:
+        """Vacía todas las capas de la caché."""
+        self.memory.clear()
+        if self.persistent is not None:
+            self.persistent.clear()
+
+    @property
+    def stats(self) -> CacheStats:
+        """Contadores de aciertos, fallos y desalojos de todas las capas."""
+        with self._lock:
+            stats = CacheStats(**self._stats.as_dict())
+        stats.evictions = self.memory.evictions + getattr(self.persistent, 'evictions', 0)
+        return stats
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> ResponseCache:
+    """
+    Devuelve la caché compartida del proceso.
+
+    La capa persistente se activa si la variable de entorno
+    WRITING_CACHE_DB apunta a un archivo SQLite.
+
+    Returns:
+        Instancia única de ResponseCache.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            db_path = os.getenv('WRITING_CACHE_DB')
+            persistent = SQLiteCache(db_path) if db_path else None
+            _default_cache = ResponseCache(
+                memory_size=int(os.getenv('WRITING_CACHE_SIZE', '256')),
+                persistent=persistent
+            )
+        return _default_cache
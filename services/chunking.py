@@ -0,0 +1,166 @@
+"""
+Módulo de fragmentación de documentos largos.
+
+Este módulo divide un texto en fragmentos de tamaño acotado respetando los
+límites de párrafo y de oración, y vuelve a unir los resultados conservando
+exactamente los separadores originales entre fragmentos.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+
+PARAGRAPH_SEPARATOR = re.compile(r'(\n[ \t]*\n\s*)')
+SENTENCE_SEPARATOR = re.compile(r'(?<=[.!?…])(\s+)')
+WORD_SEPARATOR = re.compile(r'(\s+)')
+
+
+@dataclass
+class Chunk:
+    """
+    Fragmento de un documento largo.
+
+    Attributes:
+        index: Posición del fragmento en el documento.
+        text: Texto del fragmento a procesar.
+        separator: Espacio en blanco original que sigue al fragmento.
+        context: Final del fragmento anterior, usado solo como contexto.
+    """
+    index: int
+    text: str
+    separator: str = ''
+    context: Optional[str] = None
+
+
+def _split_keep(pattern: re.Pattern, text: str) -> list[tuple[str, str]]:
+    """Divide el texto y devuelve pares (segmento, separador que le sigue)."""
+    parts = pattern.split(text)
+    pieces = []
+    for i in range(0, len(parts), 2):
+        segment = parts[i]
+        separator = parts[i + 1] if i + 1 < len(parts) else ''
+        if segment:
+            pieces.append((segment, separator))
+        elif pieces:
+            last_segment, last_separator = pieces[-1]
+            pieces[-1] = (last_segment, last_separator + separator)
+    return pieces
+
+
+def _atomic_pieces(text: str, max_chars: int) -> list[tuple[str, str]]:
+    """
+    Descompone el texto en piezas no mayores que max_chars, prefiriendo
+    párrafos, después oraciones y, en último caso, palabras.
+    """
+    pieces = []
+    for paragraph, paragraph_sep in _split_keep(PARAGRAPH_SEPARATOR, text):
+        if len(paragraph) <= max_chars:
+            pieces.append((paragraph, paragraph_sep))
+            continue
+        sentences = _split_keep(SENTENCE_SEPARATOR, paragraph)
+        for j, (sentence, sentence_sep) in enumerate(sentences):
+            last_sentence = j == len(sentences) - 1
+            if len(sentence) <= max_chars:
+                pieces.append((sentence, paragraph_sep if last_sentence else sentence_sep))
+                continue
+            words = _split_keep(WORD_SEPARATOR, sentence)
+            current, current_sep = '', ''
+            for word, word_sep in words:
+                while len(word) > max_chars:
+                    if current:
+                        pieces.append((current, current_sep))
+                        current, current_sep = '', ''
+                    pieces.append((word[:max_chars], ''))
+                    word = word[max_chars:]
+                if current and len(current) + len(current_sep) + len(word) > max_chars:
+                    pieces.append((current, current_sep))
+                    current, current_sep = '', ''
+                current = current + current_sep + word if current else word
+                current_sep = word_sep
+            pieces.append((current, paragraph_sep if last_sentence else sentence_sep))
+    return pieces
+
+
+def split_paragraphs(text: str) -> list[tuple[str, str]]:
+    """
+    Divide un texto en párrafos conservando los separadores originales.
+
+    Args:
+        text: Texto sin espacios en los extremos.
+
+    Returns:
+        Lista de pares (párrafo, separador que le sigue).
+    """
+    return _split_keep(PARAGRAPH_SEPARATOR, text)
+
+
+def _tail(text: str, overlap_chars: int) -> Optional[str]:
+    """Devuelve el final del texto, empezando en un límite de palabra."""
+    if overlap_chars <= 0:
+        return None
+    if len(text) <= overlap_chars:
+        return text
+    tail = text[-overlap_chars:]
+    space = tail.find(' ')
+    return tail[space + 1:] if space != -1 else tail
+
+
+def split_into_chunks(
+    text: str,
+    max_chars: int = 4000,
+    overlap_chars: int = 200
+) -> list[Chunk]:
+    """
+    Divide un documento en fragmentos de como máximo max_chars caracteres.
+
+    Los fragmentos se forman agrupando párrafos completos; solo los párrafos
+    que por sí solos superan el límite se dividen por oraciones. Cada
+    fragmento lleva como contexto los últimos overlap_chars caracteres del
+    anterior para mantener un tono coherente.
+
+    Args:
+        text: Documento completo.
+        max_chars: Tamaño máximo de cada fragmento.
+        overlap_chars: Tamaño del contexto tomado del fragmento anterior.
+
+    Returns:
+        Lista de fragmentos en orden. El espacio inicial del documento no se
+        incluye en ningún fragmento (ver reassemble) y el final forma parte
+        del separador del último.
+    """
+    body = text.strip()
+    trailing = text[len(text.rstrip()):]
+    chunks: list[Chunk] = []
+    current, current_sep = '', ''
+
+    for piece, piece_sep in _atomic_pieces(body, max_chars):
+        if current and len(current) + len(current_sep) + len(piece) > max_chars:
+            chunks.append(Chunk(len(chunks), current, current_sep))
+            current, current_sep = '', ''
+        current = current + current_sep + piece if current else piece
+        current_sep = piece_sep
+    if current:
+        chunks.append(Chunk(len(chunks), current, current_sep + trailing))
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+        chunk.context = _tail(previous.text, overlap_chars)
+    return chunks
+
+
+def reassemble(original: str, chunks: list[Chunk], outputs: list[str]) -> str:
+    """
+    Une los resultados de cada fragmento en el orden original.
+
+    Args:
+        original: Documento original (para conservar su espacio inicial).
+        chunks: Fragmentos devueltos por split_into_chunks.
+        outputs: Texto procesado de cada fragmento, en el mismo orden.
+
+    Returns:
+        Documento procesado con los separadores originales entre fragmentos.
+    """
+    leading = original[:len(original) - len(original.lstrip())]
+    return leading + ''.join(
+        output.strip() + chunk.separator for chunk, output in zip(chunks, outputs)
+    )
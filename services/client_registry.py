@@ -0,0 +1,294 @@
+"""
+Registro de clientes de Gemini compartido por el proceso.
+
+Este módulo reutiliza los objetos GenerativeModel y sus conexiones entre
+reejecuciones de Streamlit y entre sesiones. Cada clave API tiene su propio
+cliente de transporte, por lo que dos sesiones con claves distintas en el
+mismo servidor no se pisan (genai.configure modifica un estado global).
+
+El SDK de Gemini (y su pila de protobuf/gRPC) se importa al crear el primer
+cliente real, no al importar este módulo, para que los procesos que no llegan
+a llamar al modelo no paguen ese coste al arrancar.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+if TYPE_CHECKING:
+    from google.ai import generativelanguage as glm
+
+
+def hash_api_key(api_key: str) -> str:
+    """
+    Devuelve un identificador estable de una clave API sin almacenarla.
+
+    Args:
+        api_key: Clave API de Google Gemini.
+
+    Returns:
+        Primeros 16 caracteres del SHA-256 de la clave.
+    """
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+
+def make_generative_client(api_key: str) -> 'glm.GenerativeServiceClient':
+    """
+    Crea un cliente de transporte síncrono ligado a una clave API.
+
+    Args:
+        api_key: Clave API de Google Gemini.
+
+    Returns:
+        Cliente de GenerativeService independiente de genai.configure.
+    """
+    from google.ai import generativelanguage as glm
+
+    return glm.GenerativeServiceClient(client_options={'api_key': api_key})
+
+
+def make_async_generative_client(api_key: str) -> 'glm.GenerativeServiceAsyncClient':
+    """
+    Crea un cliente de transporte asíncrono ligado a una clave API.
+
+    Debe llamarse dentro del bucle de eventos que lo va a usar.
+
+    Args:
+        api_key: Clave API de Google Gemini.
+
+    Returns:
+        Cliente asíncrono de GenerativeService.
+    """
+    from google.ai import generativelanguage as glm
+
+    return glm.GenerativeServiceAsyncClient(client_options={'api_key': api_key})
+
+
+@dataclass
+class _Entry:
+    model: Any
+    last_used: float = field(default_factory=time.monotonic)
+    # Expiración de la caché de contexto del modelo (None si no usa caché).
+    expires_at: Optional[float] = None
+
+
+class ClientRegistry:
+    """
+    Registro seguro entre hilos de modelos de Gemini configurados.
+
+    Los modelos se indexan por (hash de la clave API, nombre del modelo,
+    opciones del modelo) y se desalojan tras idle_timeout segundos sin uso.
+
+    Attributes:
+        idle_timeout (float): Segundos sin uso tras los que se desaloja un modelo.
+        hits (int): Modelos servidos desde el registro.
+        misses (int): Modelos construidos.
+        evictions (int): Modelos desalojados por inactividad.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = 1800.0,
+        model_factory: Optional[Callable[..., Any]] = None
+    ) -> None:
+        """
+        Inicializa el registro.
+
+        Args:
+            idle_timeout: Segundos sin uso tras los que se desaloja un modelo.
+            model_factory: Sustituto de genai.GenerativeModel (por ejemplo, un
+                modelo local para pruebas de rendimiento). Recibe el nombre del
+                modelo y sus opciones; no se crea ningún cliente de transporte.
+        """
+        self.idle_timeout = idle_timeout
+        self.model_factory = model_factory
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._models: dict[tuple[str, str, str], _Entry] = {}
+        self._transports: dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get_model(self, api_key: str, model_name: str, **model_kwargs: Any) -> Any:
+        """
+        Devuelve un GenerativeModel reutilizable para la clave y el modelo.
+
+        Args:
+            api_key: Clave API de Google Gemini.
+            model_name: Nombre del modelo.
+            **model_kwargs: Argumentos adicionales de GenerativeModel (deben
+                ser serializables a JSON, p. ej. system_instruction).
+
+        Returns:
+            Instancia de GenerativeModel con su propio cliente de transporte.
+        """
+        key_hash = hash_api_key(api_key)
+        options = json.dumps(model_kwargs, sort_keys=True, default=str)
+        registry_key = (key_hash, model_name, options)
+
+        with self._lock:
+            self._evict_idle_locked()
+            entry = self._models.get(registry_key)
+            if entry is not None:
+                entry.last_used = time.monotonic()
+                self.hits += 1
+                return entry.model
+
+            if self.model_factory is not None:
+                model = self.model_factory(model_name, **model_kwargs)
+                self._models[registry_key] = _Entry(model)
+                self.misses += 1
+                return model
+
+            transport = self._transports.get(key_hash)
+            if transport is None:
+                transport = make_generative_client(api_key)
+                self._transports[key_hash] = transport
+
+            import google.generativeai as genai
+
+            model = genai.GenerativeModel(model_name, **model_kwargs)
+            # GenerativeModel toma el cliente global de genai.configure si
+            # _client es None; asignarlo aísla cada clave API.
+            model._client = transport
+            self._models[registry_key] = _Entry(model)
+            self.misses += 1
+            return model
+
+    def get_cached_model(
+        self,
+        api_key: str,
+        model_name: str,
+        system_instruction: str,
+        contents: Optional[list[str]] = None,
+        ttl_seconds: float = 3600.0,
+        refresh_seconds: float = 300.0
+    ) -> Any:
+        """
+        Devuelve un modelo que usa una caché de contexto explícita.
+
+        La caché (instrucción de sistema más contents) se crea en la API la
+        primera vez y se sustituye por una nueva cuando le quedan menos de
+        refresh_seconds de vida. Las cachés sustituidas expiran solas al
+        cumplir su TTL.
+
+        Args:
+            api_key: Clave API de Google Gemini.
+            model_name: Nombre del modelo.
+            system_instruction: Instrucción de sistema guardada en la caché.
+            contents: Textos adicionales a cachear (la instrucción de sistema
+                ya puede contener todo el contexto fijo).
+            ttl_seconds: Tiempo de vida de cada caché.
+            refresh_seconds: Margen de renovación antes de la expiración.
+
+        Returns:
+            Instancia de GenerativeModel ligada a la caché.
+
+        Raises:
+            Exception: El error de la API si no se pudo crear la caché (por
+                ejemplo, si el contenido no alcanza el mínimo de tokens).
+        """
+        key_hash = hash_api_key(api_key)
+        contents = list(contents or [])
+        digest = hashlib.sha256('\0'.join([system_instruction, *contents])
+                                .encode('utf-8')).hexdigest()
+        registry_key = (key_hash, model_name, f'cached_content:{digest}')
+
+        with self._lock:
+            self._evict_idle_locked()
+            entry = self._models.get(registry_key)
+            if entry is not None and entry.expires_at - time.monotonic() > refresh_seconds:
+                entry.last_used = time.monotonic()
+                self.hits += 1
+                return entry.model
+
+        # La creación de la caché es una llamada de red: se hace fuera del
+        # candado para no bloquear al resto de modelos del registro.
+        expires_at = time.monotonic() + ttl_seconds
+        if self.model_factory is not None:
+            model = self.model_factory(model_name, system_instruction=system_instruction,
+                                       cached_contents=contents)
+        else:
+            from services.context_cache import create_cached_content
+            import google.generativeai as genai
+
+            cached_content = create_cached_content(api_key, model_name, system_instruction,
+                                                   contents, ttl_seconds)
+            model = genai.GenerativeModel.from_cached_content(cached_content)
+
+        with self._lock:
+            if self.model_factory is None:
+                transport = self._transports.get(key_hash)
+                if transport is None:
+                    transport = make_generative_client(api_key)
+                    self._transports[key_hash] = transport
+                model._client = transport
+            self._models[registry_key] = _Entry(model, expires_at=expires_at)
+            self.misses += 1
+            return model
+
+    def evict_idle(self) -> int:
+        """
+        Desaloja los modelos sin uso durante más de idle_timeout segundos.
+
+        Returns:
+            Número de modelos desalojados.
+        """
+        with self._lock:
+            return self._evict_idle_locked()
+
+    def _evict_idle_locked(self) -> int:
+        now = time.monotonic()
+        expired = [key for key, entry in self._models.items()
+                   if now - entry.last_used > self.idle_timeout]
+        for key in expired:
+            del self._models[key]
+        live_keys = {key[0] for key in self._models}
+        for key_hash in list(self._transports):
+            if key_hash not in live_keys:
+                del self._transports[key_hash]
+        self.evictions += len(expired)
+        return len(expired)
+
+    def clear(self) -> None:
+        """Elimina todos los modelos y transportes del registro."""
+        with self._lock:
+            self._models.clear()
+            self._transports.clear()
+
+    def stats(self) -> dict:
+        """
+        Devuelve el estado del registro.
+
+        Returns:
+            Diccionario con modelos y claves activas, aciertos, fallos y desalojos.
+        """
+        with self._lock:
+            return {
+                'models': len(self._models),
+                'api_keys': len(self._transports),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+_default_registry: Optional[ClientRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def get_registry() -> ClientRegistry:
+    """
+    Devuelve el registro compartido del proceso.
+
+    Returns:
+        Instancia única de ClientRegistry.
+    """
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = ClientRegistry()
+        return _default_registry
@@ -0,0 +1,166 @@
+"""
+Caché de contexto explícita para la guía de estilo de la casa.
+
+Una guía de estilo larga que se adjunta a todas las peticiones se puede subir
+una vez como CachedContent de la API de Gemini (junto con la instrucción de
+sistema de la operación) y referenciar después desde cada llamada: los tokens
+en caché se facturan con descuento y no viajan en cada petición, a cambio de
+un coste de almacenamiento por hora mientras la caché está viva.
+
+La API exige un mínimo de tokens por caché; las guías más cortas se envían
+dentro de la instrucción de sistema. ContextCachePolicy decide cuándo usar la
+caché y get_context_cache_policy() la lee del entorno (WRITING_STYLE_GUIDE,
+WRITING_CONTEXT_CACHE, WRITING_CONTEXT_CACHE_TTL).
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+
+# Mínimo de tokens que admite la API para crear una caché, por modelo.
+MIN_CACHE_TOKENS = {
+    'gemini-2.5-pro': 4096,
+    'gemini-2.5-flash': 1024,
+    'gemini-2.5-flash-lite': 1024,
+}
+DEFAULT_MIN_CACHE_TOKENS = 4096
+
+
+def min_cache_tokens(model_name: str) -> int:
+    """
+    Devuelve el mínimo de tokens que admite la API para cachear con un modelo.
+
+    Args:
+        model_name: Nombre del modelo.
+
+    Returns:
+        Tokens mínimos del contenido en caché.
+    """
+    return MIN_CACHE_TOKENS.get(model_name, DEFAULT_MIN_CACHE_TOKENS)
+
+
+def create_cached_content(
+    api_key: str,
+    model_name: str,
+    system_instruction: str,
+    contents: Optional[list[str]],
+    ttl_seconds: float
+) -> Any:
+    """
+    Crea un CachedContent ligado a una clave API.
+
+    CachedContent.create usa el cliente global de genai.configure; aquí se
+    usa un cliente de CacheService propio de la clave, igual que el registro
+    de clientes hace con GenerativeService.
+
+    Args:
+        api_key: Clave API de Google Gemini.
+        model_name: Modelo con el que se usará la caché.
+        system_instruction: Instrucción de sistema que se guarda en la caché.
+        contents: Textos adicionales a cachear (None o vacío si todo el
+            contexto fijo va en la instrucción de sistema).
+        ttl_seconds: Tiempo de vida de la caché.
+
+    Returns:
+        caching.CachedContent con el nombre del recurso creado.
+    """
+    from google.ai import generativelanguage as glm
+    from google.generativeai import caching
+
+    request = caching.CachedContent._prepare_create_request(
+        model=model_name,
+        display_name='writing-assistant-style-guide',
+        system_instruction=system_instruction,
+        contents=contents or None,
+        ttl=int(ttl_seconds)
+    )
+    client = glm.CacheServiceClient(client_options={'api_key': api_key})
+    return caching.CachedContent._from_obj(client.create_cached_content(request))
+
+
+@dataclass
+class ContextCachePolicy:
+    """
+    Configuración de la guía de estilo y de su caché de contexto.
+
+    Attributes:
+        style_guide: Texto de la guía de estilo que acompaña a cada petición.
+        enabled: Si es False, la guía siempre va en la instrucción de sistema.
+        ttl_seconds: Tiempo de vida de cada caché creada.
+        refresh_seconds: Margen antes de la expiración en el que se crea una
+            caché nueva en lugar de seguir usando la actual.
+        retry_seconds: Espera antes de volver a intentar crear una caché que falló.
+    """
+    style_guide: str
+    enabled: bool = True
+    ttl_seconds: float = 3600.0
+    refresh_seconds: float = 300.0
+    retry_seconds: float = 300.0
+    _failures: dict = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def should_cache(self, model_name: str, guide_tokens: int) -> bool:
+        """
+        Indica si la guía debe ir en una caché explícita para un modelo.
+
+        Args:
+            model_name: Modelo de la llamada.
+            guide_tokens: Tokens estimados de la guía y la instrucción.
+
+        Returns:
+            True si la caché está activada, la guía alcanza el mínimo de la
+            API y no hubo un fallo reciente al crearla para ese modelo.
+        """
+        if not self.enabled or guide_tokens < min_cache_tokens(model_name):
+            return False
+        with self._lock:
+            failed_at = self._failures.get(model_name)
+            return failed_at is None or time.monotonic() - failed_at > self.retry_seconds
+
+    def record_failure(self, model_name: str) -> None:
+        """
+        Registra que no se pudo crear una caché para un modelo.
+
+        Durante retry_seconds la guía se envía en la instrucción de sistema.
+
+        Args:
+            model_name: Modelo para el que falló la creación.
+        """
+        with self._lock:
+            self._failures[model_name] = time.monotonic()
+
+
+_default_policy: Optional[ContextCachePolicy] = None
+_default_policy_loaded = False
+_default_policy_lock = threading.Lock()
+
+
+def get_context_cache_policy() -> Optional[ContextCachePolicy]:
+    """
+    Devuelve la política de guía de estilo del proceso.
+
+    Se activa con WRITING_STYLE_GUIDE=<ruta de un archivo de texto>. La caché
+    explícita se usa salvo WRITING_CONTEXT_CACHE=0; WRITING_CONTEXT_CACHE_TTL
+    fija su tiempo de vida en segundos.
+
+    Returns:
+        Instancia única de ContextCachePolicy, o None si no hay guía de estilo.
+    """
+    global _default_policy, _default_policy_loaded
+    with _default_policy_lock:
+        if not _default_policy_loaded:
+            path = os.getenv('WRITING_STYLE_GUIDE')
+            if path and os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    style_guide = f.read().strip()
+                if style_guide:
+                    _default_policy = ContextCachePolicy(
+                        style_guide,
+                        enabled=os.getenv('WRITING_CONTEXT_CACHE', '1') != '0',
+                        ttl_seconds=float(os.getenv('WRITING_CONTEXT_CACHE_TTL', '3600'))
+                    )
+            _default_policy_loaded = True
+        return _default_policy
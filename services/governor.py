@@ -0,0 +1,534 @@
+"""
+Gobernador de consumo por usuario.
+
+Todos los usuarios de la aplicación comparten la misma clave API y, con ella,
+la cuota del despliegue. El gobernador cuenta, por usuario y para el conjunto
+del proceso, las peticiones y los tokens de entrada y salida de las últimas
+ventanas de tiempo configuradas, y no deja pasar las llamadas que superarían
+sus límites.
+
+Cada ventana deslizante se aproxima con un número fijo de cubetas de igual
+duración, de modo que la memoria por usuario es constante: el consumo de una
+cubeta caduca entero cuando sale de la ventana. Los usuarios sin actividad en
+la ventana más larga se descartan.
+
+Las llamadas tienen una clase de prioridad. Las interactivas pueden usar todo
+el límite; las de lotes (trabajos en segundo plano) solo la fracción
+batch_share, así que un trabajo largo no deja sin cuota a las peticiones
+interactivas. Al superar un límite, una llamada interactiva falla de inmediato
+con BudgetExceededError y una de lotes espera a que la ventana se libere
+(hasta max_batch_wait segundos).
+"""
+
+import os
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PRIORITIES = (INTERACTIVE, BATCH)
+
+METRICS = ('requests', 'input_tokens', 'output_tokens')
+METRIC_LABELS = {
+    'requests': 'peticiones',
+    'input_tokens': 'tokens de entrada',
+    'output_tokens': 'tokens de salida'
+}
+WINDOW_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Ventana del consumo que se informa aunque no haya límites configurados.
+DEFAULT_USAGE_WINDOW = 3600.0
+
+# Segundos entre barridos de usuarios inactivos.
+PRUNE_INTERVAL = 60.0
+
+
+class BudgetExceededError(RuntimeError):
+    """La llamada superaría un límite de consumo."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class UsageLimit:
+    """
+    Límites de consumo dentro de una ventana deslizante.
+
+    Attributes:
+        window_seconds: Duración de la ventana.
+        requests: Peticiones máximas en la ventana (None para no limitar).
+        input_tokens: Tokens de entrada máximos en la ventana.
+        output_tokens: Tokens de salida máximos en la ventana.
+    """
+    window_seconds: float
+    requests: Optional[int] = None
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+    def caps(self) -> Iterator[tuple[int, int]]:
+        """Produce (índice de la métrica, límite) de las métricas limitadas."""
+        for index, metric in enumerate(METRICS):
+            cap = getattr(self, metric)
+            if cap is not None:
+                yield index, cap
+
+
+def format_window(seconds: float) -> str:
+    """
+    Describe la duración de una ventana para los mensajes de error.
+
+    Args:
+        seconds: Duración en segundos.
+
+    Returns:
+        Texto como '1 min', '24 h' o '90 s'.
+    """
+    if seconds >= 3600 and seconds % 3600 == 0:
+        return f'{int(seconds // 3600)} h'
+    if seconds >= 60 and seconds % 60 == 0:
+        return f'{int(seconds // 60)} min'
+    return f'{seconds:g} s'
+
+
+def parse_limits(spec: Optional[str]) -> list[UsageLimit]:
+    """
+    Lee límites con el formato de WRITING_USER_LIMITS.
+
+    Cada ventana se separa con ';' y tiene la forma
+    '<duración>:<métrica>=<valor>,...'. La duración acepta los sufijos s, m,
+    h y d (segundos si no lleva), y las métricas son requests, input_tokens y
+    output_tokens. Por ejemplo: '1m:requests=20;1d:input_tokens=2000000'.
+
+    Args:
+        spec: Texto de configuración (None o vacío para no limitar).
+
+    Returns:
+        Lista de UsageLimit.
+
+    Raises:
+        ValueError: Si el texto no tiene el formato esperado.
+    """
+    limits = []
+    for part in (spec or '').split(';'):
+        part = part.strip()
+        if not part:
+            continue
+        window, _, caps = part.partition(':')
+        window = window.strip()
+        unit = WINDOW_UNITS.get(window[-1:].lower())
+        seconds = float(window[:-1]) * unit if unit else float(window)
+        values = {}
+        for item in caps.split(','):
+            metric, _, value = item.partition('=')
+            metric = metric.strip()
+            if metric not in METRICS:
+                raise ValueError(f"Métrica de límite desconocida: {metric!r}")
+            values[metric] = int(value)
+        if seconds <= 0 or not values:
+            raise ValueError(f"Límite no válido: {part!r}")
+        limits.append(UsageLimit(seconds, **values))
+    return limits
+
+
+class SlidingWindow:
+    """
+    Consumo aproximado de las últimas window_seconds con cubetas fijas.
+
+    Guarda un contador por cubeta y métrica en un array de enteros, más la
+    suma vigente de cada métrica: al avanzar el tiempo se restan las cubetas
+    que salen de la ventana, así que consultar el total no recorre las
+    cubetas. No es segura entre hilos: la protege el gobernador.
+
+    Attributes:
+        window_seconds (float): Duración de la ventana.
+        bucket_seconds (float): Duración de cada cubeta.
+    """
+
+    def __init__(self, window_seconds: float, buckets: int = 60) -> None:
+        """
+        Inicializa la ventana vacía.
+
+        Args:
+            window_seconds: Duración de la ventana.
+            buckets: Número de cubetas (la precisión es window_seconds / buckets).
+        """
+        self.window_seconds = window_seconds
+        self.bucket_seconds = window_seconds / buckets
+        self._buckets = buckets
+        self._counts = array('q', [0]) * (buckets * len(METRICS))
+        self._sums = [0] * len(METRICS)
+        self._current = -buckets
+
+    def _advance(self, now: float) -> int:
+        """Vacía las cubetas que salieron de la ventana y devuelve la actual."""
+        current = int(now // self.bucket_seconds)
+        if current - self._current >= self._buckets:
+            # Toda la ventana caducó (o es la primera vez): se vacía de golpe.
+            self._counts = array('q', [0]) * len(self._counts)
+            self._sums = [0] * len(METRICS)
+            self._current = current
+        elif current != self._current:
+            for bucket in range(self._current + 1, current + 1):
+                base = (bucket % self._buckets) * len(METRICS)
+                for i in range(len(METRICS)):
+                    self._sums[i] -= self._counts[base + i]
+                    self._counts[base + i] = 0
+            self._current = current
+        return current
+
+    def add(self, now: float, *amounts: int) -> None:
+        """
+        Suma consumo a la cubeta actual.
+
+        Args:
+            now: Instante actual (time.monotonic()).
+            *amounts: Cantidades por métrica, en el orden de METRICS.
+        """
+        base = (self._advance(now) % self._buckets) * len(METRICS)
+        for i, amount in enumerate(amounts):
+            self._counts[base + i] += amount
+            self._sums[i] += amount
+
+    def totals(self, now: float) -> list[int]:
+        """
+        Devuelve el consumo vigente.
+
+        Args:
+            now: Instante actual.
+
+        Returns:
+            Totales por métrica, en el orden de METRICS.
+        """
+        self._advance(now)
+        return list(self._sums)
+
+    def wait_for(self, now: float, index: int, fits: Callable[[int], bool]) -> float:
+        """
+        Calcula cuánto falta para que el total de una métrica sea aceptable.
+
+        Args:
+            now: Instante actual.
+            index: Posición de la métrica en METRICS.
+            fits: Función que indica si un total es aceptable.
+
+        Returns:
+            Segundos hasta que caduquen las cubetas necesarias (0 si ya cabe).
+        """
+        current = self._advance(now)
+        total = self._sums[index]
+        if fits(total):
+            return 0.0
+        for bucket in range(current - self._buckets + 1, current + 1):
+            total -= self._counts[(bucket % self._buckets) * len(METRICS) + index]
+            if fits(total):
+                return max(0.0, (bucket + self._buckets) * self.bucket_seconds - now)
+        return self.window_seconds
+
+
+class _Usage:
+    """Ventanas y totales acumulados de un usuario (o del proceso)."""
+
+    def __init__(self, windows: list[float], buckets: int) -> None:
+        self.windows = {seconds: SlidingWindow(seconds, buckets) for seconds in windows}
+        self.totals = [0] * len(METRICS)
+        self.rejected = 0
+        self.waited_seconds = 0.0
+        self.last_seen = 0.0
+
+    def add(self, now: float, *amounts: int) -> None:
+        for window in self.windows.values():
+            window.add(now, *amounts)
+        for i, amount in enumerate(amounts):
+            self.totals[i] += amount
+        self.last_seen = now
+
+
+class Governor:
+    """
+    Límites de consumo por usuario y del proceso con ventanas deslizantes.
+
+    Attributes:
+        user_limits (list[UsageLimit]): Límites de cada usuario.
+        global_limits (list[UsageLimit]): Límites del conjunto de usuarios.
+        batch_share (float): Fracción de cada límite que pueden usar las
+            llamadas de lotes.
+        max_batch_wait (float): Espera máxima de una llamada de lotes.
+        usage_window (float): Ventana del consumo que informa usage().
+    """
+
+    def __init__(
+        self,
+        user_limits: Optional[list[UsageLimit]] = None,
+        global_limits: Optional[list[UsageLimit]] = None,
+        batch_share: float = 0.5,
+        max_batch_wait: float = 120.0,
+        usage_window: float = DEFAULT_USAGE_WINDOW,
+        buckets: int = 60
+    ) -> None:
+        """
+        Inicializa el gobernador sin consumo.
+
+        Args:
+            user_limits: Límites de cada usuario (None o vacío para no limitar).
+            global_limits: Límites de todos los usuarios juntos, p. ej. la
+                cuota de la clave API compartida.
+            batch_share: Fracción de cada límite disponible para las llamadas
+                de lotes; el resto queda reservado a las interactivas.
+            max_batch_wait: Segundos que puede esperar una llamada de lotes
+                antes de fallar.
+            usage_window: Ventana del consumo que informan usage() y top_users().
+            buckets: Cubetas por ventana.
+        """
+        self.user_limits = list(user_limits or [])
+        self.global_limits = list(global_limits or [])
+        self.batch_share = batch_share
+        self.max_batch_wait = max_batch_wait
+        self.usage_window = usage_window
+        self._windows = sorted({limit.window_seconds
+                                for limit in self.user_limits + self.global_limits}
+                               | {usage_window})
+        self._buckets = buckets
+        self._users: dict[str, _Usage] = {}
+        self._global = _Usage(self._windows, buckets)
+        self._lock = threading.Lock()
+        self._pruned_at = time.monotonic()
+
+    def _user_locked(self, user_id: str, now: float) -> _Usage:
+        if now - self._pruned_at > PRUNE_INTERVAL:
+            self._pruned_at = now
+            horizon = now - self._windows[-1]
+            for key in [key for key, usage in self._users.items() if usage.last_seen < horizon]:
+                del self._users[key]
+        usage = self._users.get(user_id)
+        if usage is None:
+            usage = self._users[user_id] = _Usage(self._windows, self._buckets)
+            usage.last_seen = now
+        return usage
+
+    def _violation(
+        self,
+        usage: _Usage,
+        limits: list[UsageLimit],
+        share: float,
+        input_tokens: int,
+        now: float,
+        scope: str
+    ) -> Optional[tuple[str, Optional[float]]]:
+        """Devuelve (mensaje, segundos de espera) del primer límite superado, o None."""
+        for limit in limits:
+            window = usage.windows[limit.window_seconds]
+            totals = window.totals(now)
+            for index, cap in limit.caps():
+                allowed = cap * share
+                # Las salidas solo se conocen al terminar: basta con que quede margen.
+                amount = (1, input_tokens, 0)[index]
+                if index == 2:
+                    def fits(total: float, allowed: float = allowed) -> bool:
+                        return total < allowed
+                else:
+                    def fits(total: float, allowed: float = allowed, amount: int = amount) -> bool:
+                        return total + amount <= allowed
+                if fits(totals[index]):
+                    continue
+
+                label = METRIC_LABELS[METRICS[index]]
+                period = format_window(limit.window_seconds)
+                reserved = (f" (la parte de {allowed:g} reservada a los trabajos en segundo plano)"
+                            if share < 1 else '')
+                if amount > allowed:
+                    return (f"La petición ({amount} {label}) supera el límite de {cap} {label} "
+                            f"cada {period}{reserved}.", None)
+                retry_after = window.wait_for(now, index, fits)
+                subject = ("Has alcanzado tu límite" if scope == 'user'
+                           else "El servicio ha alcanzado su límite compartido")
+                return (f"{subject} de {cap} {label} cada {period}{reserved}. "
+                        f"Inténtalo de nuevo en {max(1, round(retry_after))} s.", retry_after)
+        return None
+
+    def admit(
+        self,
+        user_id: str,
+        priority: str = INTERACTIVE,
+        input_tokens: int = 0,
+        wait: bool = True
+    ) -> None:
+        """
+        Carga una llamada al consumo de un usuario si cabe en sus límites.
+
+        Se cuenta una petición y los tokens de entrada estimados; settle()
+        los corrige con los reales al terminar.
+
+        Args:
+            user_id: Identificador del usuario.
+            priority: INTERACTIVE o BATCH.
+            input_tokens: Tokens de entrada estimados de la llamada.
+            wait: Si es False, las llamadas de lotes tampoco esperan a que
+                la ventana se libere.
+
+        Raises:
+            BudgetExceededError: Si la llamada supera un límite (las de lotes,
+                tras esperar hasta max_batch_wait) o nunca podría caber en él.
+            ValueError: Si la prioridad no es válida.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Prioridad desconocida: {priority}")
+        share = 1.0 if priority == INTERACTIVE else self.batch_share
+        max_wait = self.max_batch_wait if wait else 0.0
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                usage = self._user_locked(user_id, now)
+                violation = (self._violation(usage, self.user_limits, share, input_tokens,
+                                             now, 'user')
+                             or self._violation(self._global, self.global_limits, share,
+                                                input_tokens, now, 'global'))
+                if violation is None:
+                    usage.waited_seconds += now - start
+                    usage.add(now, 1, input_tokens, 0)
+                    self._global.add(now, 1, input_tokens, 0)
+                    return
+                message, retry_after = violation
+                remaining = start + max_wait - now
+                if priority == INTERACTIVE or retry_after is None or retry_after > remaining:
+                    usage.rejected += 1
+                    self._global.rejected += 1
+                    raise BudgetExceededError(message, retry_after)
+            time.sleep(min(retry_after, remaining) + 0.01)
+
+    def settle(
+        self,
+        user_id: str,
+        reserved_input: int,
+        input_tokens: Optional[int],
+        output_tokens: Optional[int]
+    ) -> None:
+        """
+        Corrige el consumo de una llamada admitida con los tokens reales.
+
+        La diferencia se suma a la cubeta actual.
+
+        Args:
+            user_id: Identificador del usuario.
+            reserved_input: Tokens de entrada estimados en admit().
+            input_tokens: Tokens de entrada reales (None para conservar la
+                estimación, 0 para devolverla si la llamada falló).
+            output_tokens: Tokens de salida reales, o None si no se conocen.
+        """
+        delta = (input_tokens - reserved_input) if input_tokens is not None else 0
+        output = output_tokens or 0
+        if not delta and not output:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._user_locked(user_id, now).add(now, 0, delta, output)
+            self._global.add(now, 0, delta, output)
+
+    def _report(self, usage: _Usage, limits: list[UsageLimit], now: float) -> dict:
+        window = usage.windows[self.usage_window].totals(now)
+        report = dict(zip(METRICS, window))
+        report['window_seconds'] = self.usage_window
+        report['total'] = dict(zip(METRICS, usage.totals))
+        report['rejected'] = usage.rejected
+        report['waited_seconds'] = round(usage.waited_seconds, 3)
+        report['limits'] = []
+        for limit in limits:
+            totals = usage.windows[limit.window_seconds].totals(now)
+            for index, cap in limit.caps():
+                report['limits'].append({
+                    'window_seconds': limit.window_seconds,
+                    'metric': METRICS[index],
+                    'limit': cap,
+                    'used': totals[index],
+                    'remaining': max(0, cap - totals[index])
+                })
+        return report
+
+    def usage(self, user_id: str) -> dict:
+        """
+        Devuelve el consumo de un usuario.
+
+        Args:
+            user_id: Identificador del usuario.
+
+        Returns:
+            Diccionario con requests, input_tokens y output_tokens de las
+            últimas usage_window segundos, 'total' (acumulado desde que el
+            usuario está activo), 'rejected', 'waited_seconds' y 'limits'
+            (uso y margen de cada límite configurado).
+        """
+        with self._lock:
+            now = time.monotonic()
+            usage = self._users.get(user_id) or _Usage(self._windows, self._buckets)
+            report = self._report(usage, self.user_limits, now)
+        report['user_id'] = user_id
+        return report
+
+    def top_users(self, limit: int = 10) -> list[dict]:
+        """
+        Devuelve los usuarios que más tokens consumieron en usage_window.
+
+        Args:
+            limit: Número máximo de usuarios.
+
+        Returns:
+            Informes de usage(), de mayor a menor consumo de tokens.
+        """
+        with self._lock:
+            now = time.monotonic()
+            reports = []
+            for user_id, usage in self._users.items():
+                report = self._report(usage, self.user_limits, now)
+                report['user_id'] = user_id
+                reports.append(report)
+        reports.sort(key=lambda r: r['input_tokens'] + r['output_tokens'], reverse=True)
+        return reports[:limit]
+
+    def stats(self) -> dict:
+        """
+        Devuelve el consumo del conjunto de usuarios.
+
+        Returns:
+            Informe como el de usage() con los límites globales, más 'users'
+            (usuarios con consumo reciente).
+        """
+        with self._lock:
+            now = time.monotonic()
+            report = self._report(self._global, self.global_limits, now)
+            report['users'] = len(self._users)
+        return report
+
+
+_default_governor: Optional[Governor] = None
+_default_governor_lock = threading.Lock()
+
+
+def get_governor() -> Governor:
+    """
+    Devuelve el gobernador de consumo del proceso.
+
+    Los límites se leen de WRITING_USER_LIMITS (por usuario) y
+    WRITING_GLOBAL_LIMITS (de todos los usuarios) con el formato de
+    parse_limits; WRITING_BATCH_SHARE fija la fracción disponible para los
+    trabajos en segundo plano y WRITING_BATCH_MAX_WAIT su espera máxima. Sin
+    límites, solo se mide el consumo.
+
+    Returns:
+        Instancia única de Governor.
+    """
+    global _default_governor
+    with _default_governor_lock:
+        if _default_governor is None:
+            _default_governor = Governor(
+                user_limits=parse_limits(os.getenv('WRITING_USER_LIMITS')),
+                global_limits=parse_limits(os.getenv('WRITING_GLOBAL_LIMITS')),
+                batch_share=float(os.getenv('WRITING_BATCH_SHARE', '0.5')),
+                max_batch_wait=float(os.getenv('WRITING_BATCH_MAX_WAIT', '120'))
+            )
+        return _default_governor
@@ -0,0 +1,68 @@
+"""
+Módulo de reprocesamiento incremental por párrafos.
+
+Este módulo guarda, para una operación y un tono, el resultado de cada párrafo
+procesado indexado por el hash de su contenido. En la siguiente ejecución solo
+se envían al modelo los párrafos nuevos o modificados y el resto se reutiliza.
+"""
+
+import threading
+from typing import Optional
+
+
+class ParagraphHistory:
+    """
+    Resultados por párrafo de la última ejecución de una operación.
+
+    Una instancia debe usarse para una sola combinación de operación y tono
+    (por ejemplo, guardada en st.session_state).
+
+    Attributes:
+        reused_total (int): Párrafos reutilizados en todas las ejecuciones.
+        recomputed_total (int): Párrafos enviados al modelo en todas las ejecuciones.
+    """
+
+    def __init__(self) -> None:
+        """Crea un historial vacío."""
+        self._results: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.reused_total = 0
+        self.recomputed_total = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Devuelve el resultado previo de un párrafo.
+
+        Args:
+            key: Hash del párrafo (ver make_cache_key).
+
+        Returns:
+            Texto procesado, o None si el párrafo no estaba en la última ejecución.
+        """
+        with self._lock:
+            return self._results.get(key)
+
+    def replace(self, results: dict[str, str], reused: int, recomputed: int) -> None:
+        """
+        Sustituye el historial por los párrafos de la ejecución actual.
+
+        Solo se conservan los párrafos del texto más reciente, de modo que el
+        historial no crece con las ediciones.
+
+        Args:
+            results: Resultados por hash de párrafo.
+            reused: Párrafos reutilizados en esta ejecución.
+            recomputed: Párrafos recalculados en esta ejecución.
+        """
+        with self._lock:
+            self._results = dict(results)
+            self.reused_total += reused
+            self.recomputed_total += recomputed
+
+    def clear(self) -> None:
+        """Olvida todos los párrafos almacenados."""
+        with self._lock:
+            self._results.clear()
+
+    def __len__(self) -> int:
+        return len(self._results)
@@ -0,0 +1,467 @@
+"""
+Trabajos en segundo plano para las operaciones largas del asistente.
+
+La interfaz de Streamlit vuelve a ejecutar el script completo con cada
+interacción, así que una llamada larga hecha dentro del script se pierde (o
+se repite) si el usuario pulsa algo mientras espera. JobManager ejecuta esas
+operaciones en un grupo de hilos propio del proceso y guarda en SQLite el
+estado, el progreso y el resultado de cada trabajo, de modo que la interfaz
+solo envía el trabajo, consulta su estado y puede mostrar resultados de
+trabajos enviados en ejecuciones o sesiones anteriores.
+
+Cada usuario tiene un límite de trabajos en ejecución y de trabajos en cola.
+Los trabajos en cola se cancelan al instante; los que están en ejecución se
+detienen al terminar el fragmento en curso (una llamada ya enviada al modelo
+no se puede abortar con el SDK síncrono, y su resultado se descarta).
+
+Las llamadas al modelo de los trabajos se cargan al usuario con prioridad de
+lotes en el gobernador de consumo, por debajo de las peticiones interactivas.
+"""
+
+import atexit
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from services.ai_service import RESULT_KEYS, WritingAssistant
+from services.governor import BATCH
+
+
+DEFAULT_DB_PATH = os.path.join('data', 'jobs.db')
+
+# Operaciones admitidas y clave del texto producido en su resultado.
+JOB_RESULT_KEYS = dict(RESULT_KEYS, pipeline='final_text')
+
+# Tamaño a partir del cual fix_grammar e improve_style se procesan por
+# fragmentos, con progreso y cancelación entre fragmentos.
+CHUNKED_CHARS = 4000
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS jobs ('
+    'id TEXT PRIMARY KEY, '
+    'user_id TEXT NOT NULL, '
+    'operation TEXT NOT NULL, '
+    'input TEXT NOT NULL, '
+    'tone TEXT, '
+    'status TEXT NOT NULL, '
+    'progress REAL NOT NULL DEFAULT 0, '
+    'result TEXT, '
+    'error TEXT, '
+    'created_at REAL NOT NULL, '
+    'started_at REAL, '
+    'finished_at REAL, '
+    'owner TEXT)',
+    'CREATE INDEX IF NOT EXISTS jobs_user_created ON jobs(user_id, created_at)',
+)
+# Bases de datos creadas antes de guardar el proceso dueño de cada trabajo.
+ADD_OWNER_COLUMN = 'ALTER TABLE jobs ADD COLUMN owner TEXT'
+
+INSERT_JOB = (
+    'INSERT INTO jobs (id, user_id, operation, input, tone, status, created_at, owner) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+)
+MARK_RUNNING = "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'"
+UPDATE_PROGRESS = "UPDATE jobs SET progress = ? WHERE id = ? AND status = 'running'"
+FINISH_JOB = (
+    'UPDATE jobs SET status = ?, progress = ?, result = ?, error = ?, finished_at = ? '
+    "WHERE id = ? AND status IN ('queued', 'running')"
+)
+SELECT_PENDING_OWNERS = "SELECT DISTINCT owner FROM jobs WHERE status IN ('queued', 'running')"
+INTERRUPT_JOBS = (
+    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+    "WHERE owner IS ? AND status IN ('queued', 'running')"
+)
+SELECT_COLUMNS = ('SELECT id, user_id, operation, input, tone, status, progress, result, '
+                  'error, created_at, started_at, finished_at FROM jobs ')
+SELECT_JOB = SELECT_COLUMNS + 'WHERE id = ?'
+SELECT_USER_JOBS = SELECT_COLUMNS + 'WHERE user_id = ? ORDER BY created_at DESC LIMIT ?'
+
+
+# Dueños (ver JobManager.owner) de los gestores abiertos en este proceso.
+_live_owners: set[str] = set()
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """
+    Indica si el proceso dueño de un trabajo puede seguir ejecutándolo.
+
+    Solo se puede comprobar en la misma máquina; los dueños de otras
+    máquinas se dan por vivos. Los trabajos sin dueño son de versiones
+    anteriores, que no compartían la base de datos entre procesos.
+    """
+    if owner is None:
+        return False
+    if owner in _live_owners:
+        return True
+    host, pid, _ = owner.rsplit(':', 2)
+    if host != socket.gethostname():
+        return True
+    if int(pid) == os.getpid() or os.name == 'nt':
+        # En Windows os.kill(pid, 0) terminaría el proceso en lugar de consultarlo.
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class JobLimitError(ValueError):
+    """El usuario ha alcanzado su límite de trabajos en cola."""
+
+
+class JobCancelled(Exception):
+    """El trabajo se canceló mientras estaba en ejecución."""
+
+
+def _row_to_dict(row: tuple) -> dict:
+    return {
+        'id': row[0],
+        'user_id': row[1],
+        'operation': row[2],
+        'input': row[3],
+        'tone': row[4],
+        'status': row[5],
+        'progress': row[6],
+        'result': json.loads(row[7]) if row[7] else None,
+        'error': row[8],
+        'created_at': row[9],
+        'started_at': row[10],
+        'finished_at': row[11]
+    }
+
+
+@dataclass
+class _Pending:
+    job_id: str
+    user_id: str
+    operation: str
+    text: str
+    tone: Optional[str]
+    bypass_cache: bool
+    assistant: WritingAssistant
+
+
+class JobManager:
+    """
+    Cola de trabajos con estado persistente en SQLite.
+
+    Attributes:
+        path (str): Ruta del archivo de base de datos.
+        workers (int): Trabajos ejecutados a la vez en todo el proceso.
+        max_running_per_user (int): Trabajos en ejecución por usuario.
+        max_queued_per_user (int): Trabajos en cola o en ejecución por usuario.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_DB_PATH,
+        workers: int = 4,
+        max_running_per_user: int = 2,
+        max_queued_per_user: int = 10
+    ) -> None:
+        """
+        Abre (o crea) la base de datos de trabajos.
+
+        Los trabajos que quedaron en cola o en ejecución en un proceso que ya
+        no existe se marcan como fallidos: la clave API no se guarda, así que
+        no se pueden reanudar. Los de otros procesos vivos que comparten la
+        base de datos (otras réplicas) no se tocan.
+
+        Args:
+            path: Ruta del archivo SQLite.
+            workers: Trabajos ejecutados a la vez en todo el proceso.
+            max_running_per_user: Trabajos en ejecución por usuario.
+            max_queued_per_user: Trabajos pendientes (en cola o en ejecución)
+                admitidos por usuario.
+        """
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_running_per_user = max(1, max_running_per_user)
+        self.max_queued_per_user = max(1, max_queued_per_user)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Proceso dueño de los trabajos que envía este gestor: máquina, PID y
+        # un identificador propio (un PID se puede reutilizar).
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._write_conn = self._connect()
+        for statement in SCHEMA:
+            self._write_conn.execute(statement)
+        try:
+            self._write_conn.execute(ADD_OWNER_COLUMN)
+        except sqlite3.OperationalError:
+            pass  # La columna ya existe.
+        for (owner,) in self._write_conn.execute(SELECT_PENDING_OWNERS).fetchall():
+            if not _owner_alive(owner):
+                self._write_conn.execute(INTERRUPT_JOBS, ('Interrumpido: el servidor se reinició',
+                                                          time.time(), owner))
+        self._write_conn.commit()
+        _live_owners.add(self.owner)
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+
+        self._lock = threading.Lock()
+        self._queue: deque[_Pending] = deque()
+        self._running: dict[str, str] = {}
+        self._cancel_events: dict[str, threading.Event] = {}
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=64)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _read_conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _write(self, statement: str, params: tuple) -> int:
+        with self._write_lock:
+            cursor = self._write_conn.execute(statement, params)
+            self._write_conn.commit()
+        return cursor.rowcount
+
+    def submit(
+        self,
+        assistant: WritingAssistant,
+        user_id: str,
+        operation: str,
+        text: str,
+        tone: Optional[str] = None,
+        bypass_cache: bool = False
+    ) -> str:
+        """
+        Encola una operación.
+
+        Args:
+            assistant: Asistente con el que se ejecutará el trabajo.
+            user_id: Identificador del usuario.
+            operation: fix_grammar, improve_style, generate_content o pipeline
+                (corrección y mejora de estilo en una llamada).
+            text: Texto o tema de entrada.
+            tone: Tono para improve_style y pipeline.
+            bypass_cache: Si es True, consulta siempre al modelo.
+
+        Returns:
+            Identificador del trabajo.
+
+        Raises:
+            ValueError: Si la operación no existe.
+            JobLimitError: Si el usuario ya tiene max_queued_per_user trabajos pendientes.
+        """
+        if operation not in JOB_RESULT_KEYS:
+            raise ValueError(f"Operación no admitida: {operation}")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            pending = (sum(1 for job in self._queue if job.user_id == user_id)
+                       + sum(1 for owner in self._running.values() if owner == user_id))
+            if pending >= self.max_queued_per_user:
+                raise JobLimitError(
+                    f"Tienes {pending} trabajos pendientes; espera a que terminen o cancela alguno"
+                )
+            self._write(INSERT_JOB, (job_id, user_id, operation, text, tone, QUEUED,
+                                     time.time(), self.owner))
+            self._queue.append(_Pending(job_id, user_id, operation, text, tone, bypass_cache,
+                                        assistant))
+            self._schedule_locked()
+        return job_id
+
+    def _schedule_locked(self) -> None:
+        """Arranca los trabajos en cola para los que hay hueco (con self._lock tomado)."""
+        while len(self._running) < self.workers:
+            running_by_user: dict[str, int] = {}
+            for owner in self._running.values():
+                running_by_user[owner] = running_by_user.get(owner, 0) + 1
+            job = next((job for job in self._queue
+                        if running_by_user.get(job.user_id, 0) < self.max_running_per_user),
+                       None)
+            if job is None:
+                return
+            self._queue.remove(job)
+            self._running[job.job_id] = job.user_id
+            self._cancel_events[job.job_id] = threading.Event()
+            self._executor.submit(self._execute, job)
+
+    def _execute(self, job: _Pending) -> None:
+        cancelled = self._cancel_events[job.job_id]
+        try:
+            if cancelled.is_set():
+                raise JobCancelled()
+            self._write(MARK_RUNNING, (time.time(), job.job_id))
+            result = self._run(job, cancelled)
+            if cancelled.is_set():
+                raise JobCancelled()
+            status = DONE if result.get('success') else FAILED
+            self._write(FINISH_JOB, (status, 1.0, json.dumps(result, ensure_ascii=False),
+                                     result.get('error'), time.time(), job.job_id))
+        except JobCancelled:
+            self._write(FINISH_JOB, (CANCELLED, 0.0, None, 'Cancelado por el usuario',
+                                     time.time(), job.job_id))
+        except Exception as e:
+            self._write(FINISH_JOB, (FAILED, 0.0, None, f'Error: {str(e)}', time.time(),
+                                     job.job_id))
+        finally:
+            with self._lock:
+                self._running.pop(job.job_id, None)
+                self._cancel_events.pop(job.job_id, None)
+                self._schedule_locked()
+
+    def _run(self, job: _Pending, cancelled: threading.Event) -> dict:
+        assistant = job.assistant.for_user(job.user_id, BATCH)
+
+        def on_progress(done: int, total: int) -> None:
+            if cancelled.is_set():
+                raise JobCancelled()
+            self._write(UPDATE_PROGRESS, (done / total, job.job_id))
+
+        if job.operation == 'generate_content':
+            return assistant.generate_content(job.text, bypass_cache=job.bypass_cache)
+        if job.operation == 'pipeline':
+            return assistant.run_pipeline(job.text, ['grammar', f'style:{job.tone or "Formal"}'],
+                                          bypass_cache=job.bypass_cache)
+        if len(job.text) > CHUNKED_CHARS:
+            return assistant.process_long_document(job.text, job.operation, tone=job.tone,
+                                                   bypass_cache=job.bypass_cache,
+                                                   on_progress=on_progress)
+        if job.operation == 'fix_grammar':
+            return assistant.fix_grammar(job.text, bypass_cache=job.bypass_cache)
+        return assistant.improve_style(job.text, job.tone or 'Formal',
+                                       bypass_cache=job.bypass_cache)
+
+    def cancel(self, job_id: str, user_id: Optional[str] = None) -> bool:
+        """
+        Cancela un trabajo en cola o en ejecución.
+
+        Args:
+            job_id: Identificador del trabajo.
+            user_id: Si se indica, solo se cancela si el trabajo es de este usuario.
+
+        Returns:
+            True si el trabajo estaba pendiente y queda cancelado.
+        """
+        with self._lock:
+            queued = next((job for job in self._queue if job.job_id == job_id), None)
+            if queued is not None:
+                if user_id is not None and queued.user_id != user_id:
+                    return False
+                self._queue.remove(queued)
+                self._write(FINISH_JOB, (CANCELLED, 0.0, None, 'Cancelado por el usuario',
+                                         time.time(), job_id))
+                return True
+            event = self._cancel_events.get(job_id)
+            if event is None or (user_id is not None and self._running[job_id] != user_id):
+                return False
+            event.set()
+        # El estado se marca ya como cancelado; el hilo descarta el resultado.
+        self._write(FINISH_JOB, (CANCELLED, 0.0, None, 'Cancelado por el usuario',
+                                 time.time(), job_id))
+        return True
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Devuelve el estado de un trabajo.
+
+        Args:
+            job_id: Identificador del trabajo.
+
+        Returns:
+            Diccionario con 'id', 'user_id', 'operation', 'input', 'tone',
+            'status', 'progress' (0 a 1), 'result' (diccionario de la
+            operación), 'error' y las marcas de tiempo; None si no existe.
+        """
+        row = self._read_conn().execute(SELECT_JOB, (job_id,)).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def list_jobs(self, user_id: str, limit: int = 10) -> list[dict]:
+        """
+        Devuelve los trabajos de un usuario, del más reciente al más antiguo.
+
+        Args:
+            user_id: Identificador del usuario.
+            limit: Número máximo de trabajos.
+
+        Returns:
+            Lista de diccionarios como los de get().
+        """
+        rows = self._read_conn().execute(SELECT_USER_JOBS, (user_id, limit)).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def stats(self) -> dict:
+        """
+        Devuelve la ocupación actual.
+
+        Returns:
+            Diccionario con trabajos en cola y en ejecución.
+        """
+        with self._lock:
+            return {'queued': len(self._queue), 'running': len(self._running)}
+
+    def close(self, wait: bool = True) -> None:
+        """
+        Cancela los trabajos en cola y detiene el grupo de hilos.
+
+        Sin esperar, los trabajos que sigan en ejecución se marcan como
+        interrumpidos, ya que el proceso va a terminar.
+
+        Args:
+            wait: Si es True, espera a que terminen los trabajos en ejecución.
+        """
+        with self._lock:
+            queued = list(self._queue)
+            self._queue.clear()
+        for job in queued:
+            self._write(FINISH_JOB, (CANCELLED, 0.0, None, 'Cancelado: el servidor se detuvo',
+                                     time.time(), job.job_id))
+        self._executor.shutdown(wait=wait)
+        _live_owners.discard(self.owner)
+        if not wait:
+            self._write(INTERRUPT_JOBS, ('Interrumpido: el servidor se detuvo', time.time(),
+                                         self.owner))
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    Devuelve el gestor de trabajos del proceso.
+
+    La ruta se toma de WRITING_JOBS_DB; WRITING_JOB_WORKERS,
+    WRITING_JOBS_PER_USER y WRITING_JOBS_QUEUED_PER_USER ajustan la
+    concurrencia total, los trabajos en ejecución por usuario y los
+    pendientes por usuario.
+
+    Returns:
+        Instancia única de JobManager.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager(
+                os.getenv('WRITING_JOBS_DB', DEFAULT_DB_PATH),
+                workers=int(os.getenv('WRITING_JOB_WORKERS', '4')),
+                max_running_per_user=int(os.getenv('WRITING_JOBS_PER_USER', '2')),
+                max_queued_per_user=int(os.getenv('WRITING_JOBS_QUEUED_PER_USER', '10'))
+            )
+            atexit.register(_manager.close, False)
+        return _manager
@@ -0,0 +1,186 @@
+"""
+Correcciones locales y deterministas previas a fix_grammar.
+
+Antes de llamar al modelo, el texto pasa por correcciones seguras que no
+dependen del contexto (tildes de palabras que sin ella no existen, espacios
+duplicados o antes de un signo de puntuación, signos de apertura ¿/¡ en
+oraciones interrogativas o exclamativas completas) y el modelo recibe el
+texto ya corregido.
+
+El texto siempre va al modelo: ninguna comprobación local puede ver los
+errores de concordancia ni de sintaxis ("Ella es muy buenos."), así que el
+paso local no decide por sí solo que un texto es correcto. Sus estadísticas
+muestran cuántos textos corrige y cuánto cuesta por llamada.
+"""
+
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+WORD_RE = re.compile(r'[^\W\d_]+')
+SENTENCE_RE = re.compile(r'[^.!?…\n]+[.!?…]*')
+MULTI_SPACE_RE = re.compile(r'(?<=\S) {2,}(?=\S)')
+SPACE_BEFORE_PUNCT_RE = re.compile(r'(?<=[^\W_]) +([,.;:!?)»])')
+
+# Formas sin tilde que no existen en español, con su forma correcta. Se
+# excluyen las que también son palabras válidas (publico, medico, sabia...).
+ACCENT_FIXES = {
+    'gramatica': 'gramática', 'ortografia': 'ortografía', 'tambien': 'también',
+    'despues': 'después', 'ademas': 'además', 'asi': 'así', 'aqui': 'aquí',
+    'alli': 'allí', 'ahi': 'ahí', 'alla': 'allá', 'aca': 'acá', 'jamas': 'jamás',
+    'quizas': 'quizás', 'segun': 'según', 'ningun': 'ningún', 'algun': 'algún',
+    'atras': 'atrás', 'detras': 'detrás', 'adios': 'adiós', 'todavia': 'todavía',
+    'dia': 'día', 'dias': 'días', 'pais': 'país', 'paises': 'países',
+    'dificil': 'difícil', 'facil': 'fácil', 'util': 'útil', 'rapido': 'rápido',
+    'proximo': 'próximo', 'proxima': 'próxima', 'telefono': 'teléfono', 'metodo': 'método',
+    'arbol': 'árbol', 'lapiz': 'lápiz', 'cafe': 'café',
+    'debil': 'débil', 'movil': 'móvil', 'examenes': 'exámenes', 'jovenes': 'jóvenes',
+    'imagenes': 'imágenes', 'unico': 'único', 'unica': 'única', 'tecnico': 'técnico',
+    'economico': 'económico', 'historico': 'histórico', 'basico': 'básico',
+    'logico': 'lógico', 'aleman': 'alemán',
+    'habia': 'había', 'habian': 'habían', 'podia': 'podía', 'podian': 'podían',
+    'queria': 'quería', 'decia': 'decía', 'estaria': 'estaría', 'podria': 'podría',
+    'podrias': 'podrías', 'deberia': 'debería', 'tendria': 'tendría', 'haria': 'haría',
+    'gustaria': 'gustaría', 'habria': 'habría', 'energia': 'energía',
+    'tecnologia': 'tecnología', 'compañia': 'compañía', 'policia': 'policía',
+    'categoria': 'categoría', 'mayoria': 'mayoría', 'alegria': 'alegría',
+    'teoria': 'teoría', 'filosofia': 'filosofía', 'geografia': 'geografía',
+    'miercoles': 'miércoles', 'sabado': 'sábado',
+}
+
+
+@dataclass
+class LocalCheck:
+    """
+    Resultado de las correcciones locales.
+
+    Attributes:
+        text: Texto tras aplicar las correcciones seguras.
+        fixes: Tipos de corrección aplicados ('tildes', 'espacios', 'signos de apertura').
+        seconds: Duración de la comprobación.
+    """
+    text: str
+    fixes: list[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+def _match_case(original: str, fixed: str) -> str:
+    if original.isupper() and len(original) > 1:
+        return fixed.upper()
+    if original[0].isupper():
+        return fixed[0].upper() + fixed[1:]
+    return fixed
+
+
+def _accent_fix(word: str) -> Optional[str]:
+    lower = word.lower()
+    fixed = ACCENT_FIXES.get(lower)
+    if fixed is None and len(lower) > 5 and lower.endswith(('cion', 'sion')):
+        fixed = lower[:-2] + 'ón'
+    return _match_case(word, fixed) if fixed else None
+
+
+def _add_opening_marks(text: str) -> str:
+    def fix(match: re.Match) -> str:
+        sentence = match.group(0)
+        stripped = sentence.rstrip()
+        for closing, opening in (('?', '¿'), ('!', '¡')):
+            # Solo oraciones completas: con una coma, la pregunta puede
+            # empezar a mitad de la oración y decide el modelo.
+            if stripped.endswith(closing) and opening not in sentence and ',' not in sentence:
+                start = len(sentence) - len(sentence.lstrip())
+                return sentence[:start] + opening + sentence[start:]
+        return sentence
+    return SENTENCE_RE.sub(fix, text)
+
+
+class LocalChecker:
+    """
+    Pre-paso local de fix_grammar con estadísticas de uso.
+
+    Attributes:
+        calls (int): Textos comprobados.
+        fixed (int): Textos modificados por las correcciones seguras.
+    """
+
+    def __init__(self) -> None:
+        """Crea el comprobador con sus contadores a cero."""
+        self.calls = 0
+        self.fixed = 0
+        self._total_seconds = 0.0
+        self._max_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def check(self, text: str) -> LocalCheck:
+        """
+        Aplica las correcciones seguras.
+
+        Args:
+            text: Texto a corregir.
+
+        Returns:
+            LocalCheck con el texto corregido y las correcciones aplicadas.
+        """
+        start = time.perf_counter()
+        fixes = []
+
+        fixed = WORD_RE.sub(lambda m: _accent_fix(m.group(0)) or m.group(0), text)
+        if fixed != text:
+            fixes.append('tildes')
+        spaced = SPACE_BEFORE_PUNCT_RE.sub(r'\1', MULTI_SPACE_RE.sub(' ', fixed))
+        if spaced != fixed:
+            fixes.append('espacios')
+        marked = _add_opening_marks(spaced)
+        if marked != spaced:
+            fixes.append('signos de apertura')
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.calls += 1
+            self.fixed += bool(fixes)
+            self._total_seconds += elapsed
+            self._max_seconds = max(self._max_seconds, elapsed)
+        return LocalCheck(marked, fixes, elapsed)
+
+    def stats(self) -> dict:
+        """
+        Devuelve las estadísticas de las correcciones locales.
+
+        Returns:
+            Diccionario con textos comprobados, textos modificados (y su
+            fracción) y coste medio y máximo por llamada en microsegundos.
+        """
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'fixed': self.fixed,
+                'fix_rate': self.fixed / self.calls if self.calls else 0.0,
+                'mean_us': self._total_seconds / self.calls * 1e6 if self.calls else 0.0,
+                'max_us': self._max_seconds * 1e6
+            }
+
+
+_default_checker: Optional[LocalChecker] = None
+_default_checker_lock = threading.Lock()
+
+
+def get_local_checker() -> Optional[LocalChecker]:
+    """
+    Devuelve el comprobador local del proceso.
+
+    Está desactivado salvo que WRITING_LOCAL_CHECK=1.
+
+    Returns:
+        Instancia única de LocalChecker, o None si está desactivado.
+    """
+    global _default_checker
+    if os.getenv('WRITING_LOCAL_CHECK', '0') != '1':
+        return None
+    with _default_checker_lock:
+        if _default_checker is None:
+            _default_checker = LocalChecker()
+        return _default_checker
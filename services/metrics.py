@@ -0,0 +1,403 @@
+"""
+Módulo de métricas e instrumentación del Asistente de Escritura.
+
+Este módulo registra, por cada llamada al modelo, el tiempo total, el tiempo
+hasta el primer byte, los tokens de entrada y salida, el tamaño del prompt y
+de la respuesta, el motivo de finalización y la clase de error. Los datos se
+agregan en contadores e histogramas exportables en formato de texto de
+Prometheus (mediante una función o un pequeño servidor HTTP local) y,
+opcionalmente, como registros JSON estructurados.
+
+Cuando las métricas están desactivadas, registrar una llamada solo cuesta
+comprobar un atributo booleano.
+"""
+
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, asdict
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+
+logger = logging.getLogger('writing_assistant.metrics')
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536, 262144)
+
+
+@dataclass
+class CallRecord:
+    """
+    Datos de una llamada al modelo.
+
+    Attributes:
+        operation: Operación del asistente.
+        model: Modelo utilizado.
+        wall_seconds: Duración total de la llamada.
+        ttfb_seconds: Tiempo hasta el primer fragmento (igual a wall_seconds sin streaming).
+        prompt_chars: Caracteres del prompt enviado.
+        response_chars: Caracteres de la respuesta recibida.
+        input_tokens: Tokens de entrada según usage_metadata.
+        output_tokens: Tokens de salida según usage_metadata.
+        cached_tokens: Tokens de entrada servidos desde caché de contexto.
+        instruction_tokens: Tokens estimados de la instrucción fija (instrucción
+            de sistema y guía de estilo) incluidos en los de entrada.
+        finish_reason: Motivo de finalización del primer candidato.
+        error_class: Nombre de la clase de la excepción, si la llamada falló.
+    """
+    operation: str
+    model: str
+    wall_seconds: float
+    ttfb_seconds: Optional[float] = None
+    prompt_chars: int = 0
+    response_chars: int = 0
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    instruction_tokens: Optional[int] = None
+    finish_reason: Optional[str] = None
+    error_class: Optional[str] = None
+
+
+def _labels_text(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    """Contador con etiquetas."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...]) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, labels: tuple[str, ...], amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, labels: tuple[str, ...]) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_labels_text(self.label_names, labels)} {value:g}')
+        return lines
+
+    def snapshot(self) -> dict:
+        return {','.join(labels): value for labels, value in self._values.items()}
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas y cubetas fijas."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...],
+                 buckets: tuple[float, ...]) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, labels: tuple[str, ...], value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = [[0] * len(self.buckets), 0.0, 0]
+            self._series[labels] = series
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def mean(self, labels: tuple[str, ...]) -> Optional[float]:
+        series = self._series.get(labels)
+        if not series or not series[2]:
+            return None
+        return series[1] / series[2]
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        names = self.label_names + ('le',)
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{_labels_text(names, labels + (f"{bound:g}",))} '
+                             f'{bucket_count}')
+            lines.append(f'{self.name}_bucket{_labels_text(names, labels + ("+Inf",))} {count}')
+            lines.append(f'{self.name}_sum{_labels_text(self.label_names, labels)} {total:g}')
+            lines.append(f'{self.name}_count{_labels_text(self.label_names, labels)} {count}')
+        return lines
+
+    def snapshot(self) -> dict:
+        return {
+            ','.join(labels): {'count': count, 'sum': round(total, 6),
+                               'mean': round(total / count, 6) if count else None}
+            for labels, (_, total, count) in self._series.items()
+        }
+
+
+class Metrics:
+    """
+    Registro de métricas del asistente.
+
+    Attributes:
+        enabled (bool): Si es False, record() no hace nada.
+        json_logs (bool): Si es True, cada llamada se emite como registro JSON.
+    """
+
+    def __init__(self, enabled: bool = False, json_logs: bool = False) -> None:
+        """
+        Crea el registro de métricas.
+
+        Args:
+            enabled: Activa el registro de llamadas.
+            json_logs: Emite cada llamada como JSON en el logger
+                'writing_assistant.metrics'.
+        """
+        self.enabled = enabled
+        self.json_logs = json_logs
+        self._lock = threading.Lock()
+        op = ('operation',)
+        self.requests = Counter('writing_requests_total',
+                                'Llamadas al modelo por operación, modelo y estado.',
+                                ('operation', 'model', 'status'))
+        self.errors = Counter('writing_errors_total',
+                              'Llamadas fallidas por operación y clase de error.',
+                              ('operation', 'error_class'))
+        self.finish_reasons = Counter('writing_finish_reasons_total',
+                                      'Motivos de finalización por operación.',
+                                      ('operation', 'reason'))
+        self.cache_hits = Counter('writing_cache_hits_total',
+                                  'Respuestas servidas desde la caché.', op)
+        self.hedges = Counter('writing_hedged_requests_total',
+                              'Peticiones cubiertas con una segunda llamada, por modelo primario.',
+                              ('model',))
+        self.hedge_wins = Counter('writing_hedge_wins_total',
+                                  'Carreras de hedging ganadas por modelo.', ('model',))
+        self.input_tokens_total = Counter('writing_input_tokens_total',
+                                          'Tokens de entrada consumidos.', op)
+        self.output_tokens_total = Counter('writing_output_tokens_total',
+                                           'Tokens de salida generados.', op)
+        self.cached_tokens_total = Counter('writing_cached_input_tokens_total',
+                                           'Tokens de entrada servidos desde caché de contexto.', op)
+        self.instruction_tokens_total = Counter(
+            'writing_instruction_tokens_total',
+            'Tokens estimados de instrucciones fijas enviadas con cada llamada.', op)
+        self.duration = Histogram('writing_request_duration_seconds',
+                                  'Duración total de cada llamada.', op, LATENCY_BUCKETS)
+        self.ttfb = Histogram('writing_time_to_first_byte_seconds',
+                              'Tiempo hasta el primer fragmento de la respuesta.', op,
+                              LATENCY_BUCKETS)
+        self.input_tokens = Histogram('writing_input_tokens',
+                                      'Tokens de entrada por llamada.', op, SIZE_BUCKETS)
+        self.output_tokens = Histogram('writing_output_tokens',
+                                       'Tokens de salida por llamada.', op, SIZE_BUCKETS)
+        self.prompt_chars = Histogram('writing_prompt_chars',
+                                      'Caracteres del prompt por llamada.', op, SIZE_BUCKETS)
+        self.response_chars = Histogram('writing_response_chars',
+                                        'Caracteres de la respuesta por llamada.', op,
+                                        SIZE_BUCKETS)
+        self._collectors = [
+            self.requests, self.errors, self.finish_reasons, self.cache_hits,
+            self.hedges, self.hedge_wins,
+            self.input_tokens_total, self.output_tokens_total, self.cached_tokens_total,
+            self.instruction_tokens_total,
+            self.duration, self.ttfb, self.input_tokens, self.output_tokens,
+            self.prompt_chars, self.response_chars
+        ]
+
+    def record(self, record: CallRecord) -> None:
+        """
+        Registra una llamada al modelo.
+
+        Args:
+            record: Datos de la llamada.
+        """
+        if not self.enabled:
+            return
+        op = (record.operation,)
+        status = 'error' if record.error_class else 'ok'
+        with self._lock:
+            self.requests.inc((record.operation, record.model, status))
+            self.duration.observe(op, record.wall_seconds)
+            self.prompt_chars.observe(op, record.prompt_chars)
+            if record.error_class:
+                self.errors.inc((record.operation, record.error_class))
+            else:
+                self.ttfb.observe(op, record.ttfb_seconds if record.ttfb_seconds is not None
+                                  else record.wall_seconds)
+                self.response_chars.observe(op, record.response_chars)
+            if record.finish_reason:
+                self.finish_reasons.inc((record.operation, record.finish_reason))
+            if record.input_tokens is not None:
+                self.input_tokens.observe(op, record.input_tokens)
+                self.input_tokens_total.inc(op, record.input_tokens)
+            if record.output_tokens is not None:
+                self.output_tokens.observe(op, record.output_tokens)
+                self.output_tokens_total.inc(op, record.output_tokens)
+            if record.cached_tokens:
+                self.cached_tokens_total.inc(op, record.cached_tokens)
+            if record.instruction_tokens:
+                self.instruction_tokens_total.inc(op, record.instruction_tokens)
+        if self.json_logs:
+            logger.info(json.dumps({'event': 'model_call', **asdict(record)}, ensure_ascii=False))
+
+    def record_cache_hit(self, operation: str) -> None:
+        """
+        Registra una respuesta servida desde la caché.
+
+        Args:
+            operation: Operación del asistente.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.cache_hits.inc((operation,))
+
+    def record_hedge(self, primary: str, winner: Optional[str]) -> None:
+        """
+        Registra una petición cubierta con una segunda llamada.
+
+        Args:
+            primary: Modelo primario.
+            winner: Modelo cuya respuesta se usó (None si ambas fallaron).
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.hedges.inc((primary,))
+            if winner is not None:
+                self.hedge_wins.inc((winner,))
+
+    def mean_duration(self, operation: str) -> Optional[float]:
+        """
+        Devuelve la duración media observada de una operación.
+
+        Args:
+            operation: Operación del asistente.
+
+        Returns:
+            Segundos de media, o None si no hay observaciones.
+        """
+        with self._lock:
+            return self.duration.mean((operation,))
+
+    def render_prometheus(self) -> str:
+        """
+        Exporta todas las métricas en formato de texto de Prometheus.
+
+        Returns:
+            Texto listo para servir en /metrics.
+        """
+        with self._lock:
+            lines = []
+            for collector in self._collectors:
+                lines.extend(collector.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> dict:
+        """
+        Devuelve las métricas agregadas como diccionario serializable a JSON.
+
+        Returns:
+            Diccionario por nombre de métrica.
+        """
+        with self._lock:
+            return {collector.name: collector.snapshot() for collector in self._collectors}
+
+
+def response_details(response: Any) -> dict:
+    """
+    Extrae tokens y motivo de finalización de una respuesta del SDK.
+
+    Args:
+        response: Respuesta (o último fragmento en streaming) de Gemini.
+
+    Returns:
+        Diccionario con input_tokens, output_tokens, cached_tokens y finish_reason.
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    details = {
+        'input_tokens': getattr(usage, 'prompt_token_count', None),
+        'output_tokens': getattr(usage, 'candidates_token_count', None),
+        'cached_tokens': getattr(usage, 'cached_content_token_count', None),
+        'finish_reason': None
+    }
+    candidates = getattr(response, 'candidates', None) or []
+    if candidates:
+        reason = getattr(candidates[0], 'finish_reason', None)
+        if reason is not None:
+            details['finish_reason'] = getattr(reason, 'name', None) or str(reason)
+    return details
+
+
+def serve_metrics(metrics: 'Metrics', host: str = '127.0.0.1', port: int = 9464) -> 'ThreadingHTTPServer':
+    """
+    Arranca un servidor HTTP local en segundo plano que expone /metrics.
+
+    Args:
+        metrics: Registro de métricas a exportar.
+        host: Dirección de escucha (por defecto, solo local).
+        port: Puerto de escucha.
+
+    Returns:
+        Servidor en ejecución (llamar a shutdown() para detenerlo).
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path == '/metrics':
+                body = metrics.render_prometheus().encode('utf-8')
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            elif self.path == '/metrics.json':
+                body = json.dumps(metrics.snapshot(), ensure_ascii=False).encode('utf-8')
+                content_type = 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    return server
+
+
+_default_metrics: Optional[Metrics] = None
+_default_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """
+    Devuelve el registro de métricas del proceso.
+
+    Se activa con WRITING_METRICS=1 y emite registros JSON con
+    WRITING_METRICS_JSON=1.
+
+    Returns:
+        Instancia única de Metrics.
+    """
+    global _default_metrics
+    with _default_metrics_lock:
+        if _default_metrics is None:
+            _default_metrics = Metrics(
+                enabled=os.getenv('WRITING_METRICS', '0') == '1',
+                json_logs=os.getenv('WRITING_METRICS_JSON', '0') == '1'
+            )
+        return _default_metrics
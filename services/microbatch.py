@@ -0,0 +1,248 @@
+"""
+Agrupación de correcciones cortas en una sola llamada al modelo (micro-batching).
+
+La mayor parte del tráfico son correcciones de una oración, en las que el coste
+fijo de cada petición domina sobre el trabajo del modelo. MicroBatcher reúne
+las peticiones de fix_grammar que llegan durante unos milisegundos (o hasta
+completar un número de elementos), las envía como una lista JSON indexada en
+un único prompt y reparte la respuesta entre quienes las pidieron. Así una
+llamada a Gemini atiende decenas de correcciones y rinde más dentro de la
+cuota de peticiones por minuto.
+"""
+
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from services.ai_service import WritingAssistant
+
+
+def build_batch_prompt(texts: list[str]) -> str:
+    """
+    Construye un prompt que corrige varios textos a la vez.
+
+    Args:
+        texts: Textos a corregir; su posición en la lista es su id.
+
+    Returns:
+        Prompt que pide un objeto JSON con un resultado por id.
+    """
+    items = json.dumps([{'id': i, 'text': text} for i, text in enumerate(texts)],
+                       ensure_ascii=False)
+    return f"""Eres un experto corrector de gramática y ortografía en español.
+Corrige cada uno de los textos siguientes manteniendo el mismo significado y tono.
+Los textos se entregan como una lista JSON de objetos con "id" y "text".
+Responde únicamente con un objeto JSON de esta forma, con un elemento por cada id
+recibido y sin explicaciones adicionales:
+{{"items": [{{"id": 0, "text": "texto corregido"}}, ...]}}
+
+Textos: {items}"""
+
+
+def parse_batch_response(raw: str, expected: int) -> list[Optional[str]]:
+    """
+    Reparte la respuesta de un prompt agrupado entre sus elementos.
+
+    Args:
+        raw: Texto devuelto por el modelo.
+        expected: Número de textos enviados.
+
+    Returns:
+        Texto corregido por id; None en los elementos que faltan o no son
+        válidos (todos None si la respuesta no es JSON válido).
+    """
+    outputs: list[Optional[str]] = [None] * expected
+    raw = raw.strip()
+    if raw.startswith('```'):
+        raw = raw.strip('`')
+        raw = raw[raw.find('{'):]
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return outputs
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return outputs
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        index, text = item.get('id'), item.get('text')
+        if (isinstance(index, int) and 0 <= index < expected
+                and isinstance(text, str) and text.strip()):
+            outputs[index] = text.strip()
+    return outputs
+
+
+@dataclass
+class _Pending:
+    text: str
+    bypass_cache: bool
+    future: Future
+
+
+class MicroBatcher:
+    """
+    Agrupa llamadas concurrentes a fix_grammar en prompts de varios elementos.
+
+    Cada lote se cierra al alcanzar max_items elementos o al pasar max_wait_ms
+    desde el primero. Los textos de más de max_item_chars caracteres no se
+    agrupan.
+
+    Attributes:
+        max_items (int): Elementos máximos por lote.
+        max_wait_ms (float): Espera máxima desde el primer elemento del lote.
+        max_item_chars (int): Tamaño máximo de un texto agrupable.
+    """
+
+    def __init__(
+        self,
+        assistant: 'WritingAssistant',
+        max_items: int = 20,
+        max_wait_ms: float = 20.0,
+        max_item_chars: int = 1000,
+        max_concurrent_batches: int = 4
+    ) -> None:
+        """
+        Crea el agrupador. El hilo colector se inicia con la primera petición.
+
+        Args:
+            assistant: Asistente que ejecuta los lotes.
+            max_items: Elementos máximos por lote.
+            max_wait_ms: Milisegundos máximos de espera desde el primer elemento.
+            max_item_chars: Tamaño máximo de un texto agrupable.
+            max_concurrent_batches: Lotes enviados al modelo a la vez.
+        """
+        self.assistant = assistant
+        self.max_items = max(1, max_items)
+        self.max_wait_ms = max_wait_ms
+        self.max_item_chars = max_item_chars
+        self.batches = 0
+        self.batched_items = 0
+        self.fallback_items = 0
+        self.direct_items = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrent_batches),
+                                            thread_name_prefix='microbatch')
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def fix_grammar(self, text: str, bypass_cache: bool = False) -> dict:
+        """
+        Corrige un texto, agrupándolo con otras peticiones simultáneas.
+
+        Args:
+            text: Texto a corregir.
+            bypass_cache: Si es True, consulta siempre al modelo.
+
+        Returns:
+            El mismo diccionario que WritingAssistant.fix_grammar.
+        """
+        return self.submit(text, bypass_cache).result()
+
+    def submit(self, text: str, bypass_cache: bool = False) -> Future:
+        """
+        Encola un texto y devuelve un Future con su resultado.
+
+        Args:
+            text: Texto a corregir.
+            bypass_cache: Si es True, consulta siempre al modelo.
+
+        Returns:
+            Future que se resuelve con el diccionario de resultado.
+        """
+        if len(text) > self.max_item_chars:
+            with self._lock:
+                self.direct_items += 1
+            return self._executor.submit(self.assistant.fix_grammar, text, bypass_cache)
+
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("El agrupador está cerrado")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect, name='microbatch-collector',
+                                                daemon=True)
+                self._thread.start()
+        self._queue.put(_Pending(text, bypass_cache, future))
+        return future
+
+    def _collect(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait_ms / 1000.0
+            stop = False
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._executor.submit(self._process, batch)
+            if stop:
+                return
+
+    def _process(self, batch: list[_Pending]) -> None:
+        # Un lote mezcla peticiones con y sin caché: se separan para no
+        # ignorar la caché de quien no lo pidió.
+        for bypass_cache in (False, True):
+            items = [item for item in batch if item.bypass_cache == bypass_cache]
+            if not items:
+                continue
+            try:
+                results = self.assistant.fix_grammar_many([item.text for item in items],
+                                                          bypass_cache=bypass_cache)
+            except Exception as e:
+                for item in items:
+                    item.future.set_exception(e)
+                continue
+            with self._lock:
+                if any('batched' in result for result in results):
+                    self.batches += 1
+                self.batched_items += sum(1 for result in results if result.get('batched'))
+                self.fallback_items += sum(1 for result in results
+                                           if result.get('batched') is False)
+            for item, result in zip(items, results):
+                item.future.set_result(result)
+
+    def stats(self) -> dict:
+        """
+        Devuelve las estadísticas del agrupador.
+
+        Returns:
+            Diccionario con lotes enviados, elementos servidos desde un lote,
+            elementos reintentados individualmente, elementos no agrupables y
+            media de elementos por lote.
+        """
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'batched_items': self.batched_items,
+                'fallback_items': self.fallback_items,
+                'direct_items': self.direct_items,
+                'items_per_batch': self.batched_items / self.batches if self.batches else 0.0
+            }
+
+    def close(self) -> None:
+        """Procesa lo pendiente y detiene el hilo colector."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+        self._executor.shutdown(wait=True)
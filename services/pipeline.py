@@ -0,0 +1,126 @@
+"""
+Módulo de canalizaciones de varias operaciones en una sola llamada.
+
+Una canalización es una lista de pasos (por ejemplo, corrección gramatical
+seguida de mejora de estilo Formal). Este módulo interpreta los pasos,
+construye un prompt fusionado que pide todos los resultados intermedios como
+JSON estructurado y valida la respuesta.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+
+STEP_ALIASES = {
+    'grammar': 'fix_grammar',
+    'gramatica': 'fix_grammar',
+    'fix_grammar': 'fix_grammar',
+    'style': 'improve_style',
+    'estilo': 'improve_style',
+    'improve_style': 'improve_style',
+}
+
+# Configuración de generación para obtener JSON estructurado.
+JSON_GENERATION_CONFIG = {'response_mime_type': 'application/json'}
+
+
+@dataclass(frozen=True)
+class PipelineStep:
+    """
+    Paso de una canalización.
+
+    Attributes:
+        operation: 'fix_grammar' o 'improve_style'.
+        tone: Tono para improve_style (None en fix_grammar).
+    """
+    operation: str
+    tone: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return f'{self.operation}:{self.tone}' if self.tone else self.operation
+
+
+def parse_steps(steps: list) -> list[PipelineStep]:
+    """
+    Interpreta una lista de pasos.
+
+    Acepta cadenas como 'grammar', 'fix_grammar', 'style:Formal' o
+    'improve_style:Casual', o instancias de PipelineStep.
+
+    Args:
+        steps: Pasos en orden de ejecución.
+
+    Returns:
+        Lista de PipelineStep.
+
+    Raises:
+        ValueError: Si la lista está vacía o un paso no es válido.
+    """
+    if not steps:
+        raise ValueError("La canalización necesita al menos un paso")
+    parsed = []
+    for step in steps:
+        if isinstance(step, PipelineStep):
+            parsed.append(step)
+            continue
+        name, _, tone = str(step).partition(':')
+        operation = STEP_ALIASES.get(name.strip().lower())
+        if operation is None:
+            raise ValueError(f"Paso desconocido: {step}")
+        if operation == 'improve_style':
+            parsed.append(PipelineStep(operation, tone.strip() or 'Formal'))
+        else:
+            parsed.append(PipelineStep(operation))
+    return parsed
+
+
+def build_fused_prompt(text: str, instructions: list[str]) -> str:
+    """
+    Construye un prompt que ejecuta todos los pasos en una sola llamada.
+
+    Args:
+        text: Texto de entrada.
+        instructions: Instrucción de cada paso, en orden.
+
+    Returns:
+        Prompt que pide un objeto JSON con el resultado de cada paso.
+    """
+    numbered = '\n'.join(f'{i}. {instruction}' for i, instruction in enumerate(instructions, 1))
+    return f"""Eres un experto editor de textos en español.
+Aplica los siguientes pasos en orden; cada paso trabaja sobre el resultado del anterior:
+{numbered}
+
+Responde únicamente con un objeto JSON con esta forma:
+{{"steps": ["resultado del paso 1", "resultado del paso 2", ...]}}
+con exactamente {len(instructions)} elementos y sin explicaciones adicionales.
+
+Texto: {text}"""
+
+
+def parse_fused_response(raw: str, expected: int) -> Optional[list[str]]:
+    """
+    Valida la respuesta JSON de un prompt fusionado.
+
+    Args:
+        raw: Texto devuelto por el modelo.
+        expected: Número de pasos esperados.
+
+    Returns:
+        Resultado de cada paso, o None si la respuesta no es válida.
+    """
+    raw = raw.strip()
+    if raw.startswith('```'):
+        raw = raw.strip('`')
+        raw = raw[raw.find('{'):]
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return None
+    steps = data.get('steps') if isinstance(data, dict) else None
+    if not isinstance(steps, list) or len(steps) != expected:
+        return None
+    if not all(isinstance(step, str) and step.strip() for step in steps):
+        return None
+    return [step.strip() for step in steps]
@@ -0,0 +1,502 @@
+"""
+Módulo de limitación de tasa y reintentos para las llamadas a Gemini.
+
+Este módulo proporciona:
+- Cubetas de tokens para limitar peticiones por minuto y tokens por minuto.
+- Clasificación de errores en reintentables (cuota, sobrecarga) y permanentes.
+- Reintentos con espera exponencial con jitter que respetan las pistas del servidor.
+- Un límite de concurrencia adaptativo (AIMD) que se reduce al recibir
+  limitaciones de cuota y crece de nuevo con las respuestas exitosas.
+"""
+
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Optional
+
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+THROTTLE_STATUS_CODES = {429}
+RETRYABLE_MARKERS = ('RESOURCE_EXHAUSTED', 'UNAVAILABLE', 'DEADLINE_EXCEEDED',
+                     'INTERNAL', 'quota', 'rate limit', 'overloaded')
+RETRY_HINT = re.compile(r'retry in ([\d.]+)\s*s', re.IGNORECASE)
+# Intervalo con el que las llamadas asíncronas comprueban si hay hueco de concurrencia.
+ASYNC_SLOT_POLL_SECONDS = 0.005
+
+
+class TokenBucket:
+    """
+    Cubeta de tokens segura entre hilos.
+
+    Attributes:
+        rate_per_minute (float): Tokens que se reponen por minuto.
+        capacity (float): Tamaño máximo de la cubeta (ráfaga permitida).
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None) -> None:
+        """
+        Inicializa la cubeta llena.
+
+        Args:
+            rate_per_minute: Tokens que se reponen por minuto.
+            capacity: Tamaño de la cubeta. Por defecto, lo que se repone en un minuto.
+        """
+        self.rate_per_minute = rate_per_minute
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill_locked(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate_per_minute / 60.0)
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """
+        Reserva tokens y devuelve cuánto hay que esperar para poder usarlos.
+
+        La cubeta puede quedar en negativo; las siguientes reservas esperan
+        hasta que se repone la deuda. No bloquea al llamador.
+
+        Args:
+            amount: Tokens a consumir.
+
+        Returns:
+            Segundos de espera antes de realizar la llamada (0 si no hay que esperar).
+        """
+        with self._lock:
+            self._refill_locked()
+            self._tokens -= min(amount, self.capacity)
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens * 60.0 / self.rate_per_minute
+
+    def adjust(self, amount: float) -> None:
+        """
+        Corrige el consumo a posteriori (positivo consume, negativo devuelve).
+
+        Args:
+            amount: Tokens a descontar adicionalmente.
+        """
+        with self._lock:
+            self._refill_locked()
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+    @property
+    def available(self) -> float:
+        """Tokens disponibles en este momento."""
+        with self._lock:
+            self._refill_locked()
+            return self._tokens
+
+
+def retry_hint(error: BaseException) -> Optional[float]:
+    """
+    Extrae el tiempo de espera sugerido por el servidor, si lo hay.
+
+    Busca un RetryInfo en los detalles del error de google.api_core y, si
+    no existe, un texto del tipo "Please retry in 12.5s" en el mensaje.
+
+    Args:
+        error: Excepción recibida.
+
+    Returns:
+        Segundos sugeridos, o None.
+    """
+    for detail in getattr(error, 'details', None) or []:
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None:
+            seconds = getattr(delay, 'seconds', 0) + getattr(delay, 'nanos', 0) / 1e9
+            if seconds > 0:
+                return seconds
+    match = RETRY_HINT.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def classify_error(error: BaseException) -> tuple[bool, bool]:
+    """
+    Clasifica un error de la API.
+
+    Args:
+        error: Excepción recibida.
+
+    Returns:
+        Tupla (reintentable, limitación_de_cuota).
+    """
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES, code in THROTTLE_STATUS_CODES
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True, False
+    message = f'{type(error).__name__}: {error}'
+    throttled = ('RESOURCE_EXHAUSTED' in message or '429' in message
+                 or 'ResourceExhausted' in message or 'TooManyRequests' in message)
+    retryable = throttled or any(marker.lower() in message.lower() for marker in RETRYABLE_MARKERS)
+    return retryable, throttled
+
+
+class AdaptiveConcurrency:
+    """
+    Límite de concurrencia AIMD.
+
+    Cada respuesta exitosa incrementa el límite en 1/límite (crecimiento
+    aditivo de una unidad por "ronda"); cada limitación de cuota lo
+    multiplica por decrease_factor.
+
+    Attributes:
+        limit (float): Límite actual de llamadas simultáneas.
+        min_limit (int): Límite mínimo.
+        max_limit (int): Límite máximo.
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        decrease_factor: float = 0.5
+    ) -> None:
+        """
+        Inicializa el límite adaptativo.
+
+        Args:
+            initial: Límite inicial.
+            min_limit: Límite mínimo.
+            max_limit: Límite máximo.
+            decrease_factor: Factor multiplicativo aplicado en cada limitación.
+        """
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """Bloquea hasta que haya hueco bajo el límite actual."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def try_acquire(self) -> bool:
+        """
+        Ocupa un hueco si lo hay, sin bloquear.
+
+        Returns:
+            True si se ocupó el hueco; False si se alcanzó el límite actual.
+        """
+        with self._condition:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        """Libera un hueco."""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self) -> None:
+        """Incrementa el límite de forma aditiva."""
+        with self._condition:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def on_throttle(self) -> None:
+        """Reduce el límite de forma multiplicativa."""
+        with self._condition:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+
+@dataclass
+class RateLimitStats:
+    """
+    Contadores de la capa de limitación.
+
+    Attributes:
+        calls: Llamadas realizadas (sin contar reintentos).
+        retries: Reintentos realizados.
+        throttled: Errores de cuota recibidos.
+        permanent_errors: Errores no reintentables.
+        exhausted: Llamadas que agotaron los reintentos.
+        wait_seconds: Tiempo total esperado por las cubetas y los reintentos.
+    """
+    calls: int = 0
+    retries: int = 0
+    throttled: int = 0
+    permanent_errors: int = 0
+    exhausted: int = 0
+    wait_seconds: float = 0.0
+
+
+class RateLimiter:
+    """
+    Capa compartida de limitación de tasa, reintentos y concurrencia adaptativa.
+
+    Attributes:
+        requests (Optional[TokenBucket]): Cubeta de peticiones por minuto.
+        tokens (Optional[TokenBucket]): Cubeta de tokens por minuto.
+        concurrency (AdaptiveConcurrency): Límite adaptativo de llamadas simultáneas.
+        max_retries (int): Reintentos máximos por llamada.
+        base_delay (float): Espera base del backoff exponencial.
+        max_delay (float): Espera máxima entre reintentos.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        concurrency: Optional[AdaptiveConcurrency] = None
+    ) -> None:
+        """
+        Inicializa la capa de limitación.
+
+        Args:
+            requests_per_minute: Peticiones por minuto permitidas (None para no limitar).
+            tokens_per_minute: Tokens por minuto permitidos (None para no limitar).
+            max_retries: Reintentos máximos por llamada.
+            base_delay: Espera base en segundos del backoff exponencial.
+            max_delay: Espera máxima en segundos entre reintentos.
+            concurrency: Límite adaptativo de concurrencia (por defecto, uno nuevo).
+        """
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = concurrency if concurrency is not None else AdaptiveConcurrency()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._stats = RateLimitStats()
+        self._lock = threading.Lock()
+
+    def reserve(self, estimated_tokens: int = 0) -> float:
+        """
+        Reserva una petición y sus tokens estimados en las cubetas.
+
+        Args:
+            estimated_tokens: Tokens estimados de la petición.
+
+        Returns:
+            Segundos a esperar antes de enviar la petición.
+        """
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and estimated_tokens:
+            wait = max(wait, self.tokens.reserve(estimated_tokens))
+        return wait
+
+    def has_headroom(self, estimated_tokens: int = 0) -> bool:
+        """
+        Indica si una petición saldría ya, sin esperar a las cubetas.
+
+        No reserva nada: sirve para descartar peticiones opcionales.
+
+        Args:
+            estimated_tokens: Tokens estimados de la petición.
+
+        Returns:
+            True si las cubetas tienen saldo para la petición.
+        """
+        if self.requests is not None and self.requests.available < 1:
+            return False
+        if self.tokens is not None and self.tokens.available < estimated_tokens:
+            return False
+        return True
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """
+        Ajusta la cubeta de tokens con el consumo real informado por la API.
+
+        Args:
+            estimated_tokens: Tokens reservados antes de la llamada.
+            actual_tokens: Tokens reales (entrada + salida), o None si no se conocen.
+        """
+        if self.tokens is not None and actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def backoff(self, attempt: int, error: BaseException) -> Optional[float]:
+        """
+        Decide si reintentar tras un error y cuánto esperar.
+
+        Actualiza los contadores y el límite adaptativo de concurrencia.
+
+        Args:
+            attempt: Número de reintento (0 para el primer fallo).
+            error: Excepción recibida.
+
+        Returns:
+            Segundos a esperar antes de reintentar, o None si no debe reintentarse.
+        """
+        retryable, throttled = classify_error(error)
+        with self._lock:
+            if throttled:
+                self._stats.throttled += 1
+            if not retryable:
+                self._stats.permanent_errors += 1
+                return None
+            if attempt >= self.max_retries:
+                self._stats.exhausted += 1
+                return None
+            self._stats.retries += 1
+        if throttled:
+            self.concurrency.on_throttle()
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        hint = retry_hint(error)
+        if hint is not None:
+            delay = min(self.max_delay, max(delay, hint))
+        return delay
+
+    def _add_wait(self, seconds: float) -> None:
+        with self._lock:
+            self._stats.wait_seconds += seconds
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0) -> Any:
+        """
+        Ejecuta una llamada a la API respetando límites y reintentando errores transitorios.
+
+        Args:
+            fn: Función sin argumentos que realiza la llamada.
+            estimated_tokens: Tokens estimados de la petición.
+
+        Returns:
+            El valor devuelto por fn.
+
+        Raises:
+            La última excepción si el error es permanente o se agotan los reintentos.
+        """
+        with self._lock:
+            self._stats.calls += 1
+        attempt = 0
+        while True:
+            wait = self.reserve(estimated_tokens)
+            if wait:
+                self._add_wait(wait)
+                time.sleep(wait)
+
+            self.concurrency.acquire()
+            try:
+                result = fn()
+            except Exception as e:
+                error = e
+            else:
+                self.concurrency.on_success()
+                return result
+            finally:
+                self.concurrency.release()
+
+            delay = self.backoff(attempt, error)
+            if delay is None:
+                raise error
+            self._add_wait(delay)
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        estimated_tokens: int = 0
+    ) -> Any:
+        """
+        Equivalente asíncrono de call(): espera a las cubetas y al límite de
+        concurrencia sin bloquear el bucle de eventos.
+
+        Args:
+            fn: Función sin argumentos que devuelve la corrutina de la llamada.
+            estimated_tokens: Tokens estimados de la petición.
+
+        Returns:
+            El valor devuelto por la corrutina.
+
+        Raises:
+            La última excepción si el error es permanente o se agotan los reintentos.
+        """
+        with self._lock:
+            self._stats.calls += 1
+        attempt = 0
+        while True:
+            wait = self.reserve(estimated_tokens)
+            if wait:
+                self._add_wait(wait)
+                await asyncio.sleep(wait)
+
+            # El límite usa un Condition de hilos: se sondea para no bloquear el bucle.
+            while not self.concurrency.try_acquire():
+                await asyncio.sleep(ASYNC_SLOT_POLL_SECONDS)
+            try:
+                result = await fn()
+            except Exception as e:
+                error = e
+            else:
+                self.concurrency.on_success()
+                return result
+            finally:
+                self.concurrency.release()
+
+            delay = self.backoff(attempt, error)
+            if delay is None:
+                raise error
+            self._add_wait(delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> dict:
+        """
+        Devuelve los contadores y los límites actuales.
+
+        Returns:
+            Diccionario con contadores, límite de concurrencia y tokens disponibles.
+        """
+        with self._lock:
+            data = asdict(self._stats)
+        data['concurrency_limit'] = round(self.concurrency.limit, 2)
+        data['in_flight'] = self.concurrency.in_flight
+        data['requests_per_minute'] = self.requests.rate_per_minute if self.requests else None
+        data['tokens_per_minute'] = self.tokens.rate_per_minute if self.tokens else None
+        data['requests_available'] = round(self.requests.available, 2) if self.requests else None
+        data['tokens_available'] = round(self.tokens.available) if self.tokens else None
+        return data
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+def get_rate_limiter(key: str = 'default') -> RateLimiter:
+    """
+    Devuelve el limitador compartido para una cuota (por ejemplo, una clave API).
+
+    Los límites se leen de GEMINI_RPM y GEMINI_TPM la primera vez.
+
+    Args:
+        key: Identificador de la cuota (p. ej. el hash de la clave API).
+
+    Returns:
+        Instancia de RateLimiter compartida por el proceso.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(
+                requests_per_minute=_env_float('GEMINI_RPM'),
+                tokens_per_minute=_env_float('GEMINI_TPM'),
+                max_retries=int(os.getenv('GEMINI_MAX_RETRIES', '4'))
+            )
+            _limiters[key] = limiter
+        return limiter
@@ -0,0 +1,304 @@
+"""
+Módulo de enrutamiento de modelos y peticiones cubiertas (hedging).
+
+El enrutamiento elige el modelo de cada llamada según la operación y el
+tamaño del texto (por ejemplo, un modelo ligero para correcciones cortas).
+El hedging lanza una segunda petición a un modelo alternativo si la primera
+no ha respondido tras un percentil de la latencia reciente, y se queda con la
+respuesta que llegue antes. Las estadísticas por modelo muestran cuántas
+peticiones se duplican y qué modelo gana, es decir, cuánta cuota cuesta.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+
+@dataclass
+class RoutingPolicy:
+    """
+    Política de elección de modelo por operación y tamaño de entrada.
+
+    Attributes:
+        light_model: Modelo para entradas cortas (None para no enrutar).
+        light_max_chars: Tamaño máximo de entrada que se envía al modelo ligero.
+        light_operations: Operaciones que pueden usar el modelo ligero.
+    """
+    light_model: Optional[str] = None
+    light_max_chars: int = 600
+    light_operations: tuple[str, ...] = ('fix_grammar',)
+
+    def choose(self, operation: str, text: str, default_model: str) -> str:
+        """
+        Elige el modelo de una llamada.
+
+        Args:
+            operation: Operación del asistente.
+            text: Texto de entrada del usuario.
+            default_model: Modelo configurado en el asistente.
+
+        Returns:
+            Nombre del modelo a usar.
+        """
+        if (self.light_model and operation in self.light_operations
+                and len(text) <= self.light_max_chars):
+            return self.light_model
+        return default_model
+
+
+@dataclass
+class HedgePolicy:
+    """
+    Parámetros del hedging.
+
+    Attributes:
+        alternate_model: Modelo de la segunda petición. Si es None se usa el
+            modelo por defecto del asistente (o el ligero si el primario ya
+            es el modelo por defecto).
+        percentile: Percentil de la latencia reciente del modelo primario
+            tras el que se lanza la segunda petición.
+        initial_delay: Espera antes de cubrir mientras no hay muestras suficientes.
+        min_delay: Espera mínima antes de cubrir.
+        min_samples: Muestras necesarias para usar el percentil.
+        window: Número de latencias recientes conservadas por modelo.
+        max_workers: Hilos compartidos para las peticiones cubiertas.
+    """
+    alternate_model: Optional[str] = None
+    percentile: float = 95.0
+    initial_delay: float = 2.0
+    min_delay: float = 0.25
+    min_samples: int = 20
+    window: int = 200
+    max_workers: int = 16
+
+
+@dataclass
+class _ModelStats:
+    requests: int = 0
+    hedges: int = 0
+    skipped: int = 0
+    races: int = 0
+    wins: int = 0
+
+
+class HedgeStats:
+    """
+    Latencias recientes y contadores de hedging por modelo, seguros entre hilos.
+    """
+
+    def __init__(self, window: int = 200) -> None:
+        self.window = window
+        self._latencies: dict[str, deque] = {}
+        self._models: dict[str, _ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model: str) -> _ModelStats:
+        stats = self._models.get(model)
+        if stats is None:
+            stats = self._models[model] = _ModelStats()
+        return stats
+
+    def observe(self, model: str, seconds: float) -> None:
+        """Añade la latencia de una llamada completada."""
+        with self._lock:
+            latencies = self._latencies.get(model)
+            if latencies is None:
+                latencies = self._latencies[model] = deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def delay(self, model: str, policy: HedgePolicy) -> float:
+        """
+        Calcula la espera antes de cubrir una petición al modelo.
+
+        Args:
+            model: Modelo primario.
+            policy: Parámetros del hedging.
+
+        Returns:
+            Segundos de espera.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(model, ()))
+        if len(latencies) < policy.min_samples:
+            return policy.initial_delay
+        index = min(len(latencies) - 1, int(len(latencies) * policy.percentile / 100))
+        return max(policy.min_delay, latencies[index])
+
+    def record_request(self, model: str) -> None:
+        with self._lock:
+            self._model(model).requests += 1
+
+    def record_skip(self, model: str) -> None:
+        """Registra una petición que no se cubrió por falta de cuota."""
+        with self._lock:
+            self._model(model).skipped += 1
+
+    def record_race(self, primary: str, alternate: str, winner: Optional[str]) -> None:
+        """
+        Registra una petición cubierta.
+
+        Args:
+            primary: Modelo primario (el que se cubrió).
+            alternate: Modelo de la segunda petición.
+            winner: Modelo cuya respuesta se usó (None si ambos fallaron).
+        """
+        with self._lock:
+            self._model(primary).hedges += 1
+            self._model(primary).races += 1
+            self._model(alternate).races += 1
+            if winner is not None:
+                self._model(winner).wins += 1
+
+    def stats(self) -> dict:
+        """
+        Devuelve las estadísticas por modelo.
+
+        Returns:
+            Diccionario {modelo: {'requests', 'hedges', 'hedge_rate',
+            'skipped', 'races', 'wins', 'win_rate'}}. hedge_rate es la
+            fracción de peticiones primarias que se cubrieron (coste extra de
+            cuota), skipped las que no se cubrieron por falta de cuota y
+            win_rate la fracción de carreras en las que el modelo respondió antes.
+        """
+        with self._lock:
+            return {
+                model: {
+                    'requests': stats.requests,
+                    'hedges': stats.hedges,
+                    'hedge_rate': stats.hedges / stats.requests if stats.requests else 0.0,
+                    'skipped': stats.skipped,
+                    'races': stats.races,
+                    'wins': stats.wins,
+                    'win_rate': stats.wins / stats.races if stats.races else 0.0
+                }
+                for model, stats in self._models.items()
+            }
+
+
+class Hedger:
+    """
+    Ejecuta llamadas con una segunda petición de respaldo a otro modelo.
+
+    La petición perdedora se cancela si aún no ha empezado; si ya está en
+    curso, su resultado se descarta (el SDK síncrono no permite abortarla).
+    """
+
+    def __init__(self, policy: HedgePolicy, stats: Optional[HedgeStats] = None) -> None:
+        self.policy = policy
+        self.stats = stats if stats is not None else HedgeStats(policy.window)
+        self._executor = ThreadPoolExecutor(max_workers=policy.max_workers,
+                                            thread_name_prefix='hedge')
+
+    def call(
+        self,
+        primary: str,
+        alternate: Optional[str],
+        fn: Callable[[str], Any],
+        on_race: Optional[Callable[[str, Optional[str]], None]] = None,
+        on_hedge: Optional[Callable[[str], bool]] = None,
+        on_cancel: Optional[Callable[[str], None]] = None
+    ) -> Any:
+        """
+        Llama a fn(primary) y, si tarda más de lo previsto, también a fn(alternate).
+
+        Args:
+            primary: Modelo primario.
+            alternate: Modelo alternativo (None o igual al primario: sin hedging).
+            fn: Función que realiza la llamada con el modelo indicado.
+            on_race: Función a invocar con (modelo cubierto, ganador) tras una carrera.
+            on_hedge: Función a invocar con el modelo alternativo antes de lanzar
+                la segunda petición, para cargar su consumo. Si devuelve False
+                (o lanza una excepción) no se cubre y se espera al primario.
+            on_cancel: Función a invocar con el modelo de una petición
+                cancelada antes de empezar, para devolver lo cargado.
+
+        Returns:
+            El primer resultado correcto.
+
+        Raises:
+            Exception: El error del primario si ambas peticiones fallan.
+        """
+        self.stats.record_request(primary)
+        primary_future = self._submit(primary, fn)
+        if alternate is None or alternate == primary:
+            return primary_future.result()
+
+        done, _ = wait([primary_future], timeout=self.stats.delay(primary, self.policy))
+        if done:
+            return primary_future.result()
+        if on_hedge is not None:
+            try:
+                hedge = on_hedge(alternate)
+            except Exception:
+                # La contabilidad del respaldo nunca debe hacer fallar la petición.
+                hedge = False
+            if not hedge:
+                self.stats.record_skip(primary)
+                return primary_future.result()
+
+        alternate_future = self._submit(alternate, fn)
+        futures = {primary_future: primary, alternate_future: alternate}
+        pending = set(futures)
+        winner = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None and winner is None:
+                        winner = future
+                if winner is not None:
+                    for future in pending:
+                        if future.cancel() and on_cancel is not None:
+                            on_cancel(futures[future])
+                    return winner.result()
+            return primary_future.result()
+        finally:
+            winner_model = futures[winner] if winner is not None else None
+            self.stats.record_race(primary, alternate, winner_model)
+            if on_race is not None:
+                on_race(primary, winner_model)
+
+    def _submit(self, model: str, fn: Callable[[str], Any]) -> Future:
+        def timed() -> Any:
+            start = time.perf_counter()
+            result = fn(model)
+            self.stats.observe(model, time.perf_counter() - start)
+            return result
+        return self._executor.submit(timed)
+
+
+def get_routing_policy() -> Optional[RoutingPolicy]:
+    """
+    Devuelve la política de enrutamiento configurada en el entorno.
+
+    Se activa con GEMINI_LIGHT_MODEL (modelo para correcciones cortas) y
+    GEMINI_LIGHT_MAX_CHARS.
+
+    Returns:
+        RoutingPolicy, o None si no hay modelo ligero configurado.
+    """
+    light_model = os.getenv('GEMINI_LIGHT_MODEL')
+    if not light_model:
+        return None
+    return RoutingPolicy(light_model=light_model,
+                         light_max_chars=int(os.getenv('GEMINI_LIGHT_MAX_CHARS', '600')))
+
+
+def get_hedge_policy() -> Optional[HedgePolicy]:
+    """
+    Devuelve la política de hedging configurada en el entorno.
+
+    Se activa con GEMINI_HEDGE=1; GEMINI_HEDGE_MODEL y GEMINI_HEDGE_PERCENTILE
+    ajustan el modelo alternativo y el percentil de espera.
+
+    Returns:
+        HedgePolicy, o None si el hedging está desactivado.
+    """
+    if os.getenv('GEMINI_HEDGE', '0') != '1':
+        return None
+    return HedgePolicy(alternate_model=os.getenv('GEMINI_HEDGE_MODEL') or None,
+                       percentile=float(os.getenv('GEMINI_HEDGE_PERCENTILE', '95')))
@@ -0,0 +1,504 @@
+"""
+Servidor HTTP asíncrono del Asistente de Escritura.
+
+Expone fix_grammar, improve_style y generate_content como endpoints JSON sobre
+un WritingAssistant compartido, sin dependencias adicionales (asyncio y la
+biblioteca estándar). Las peticiones esperan en una cola acotada que atiende
+un grupo fijo de hilos; cuando la cola está llena se responde 429 con
+Retry-After, y si la espera prevista ya supera el plazo de la petición (o el
+servidor se está deteniendo) se responde 503. Cada petición tiene un plazo:
+si vence en la cola no llega a enviarse al modelo y se responde 504.
+
+Endpoints:
+    POST /v1/fix_grammar       {"text": "..."}
+    POST /v1/improve_style     {"text": "...", "tone": "Formal"}
+    POST /v1/generate_content  {"topic": "..."}
+    GET  /health               estado, profundidad de la cola y espera prevista
+    GET  /metrics              métricas del servidor y del asistente (Prometheus)
+
+Los POST admiten además "bypass_cache" y "deadline_ms" (o la cabecera
+X-Deadline-Ms).
+
+Uso:
+    python -m services.server --port 8080 --workers 16 --queue-size 64
+    python -m services.server --fake --fake-latency-ms 300
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+
+from services.ai_service import RESULT_KEYS, TONE_INSTRUCTIONS, WritingAssistant
+from services.metrics import LATENCY_BUCKETS, Counter, Histogram
+
+
+# Campo de entrada de cada operación.
+INPUT_FIELDS = {
+    'fix_grammar': 'text',
+    'improve_style': 'text',
+    'generate_content': 'topic'
+}
+
+REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 429: 'Too Many Requests', 500: 'Internal Server Error',
+    502: 'Bad Gateway', 503: 'Service Unavailable', 504: 'Gateway Timeout'
+}
+
+
+@dataclass
+class ServerConfig:
+    """
+    Parámetros del servidor.
+
+    Attributes:
+        host: Dirección de escucha.
+        port: Puerto de escucha.
+        workers: Llamadas al asistente ejecutadas a la vez.
+        queue_size: Peticiones admitidas en espera además de las que están en curso.
+        default_deadline: Plazo por defecto de cada petición en segundos.
+        max_deadline: Plazo máximo que puede pedir un cliente.
+        max_body_bytes: Tamaño máximo del cuerpo de una petición.
+        idle_timeout: Segundos que se mantiene abierta una conexión inactiva.
+        drain_timeout: Segundos que se espera a las peticiones en curso al detenerse.
+    """
+    host: str = '127.0.0.1'
+    port: int = 8080
+    workers: int = 16
+    queue_size: int = 64
+    default_deadline: float = 30.0
+    max_deadline: float = 120.0
+    max_body_bytes: int = 1_048_576
+    idle_timeout: float = 15.0
+    drain_timeout: float = 30.0
+
+
+@dataclass
+class _Job:
+    operation: str
+    text: str
+    tone: Optional[str]
+    bypass_cache: bool
+    deadline: float
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+class _HttpError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[dict] = None) -> None:
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class WritingServer:
+    """
+    Servidor HTTP con cola acotada y control de admisión.
+
+    Attributes:
+        assistant (WritingAssistant): Asistente compartido por todos los hilos.
+        config (ServerConfig): Parámetros del servidor.
+    """
+
+    def __init__(self, assistant: WritingAssistant, config: Optional[ServerConfig] = None) -> None:
+        """
+        Crea el servidor sin empezar a escuchar.
+
+        Args:
+            assistant: Asistente que atiende las peticiones. Es seguro entre
+                hilos y comparte caché, limitador y clientes.
+            config: Parámetros del servidor (por defecto, ServerConfig()).
+        """
+        self.assistant = assistant
+        self.config = config if config is not None else ServerConfig()
+        self.in_flight = 0
+        self.closing = False
+        # Duración media móvil de las llamadas (para estimar la espera en cola).
+        self._service_seconds: Optional[float] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._executor = ThreadPoolExecutor(max_workers=self.config.workers,
+                                            thread_name_prefix='server')
+        self.requests = Counter('writing_http_requests_total',
+                                'Peticiones HTTP por ruta y código de estado.', ('path', 'status'))
+        self.rejected = Counter('writing_http_rejected_total',
+                                'Peticiones rechazadas por control de admisión, por motivo.',
+                                ('reason',))
+        self.queue_wait = Histogram('writing_http_queue_wait_seconds',
+                                    'Tiempo en cola antes de empezar a procesarse.',
+                                    ('operation',), LATENCY_BUCKETS)
+        self.duration = Histogram('writing_http_request_duration_seconds',
+                                  'Duración total de las peticiones admitidas.',
+                                  ('operation',), LATENCY_BUCKETS)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def expected_wait(self) -> float:
+        """
+        Estima la espera en cola de una petición nueva.
+
+        Returns:
+            Segundos previstos hasta que un hilo quede libre para ella.
+        """
+        if self._service_seconds is None:
+            return 0.0
+        ahead = self.queue_depth + self.in_flight - self.config.workers + 1
+        if ahead <= 0:
+            return 0.0
+        return math.ceil(ahead / self.config.workers) * self._service_seconds
+
+    async def start(self) -> None:
+        """Empieza a escuchar y arranca los hilos de trabajo."""
+        self._queue = asyncio.Queue(maxsize=self.config.queue_size)
+        self._workers = [asyncio.create_task(self._worker())
+                         for _ in range(self.config.workers)]
+        self._server = await asyncio.start_server(self._handle, self.config.host,
+                                                  self.config.port)
+
+    @property
+    def port(self) -> int:
+        """Puerto real de escucha (útil con port=0)."""
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        """
+        Deja de aceptar peticiones y espera a las admitidas.
+
+        Las peticiones que no terminan en drain_timeout segundos se responden
+        con 503.
+        """
+        self.closing = True
+        if self._server is not None:
+            self._server.close()
+        if self._queue is not None:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._queue.join(), self.config.drain_timeout)
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            job = self._queue.get_nowait()
+            if not job.future.done():
+                job.future.set_exception(_HttpError(503, 'el servidor se está deteniendo'))
+        if self._server is not None:
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=False)
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                # El plazo venció en la cola (o el cliente ya recibió 504):
+                # no se llama al modelo.
+                if job.future.done() or time.monotonic() >= job.deadline:
+                    if not job.future.done():
+                        job.future.set_exception(_HttpError(504, 'plazo agotado en cola'))
+                    self.rejected.inc(('expired',))
+                    continue
+                self.queue_wait.observe((job.operation,), time.monotonic() - job.enqueued)
+                self.in_flight += 1
+                start = time.monotonic()
+                try:
+                    result = await loop.run_in_executor(self._executor, self._call, job)
+                except asyncio.CancelledError:
+                    if not job.future.done():
+                        job.future.set_exception(
+                            _HttpError(503, 'el servidor se está deteniendo'))
+                    raise
+                except Exception as e:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                else:
+                    if not job.future.done():
+                        job.future.set_result(result)
+                finally:
+                    self.in_flight -= 1
+                    elapsed = time.monotonic() - start
+                    previous = self._service_seconds
+                    self._service_seconds = (elapsed if previous is None
+                                             else previous + 0.2 * (elapsed - previous))
+            finally:
+                self._queue.task_done()
+
+    def _call(self, job: _Job) -> dict:
+        if job.operation == 'fix_grammar':
+            return self.assistant.fix_grammar(job.text, bypass_cache=job.bypass_cache)
+        if job.operation == 'improve_style':
+            return self.assistant.improve_style(job.text, job.tone,
+                                                bypass_cache=job.bypass_cache)
+        return self.assistant.generate_content(job.text, bypass_cache=job.bypass_cache)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(),
+                                                          self.config.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._send(writer, 400, {'error': 'Petición HTTP no válida'}, False)
+                    break
+                headers = await self._read_headers(reader)
+                path = target.split('?', 1)[0]
+                keep_alive = (version == 'HTTP/1.1'
+                              and headers.get('connection', '').lower() != 'close')
+
+                length = int(headers.get('content-length') or 0)
+                if length > self.config.max_body_bytes:
+                    self.requests.inc((path, '413'))
+                    await self._send(writer, 413, {'error': 'Cuerpo demasiado grande'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload, extra = await self._dispatch(method, path, headers, body)
+                self.requests.inc((path, str(status)))
+                await self._send(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    @staticmethod
+    async def _read_headers(reader: asyncio.StreamReader) -> dict:
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    async def _send(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        payload: Any,
+        keep_alive: bool,
+        headers: Optional[dict] = None
+    ) -> None:
+        if isinstance(payload, str):
+            body = payload.encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        lines = [f'HTTP/1.1 {status} {REASONS.get(status, "")}',
+                 f'Content-Type: {content_type}',
+                 f'Content-Length: {len(body)}',
+                 f'Connection: {"keep-alive" if keep_alive else "close"}']
+        lines.extend(f'{name}: {value}' for name, value in (headers or {}).items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def _dispatch(
+        self,
+        method: str,
+        path: str,
+        headers: dict,
+        body: bytes
+    ) -> tuple[int, Any, dict]:
+        if path == '/health':
+            health = self.health()
+            return (503 if self.closing else 200), health, {}
+        if path == '/metrics':
+            return 200, self.render_prometheus(), {}
+        operation = path[len('/v1/'):] if path.startswith('/v1/') else None
+        if operation not in RESULT_KEYS:
+            return 404, {'error': 'Ruta no encontrada'}, {}
+        if method != 'POST':
+            return 405, {'error': 'Usa POST'}, {'Allow': 'POST'}
+        try:
+            job = self._parse_job(operation, headers, body)
+            return 200, await self._submit(job), {}
+        except _HttpError as e:
+            return e.status, {'success': False, RESULT_KEYS[operation]: None,
+                              'error': f'Error: {e}'}, e.headers
+
+    def _parse_job(self, operation: str, headers: dict, body: bytes) -> _Job:
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            raise _HttpError(400, 'el cuerpo no es JSON válido')
+        if not isinstance(data, dict):
+            raise _HttpError(400, 'el cuerpo debe ser un objeto JSON')
+        field_name = INPUT_FIELDS[operation]
+        text = data.get(field_name)
+        if not isinstance(text, str) or not text.strip():
+            raise _HttpError(400, f'falta el campo "{field_name}"')
+        tone = data.get('tone', 'Formal') if operation == 'improve_style' else None
+        if tone is not None and tone not in TONE_INSTRUCTIONS:
+            raise _HttpError(400, f'tono no válido: {tone}')
+
+        deadline_ms = data.get('deadline_ms', headers.get('x-deadline-ms'))
+        try:
+            seconds = (float(deadline_ms) / 1000 if deadline_ms is not None
+                       else self.config.default_deadline)
+        except (TypeError, ValueError):
+            raise _HttpError(400, 'deadline_ms no es un número')
+        seconds = min(max(seconds, 0.001), self.config.max_deadline)
+
+        loop = asyncio.get_running_loop()
+        return _Job(operation, text, tone, bool(data.get('bypass_cache', False)),
+                    time.monotonic() + seconds, loop.create_future())
+
+    async def _submit(self, job: _Job) -> dict:
+        """Admite una petición en la cola y espera su resultado dentro del plazo."""
+        if self.closing:
+            self.rejected.inc(('closing',))
+            raise _HttpError(503, 'el servidor se está deteniendo')
+        wait = self.expected_wait()
+        retry_after = {'Retry-After': str(max(1, math.ceil(wait)))}
+        if time.monotonic() + wait > job.deadline:
+            self.rejected.inc(('deadline',))
+            raise _HttpError(503, f'espera prevista de {wait:.1f} s, mayor que el plazo',
+                             retry_after)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected.inc(('queue_full',))
+            raise _HttpError(429, 'demasiadas peticiones en cola', retry_after)
+
+        try:
+            result = await asyncio.wait_for(job.future, job.deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            self.rejected.inc(('timeout',))
+            raise _HttpError(504, 'plazo agotado')
+        except _HttpError:
+            raise
+        except Exception as e:
+            raise _HttpError(500, str(e))
+        self.duration.observe((job.operation,), time.monotonic() - job.enqueued)
+        if not result.get('success'):
+            raise _HttpError(502, (result.get('error') or 'error del modelo')
+                             .removeprefix('Error: '))
+        return result
+
+    def health(self) -> dict:
+        """
+        Devuelve el estado del servidor.
+
+        Returns:
+            Diccionario con 'status' ('ok' o 'draining'), profundidad y tamaño
+            de la cola, peticiones en curso, hilos y espera prevista.
+        """
+        return {
+            'status': 'draining' if self.closing else 'ok',
+            'queue_depth': self.queue_depth,
+            'queue_size': self.config.queue_size,
+            'in_flight': self.in_flight,
+            'workers': self.config.workers,
+            'expected_wait_seconds': round(self.expected_wait(), 3)
+        }
+
+    def render_prometheus(self) -> str:
+        """
+        Exporta las métricas del servidor y del asistente en formato Prometheus.
+
+        Returns:
+            Texto listo para servir en /metrics.
+        """
+        lines = ['# HELP writing_http_queue_depth Peticiones en espera.',
+                 '# TYPE writing_http_queue_depth gauge',
+                 f'writing_http_queue_depth {self.queue_depth}',
+                 '# HELP writing_http_in_flight Peticiones en curso.',
+                 '# TYPE writing_http_in_flight gauge',
+                 f'writing_http_in_flight {self.in_flight}']
+        for collector in (self.requests, self.rejected, self.queue_wait, self.duration):
+            lines.extend(collector.render())
+        return '\n'.join(lines) + '\n' + self.assistant.metrics.render_prometheus()
+
+
+async def serve(server: WritingServer) -> None:
+    """
+    Ejecuta el servidor hasta recibir SIGINT o SIGTERM y lo detiene ordenadamente.
+
+    Args:
+        server: Servidor a ejecutar.
+    """
+    await server.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+    print(f"✅ Escuchando en http://{server.config.host}:{server.port}", file=sys.stderr)
+    await stop.wait()
+    print("⏹️  Deteniendo: esperando a las peticiones admitidas...", file=sys.stderr)
+    await server.close()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Punto de entrada de la línea de comandos.
+    """
+    parser = argparse.ArgumentParser(description="Servidor HTTP del Asistente de Escritura.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--queue-size', type=int, default=64)
+    parser.add_argument('--deadline', type=float, default=30.0,
+                        help="Plazo por defecto de cada petición en segundos")
+    parser.add_argument('--model', default='gemini-2.5-flash')
+    parser.add_argument('--fake', action='store_true',
+                        help="Usa un modelo simulado local (para pruebas de carga sin red)")
+    parser.add_argument('--fake-latency-ms', type=float, default=300.0)
+    parser.add_argument('--fake-error-rate', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    if args.fake:
+        from benchmarks.fake_gemini import FakeModelConfig, fake_model_factory
+        from services.client_registry import ClientRegistry
+        from services.rate_limit import RateLimiter
+
+        config = FakeModelConfig(latency_ms=args.fake_latency_ms,
+                                 error_rate=args.fake_error_rate, seed=None)
+        assistant = WritingAssistant(
+            'fake', model_name=args.model,
+            registry=ClientRegistry(model_factory=fake_model_factory(config)),
+            rate_limiter=RateLimiter(max_retries=3, base_delay=0.01, max_delay=0.1)
+        )
+    else:
+        load_dotenv()
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            print("❌ Error: GOOGLE_API_KEY no está configurada en .env", file=sys.stderr)
+            return 1
+        assistant = WritingAssistant(api_key, model_name=args.model)
+
+    server = WritingServer(assistant, ServerConfig(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        default_deadline=args.deadline
+    ))
+    asyncio.run(serve(server))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
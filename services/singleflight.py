@@ -0,0 +1,111 @@
+"""
+Módulo de agrupación de peticiones idénticas simultáneas (single-flight).
+
+Cuando varios hilos piden a la vez el mismo resultado, solo el primero llama
+al modelo; el resto espera y recibe el mismo diccionario de resultado,
+incluidos los errores.
+"""
+
+import threading
+from typing import Any, Callable, Optional
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Grupo de llamadas en curso indexadas por clave.
+
+    Attributes:
+        executed (int): Llamadas realmente ejecutadas.
+        deduplicated (int): Llamadas que reutilizaron una ejecución en curso.
+    """
+
+    def __init__(self) -> None:
+        """Crea un grupo vacío."""
+        self.executed = 0
+        self.deduplicated = 0
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        """
+        Ejecuta fn una sola vez para todas las llamadas simultáneas con la misma clave.
+
+        Args:
+            key: Clave que identifica la petición.
+            fn: Función sin argumentos que produce el resultado.
+
+        Returns:
+            Tupla (resultado, compartido). compartido es True si el resultado
+            procede de la ejecución iniciada por otro hilo.
+
+        Raises:
+            La excepción lanzada por fn, en todos los hilos que esperaban.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.deduplicated += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> dict:
+        """
+        Devuelve los contadores del grupo.
+
+        Returns:
+            Diccionario con llamadas ejecutadas, deduplicadas y en curso.
+        """
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'deduplicated': self.deduplicated,
+                'in_flight': len(self._calls)
+            }
+
+
+_default_group: Optional[SingleFlight] = None
+_default_group_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """
+    Devuelve el grupo single-flight compartido por el proceso.
+
+    Returns:
+        Instancia única de SingleFlight.
+    """
+    global _default_group
+    with _default_group_lock:
+        if _default_group is None:
+            _default_group = SingleFlight()
+        return _default_group
@@ -0,0 +1,481 @@
+"""
+Estimación local de tokens y planificación del presupuesto de cada llamada.
+
+TokenEstimator calcula los tokens de un texto sin llamar a la API, como una
+combinación lineal de rasgos baratos de obtener (palabras, letras de más en
+palabras largas, signos, dígitos y saltos de línea). Los coeficientes por
+defecto son una aproximación inicial; se ajustan por mínimos cuadrados con
+muestras reales (texto, usage_metadata.prompt_token_count) registradas con
+WRITING_TOKEN_LOG y se cargan desde WRITING_TOKEN_CALIBRATION.
+
+TokenBudget usa la estimación para validar cada prompt contra los límites de
+entrada del modelo, elegir max_output_tokens y decidir cuándo hay que dividir
+una entrada antes de hacer ninguna llamada de red. PromptSavings acumula los
+tokens de entrada servidos desde caché frente a los prompts en línea.
+"""
+
+import json
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Iterable, Optional
+
+
+WORD_RE = re.compile(r'[^\W\d_]+')
+DIGIT_RE = re.compile(r'\d')
+SYMBOL_RE = re.compile(r'[^\w\s]')
+
+# Límites (entrada, salida) de tokens por modelo.
+MODEL_TOKEN_LIMITS = {
+    'gemini-2.5-pro': (1_048_576, 65_536),
+    'gemini-2.5-flash': (1_048_576, 65_536),
+    'gemini-2.5-flash-lite': (1_048_576, 65_536),
+    'gemini-2.0-flash': (1_048_576, 8_192),
+    'gemini-2.0-flash-lite': (1_048_576, 8_192),
+}
+DEFAULT_TOKEN_LIMITS = (1_048_576, 8_192)
+
+FEATURES = ('intercept', 'words', 'long_word_chars', 'symbols', 'digits', 'newlines')
+
+
+class PromptTooLargeError(ValueError):
+    """El prompt supera el límite de tokens de entrada."""
+
+
+class OutputTruncatedError(RuntimeError):
+    """La respuesta se cortó al alcanzar max_output_tokens."""
+
+
+def text_features(text: str) -> tuple[float, ...]:
+    """
+    Extrae los rasgos del estimador.
+
+    Args:
+        text: Texto a medir.
+
+    Returns:
+        Valores en el orden de FEATURES.
+    """
+    words = WORD_RE.findall(text)
+    return (
+        1.0,
+        float(len(words)),
+        float(sum(len(word) - 6 for word in words if len(word) > 6)),
+        float(len(SYMBOL_RE.findall(text))),
+        float(len(DIGIT_RE.findall(text))),
+        float(text.count('\n'))
+    )
+
+
+def _solve(matrix: list[list[float]], vector: list[float]) -> list[float]:
+    """Resuelve un sistema lineal pequeño por eliminación gaussiana con pivoteo."""
+    size = len(vector)
+    rows = [row[:] + [value] for row, value in zip(matrix, vector)]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda r: abs(rows[r][col]))
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        if abs(rows[col][col]) < 1e-12:
+            continue
+        for r in range(size):
+            if r != col:
+                factor = rows[r][col] / rows[col][col]
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[col])]
+    return [rows[i][size] / rows[i][i] if abs(rows[i][i]) > 1e-12 else 0.0
+            for i in range(size)]
+
+
+@dataclass
+class TokenEstimator:
+    """
+    Estimador lineal de tokens.
+
+    Los valores por defecto son una aproximación inicial (cada palabra, signo,
+    dígito y salto de línea cuenta como un token, y las palabras largas se
+    dividen en piezas de unas 4 letras), no el resultado de una calibración.
+
+    Attributes:
+        intercept: Tokens fijos por texto.
+        words: Tokens por palabra.
+        long_word_chars: Tokens por cada letra más allá de la sexta de una palabra.
+        symbols: Tokens por signo de puntuación o símbolo.
+        digits: Tokens por dígito.
+        newlines: Tokens por salto de línea.
+        samples: Muestras usadas en la calibración (0 si no está calibrado).
+    """
+    intercept: float = 0.0
+    words: float = 1.0
+    long_word_chars: float = 0.25
+    symbols: float = 1.0
+    digits: float = 1.0
+    newlines: float = 1.0
+    samples: int = 0
+
+    @property
+    def coefficients(self) -> tuple[float, ...]:
+        return tuple(getattr(self, name) for name in FEATURES)
+
+    def estimate(self, text: str) -> int:
+        """
+        Estima los tokens de un texto.
+
+        Args:
+            text: Texto a medir.
+
+        Returns:
+            Número estimado de tokens (al menos 1).
+        """
+        value = sum(c * f for c, f in zip(self.coefficients, text_features(text)))
+        return max(1, int(round(value)))
+
+    @classmethod
+    def fit(cls, samples: Iterable[tuple[str, int]], ridge: float = 1.0) -> 'TokenEstimator':
+        """
+        Ajusta los coeficientes por mínimos cuadrados a recuentos reales.
+
+        Se regulariza hacia los coeficientes por defecto, de modo que con
+        pocas muestras el resultado no se aleja de ellos.
+
+        Args:
+            samples: Pares (texto, tokens reales según usage_metadata o count_tokens).
+            ridge: Peso de la regularización.
+
+        Returns:
+            Estimador calibrado.
+        """
+        prior = cls().coefficients
+        size = len(FEATURES)
+        matrix = [[ridge if i == j else 0.0 for j in range(size)] for i in range(size)]
+        vector = [ridge * p for p in prior]
+        count = 0
+        for text, tokens in samples:
+            features = text_features(text)
+            for i in range(size):
+                vector[i] += features[i] * tokens
+                for j in range(size):
+                    matrix[i][j] += features[i] * features[j]
+            count += 1
+        return cls(**dict(zip(FEATURES, _solve(matrix, vector))), samples=count)
+
+    def error_report(self, samples: list[tuple[str, int]]) -> dict:
+        """
+        Mide el error del estimador frente a recuentos reales.
+
+        Args:
+            samples: Pares (texto, tokens reales).
+
+        Returns:
+            Diccionario con el número de muestras, el error absoluto medio, el
+            error porcentual medio y su p95, y el sesgo (positivo si sobreestima).
+        """
+        if not samples:
+            return {'samples': 0}
+        errors = [(self.estimate(text) - tokens, tokens) for text, tokens in samples]
+        pct = sorted(abs(error) / max(tokens, 1) * 100 for error, tokens in errors)
+        return {
+            'samples': len(errors),
+            'mae_tokens': round(sum(abs(error) for error, _ in errors) / len(errors), 2),
+            'mape_pct': round(sum(pct) / len(pct), 2),
+            'p95_ape_pct': round(pct[min(len(pct) - 1, int(len(pct) * 0.95))], 2),
+            'bias_pct': round(sum(error for error, _ in errors)
+                              / max(sum(tokens for _, tokens in errors), 1) * 100, 2)
+        }
+
+    def save(self, path: str) -> None:
+        """Guarda los coeficientes en JSON."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> 'TokenEstimator':
+        """Carga coeficientes guardados con save()."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(**json.load(f))
+
+
+class TokenBudget:
+    """
+    Límites de tokens de un modelo y reglas para planificar cada llamada.
+
+    Attributes:
+        estimator (TokenEstimator): Estimador local.
+        max_input_tokens (int): Máximo de tokens de entrada admitidos.
+        max_output_tokens (int): Máximo de tokens de salida del modelo.
+    """
+
+    # Salida esperada respecto a la entrada en las operaciones que reescriben.
+    OUTPUT_RATIO = 1.5
+    # Salida esperada de generate_content.
+    GENERATION_TOKENS = 2048
+    # Margen para los tokens de razonamiento, que los modelos 2.5 descuentan
+    # de max_output_tokens.
+    OVERHEAD_TOKENS = 1024
+
+    def __init__(
+        self,
+        model_name: str,
+        estimator: Optional[TokenEstimator] = None,
+        max_input_tokens: Optional[int] = None,
+        safety_margin: float = 0.1
+    ) -> None:
+        """
+        Crea el presupuesto de un modelo.
+
+        Args:
+            model_name: Nombre del modelo (define los límites por defecto).
+            estimator: Estimador a usar. Si es None se usa el del proceso.
+            max_input_tokens: Límite de entrada propio, menor que el del modelo
+                (por ejemplo, para acotar el coste de cada llamada).
+            safety_margin: Fracción del límite reservada al error de estimación.
+        """
+        model_input, model_output = MODEL_TOKEN_LIMITS.get(model_name, DEFAULT_TOKEN_LIMITS)
+        self.estimator = estimator if estimator is not None else get_token_estimator()
+        limit = min(max_input_tokens, model_input) if max_input_tokens else model_input
+        self.max_input_tokens = int(limit * (1 - safety_margin))
+        self.max_output_tokens = model_output
+
+    def check_input(self, prompt: str) -> int:
+        """
+        Valida el tamaño de un prompt.
+
+        Args:
+            prompt: Prompt completo.
+
+        Returns:
+            Tokens estimados del prompt.
+
+        Raises:
+            PromptTooLargeError: Si supera el límite de entrada.
+        """
+        tokens = self.estimator.estimate(prompt)
+        if tokens > self.max_input_tokens:
+            raise PromptTooLargeError(
+                f"El texto es demasiado largo: unos {tokens} tokens para un límite de "
+                f"{self.max_input_tokens}"
+            )
+        return tokens
+
+    def fits(self, prompt: str) -> bool:
+        """Indica si el prompt cabe en el límite de entrada."""
+        return self.estimator.estimate(prompt) <= self.max_input_tokens
+
+    def output_tokens(self, operation: str, text: str, items: int = 1) -> int:
+        """
+        Elige max_output_tokens para una llamada.
+
+        Args:
+            operation: Operación (generate_content usa una cantidad fija).
+            text: Texto de entrada del usuario.
+            items: Número de resultados que debe producir la respuesta (pasos
+                de una canalización); cada uno tiene el tamaño de la entrada.
+
+        Returns:
+            Tokens de salida a solicitar, sin superar el límite del modelo.
+        """
+        if operation == 'generate_content':
+            expected = self.GENERATION_TOKENS
+        else:
+            expected = int(self.estimator.estimate(text) * self.OUTPUT_RATIO * items)
+        return min(self.max_output_tokens, expected + self.OVERHEAD_TOKENS)
+
+    def max_chunk_chars(self, text: str, overhead_tokens: int = 0) -> int:
+        """
+        Calcula el tamaño de fragmento (en caracteres) que cabe en el límite.
+
+        Args:
+            text: Texto completo, usado para medir los caracteres por token.
+            overhead_tokens: Tokens del prompt que no son el fragmento
+                (instrucciones y contexto).
+
+        Returns:
+            Caracteres máximos por fragmento, con un 10 % de margen.
+        """
+        chars_per_token = len(text) / max(self.estimator.estimate(text), 1)
+        available = max(self.max_input_tokens - overhead_tokens, 1)
+        return max(100, int(available * chars_per_token * 0.9))
+
+
+def is_truncated(response: Any) -> bool:
+    """Indica si la respuesta se cortó por alcanzar max_output_tokens."""
+    candidates = getattr(response, 'candidates', None) or []
+    if not candidates:
+        return False
+    reason = getattr(candidates[0], 'finish_reason', None)
+    return (getattr(reason, 'name', None) or str(reason)) == 'MAX_TOKENS'
+
+
+class TokenLog:
+    """
+    Registro JSONL de recuentos reales para calibrar el estimador.
+
+    Cada línea contiene el prompt, los tokens de entrada de usage_metadata,
+    la respuesta y sus tokens de salida.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, prompt: str, response: Any) -> None:
+        """
+        Añade una muestra si la respuesta trae usage_metadata.
+
+        Args:
+            prompt: Prompt enviado.
+            response: Respuesta del SDK de Gemini.
+        """
+        usage = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(usage, 'prompt_token_count', None)
+        if not prompt_tokens:
+            return
+        try:
+            output = response.text
+        except ValueError:
+            output = ''
+        sample = {
+            'prompt': prompt,
+            'prompt_tokens': prompt_tokens,
+            'output': output,
+            'output_tokens': getattr(usage, 'candidates_token_count', None)
+        }
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(sample, ensure_ascii=False) + '\n')
+
+
+def load_samples(path: str) -> list[tuple[str, int]]:
+    """
+    Lee las muestras de un registro de tokens.
+
+    Args:
+        path: JSONL escrito por TokenLog (o con campos text/tokens).
+
+    Returns:
+        Pares (texto, tokens reales) de prompts y respuestas.
+    """
+    samples = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'text' in record:
+                samples.append((record['text'], record['tokens']))
+                continue
+            samples.append((record['prompt'], record['prompt_tokens']))
+            if record.get('output') and record.get('output_tokens'):
+                samples.append((record['output'], record['output_tokens']))
+    return samples
+
+
+class PromptSavings:
+    """
+    Tokens de entrada por operación frente a los prompts con instrucciones en línea.
+
+    El prompt en línea equivalente tiene los mismos tokens de entrada que la
+    llamada (la API cuenta la instrucción de sistema y el contenido en caché
+    en prompt_token_count), así que lo ahorrado son los tokens servidos desde
+    caché, que se facturan con descuento. instruction_tokens estima la parte
+    fija de cada prompt que podría servirse desde caché.
+    """
+
+    def __init__(self) -> None:
+        self._totals: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        operation: str,
+        instruction_tokens: int,
+        input_tokens: int,
+        cached_tokens: int = 0
+    ) -> dict:
+        """
+        Registra una llamada.
+
+        Args:
+            operation: Operación del asistente.
+            instruction_tokens: Tokens estimados de la instrucción fija.
+            input_tokens: Tokens de entrada de la llamada.
+            cached_tokens: Tokens de entrada servidos desde caché.
+
+        Returns:
+            Diccionario de la llamada con 'instruction_tokens', 'input_tokens',
+            'cached_tokens', 'billed_input_tokens' (sin descuento) y
+            'saved_tokens'.
+        """
+        call = {
+            'instruction_tokens': instruction_tokens,
+            'input_tokens': input_tokens,
+            'cached_tokens': cached_tokens,
+            'billed_input_tokens': input_tokens - cached_tokens,
+            'saved_tokens': cached_tokens
+        }
+        with self._lock:
+            totals = self._totals.setdefault(operation, {**dict.fromkeys(call, 0), 'calls': 0})
+            totals['calls'] += 1
+            for name, value in call.items():
+                totals[name] += value
+        return call
+
+    def report(self) -> dict:
+        """
+        Devuelve los totales por operación.
+
+        Returns:
+            Diccionario {operación: totales} con 'calls', las claves de
+            record(), 'saved_per_call' y 'saved_pct' (porcentaje de los tokens
+            de entrada servidos desde caché).
+        """
+        with self._lock:
+            return {
+                operation: dict(
+                    totals,
+                    saved_per_call=round(totals['saved_tokens'] / totals['calls'], 1),
+                    saved_pct=round(100 * totals['saved_tokens'] /
+                                    max(totals['input_tokens'], 1), 1)
+                )
+                for operation, totals in self._totals.items()
+            }
+
+
+_default_estimator: Optional[TokenEstimator] = None
+_default_log: Optional[TokenLog] = None
+_defaults_lock = threading.Lock()
+
+
+def get_token_estimator() -> TokenEstimator:
+    """
+    Devuelve el estimador del proceso.
+
+    Usa los coeficientes de WRITING_TOKEN_CALIBRATION (JSON guardado por
+    benchmarks.token_calibration) si existe; si no, los valores por defecto.
+
+    Returns:
+        Instancia única de TokenEstimator.
+    """
+    global _default_estimator
+    with _defaults_lock:
+        if _default_estimator is None:
+            path = os.getenv('WRITING_TOKEN_CALIBRATION')
+            _default_estimator = (TokenEstimator.load(path) if path and os.path.exists(path)
+                                  else TokenEstimator())
+        return _default_estimator
+
+
+def get_token_log() -> Optional[TokenLog]:
+    """
+    Devuelve el registro de tokens del proceso.
+
+    Se activa con WRITING_TOKEN_LOG=<ruta del JSONL>.
+
+    Returns:
+        Instancia única de TokenLog, o None si no está configurado.
+    """
+    global _default_log
+    path = os.getenv('WRITING_TOKEN_LOG')
+    if not path:
+        return None
+    with _defaults_lock:
+        if _default_log is None:
+            _default_log = TokenLog(path)
+        return _default_log
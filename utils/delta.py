@@ -0,0 +1,142 @@
+"""
+Diferencias compactas entre versiones de un texto.
+
+Una delta describe la versión nueva como una secuencia de operaciones sobre
+la anterior: [inicio, longitud] copia ese tramo de caracteres del texto
+anterior y una cadena se inserta tal cual. Las diferencias se calculan por
+palabras y espacios, de modo que el tamaño de la delta depende de lo editado
+y no del tamaño del documento.
+"""
+
+import difflib
+import json
+import re
+from typing import Union
+
+
+TOKEN_RE = re.compile(r'\s+|\S+')
+
+# Tokens máximos del tramo cambiado que se comparan con SequenceMatcher; por
+# encima (reescrituras casi completas) el tramo se guarda entero.
+MAX_DIFF_TOKENS = 50_000
+
+Delta = list[Union[list[int], str]]
+
+
+def _tokens(text: str) -> list[str]:
+    return TOKEN_RE.findall(text)
+
+
+def make_delta(old: str, new: str) -> Delta:
+    """
+    Calcula la delta que transforma un texto en otro.
+
+    Args:
+        old: Versión anterior.
+        new: Versión nueva.
+
+    Returns:
+        Lista de operaciones: [inicio, longitud] copia del texto anterior y
+        las cadenas se insertan.
+    """
+    a, b = _tokens(old), _tokens(new)
+    # Prefijo y sufijo comunes en tiempo lineal: la mayoría de los guardados
+    # cambian un único tramo del documento.
+    prefix = 0
+    while prefix < min(len(a), len(b)) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < min(len(a), len(b)) - prefix
+           and a[len(a) - 1 - suffix] == b[len(b) - 1 - suffix]):
+        suffix += 1
+
+    offsets = [0]
+    for token in a:
+        offsets.append(offsets[-1] + len(token))
+
+    delta: Delta = []
+
+    def copy(start: int, end: int) -> None:
+        if end <= start:
+            return
+        if delta and isinstance(delta[-1], list) and sum(delta[-1]) == offsets[start]:
+            delta[-1][1] += offsets[end] - offsets[start]
+        else:
+            delta.append([offsets[start], offsets[end] - offsets[start]])
+
+    def insert(tokens: list[str]) -> None:
+        if not tokens:
+            return
+        if delta and isinstance(delta[-1], str):
+            delta[-1] += ''.join(tokens)
+        else:
+            delta.append(''.join(tokens))
+
+    copy(0, prefix)
+    a_mid, b_mid = a[prefix:len(a) - suffix], b[prefix:len(b) - suffix]
+    if len(a_mid) + len(b_mid) > MAX_DIFF_TOKENS:
+        insert(b_mid)
+    else:
+        matcher = difflib.SequenceMatcher(None, a_mid, b_mid, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                copy(prefix + i1, prefix + i2)
+            else:
+                insert(b_mid[j1:j2])
+    copy(len(a) - suffix, len(a))
+    return delta
+
+
+def apply_delta(old: str, delta: Delta) -> str:
+    """
+    Reconstruye la versión nueva a partir de la anterior y su delta.
+
+    Args:
+        old: Versión anterior.
+        delta: Operaciones devueltas por make_delta.
+
+    Returns:
+        Versión nueva.
+    """
+    parts = []
+    for op in delta:
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            start, length = op
+            parts.append(old[start:start + length])
+    return ''.join(parts)
+
+
+def encode_delta(delta: Delta) -> bytes:
+    """Serializa una delta como JSON compacto en UTF-8."""
+    return json.dumps(delta, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def decode_delta(data: bytes) -> Delta:
+    """Deserializa una delta guardada con encode_delta."""
+    return json.loads(data.decode('utf-8') if isinstance(data, bytes) else data)
+
+
+def unified_diff(old: str, new: str, old_label: str = 'anterior',
+                 new_label: str = 'nueva') -> str:
+    """
+    Devuelve la diferencia entre dos textos en formato unificado, por líneas.
+
+    Args:
+        old: Texto anterior.
+        new: Texto nuevo.
+        old_label: Nombre del texto anterior en la cabecera.
+        new_label: Nombre del texto nuevo en la cabecera.
+
+    Returns:
+        Diferencia unificada (vacía si los textos son iguales).
+    """
+    def lines(text: str) -> list[str]:
+        result = text.splitlines(keepends=True)
+        if result and not result[-1].endswith('\n'):
+            result[-1] += '\n'
+        return result
+
+    return ''.join(difflib.unified_diff(lines(old), lines(new),
+                                        fromfile=old_label, tofile=new_label))
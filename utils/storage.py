@@ -0,0 +1,874 @@
+"""
+Módulo de almacenamiento de borradores para el Asistente de Escritura.
+
+Este módulo persiste los borradores en una base de datos SQLite embebida en
+modo WAL. Las escrituras pasan por una cola de escritura diferida que agrupa
+varios guardados en una sola transacción, de modo que la interfaz no espera
+a que el disco confirme cada guardado. Si una transacción falla, el error se
+informa en el siguiente guardado o flush().
+
+Los documentos versionados guardan cada versión como una delta respecto a la
+anterior (utils.delta), con una instantánea completa cada cierto número de
+versiones para acotar la reconstrucción. El texto de la última versión se
+guarda aparte, por lo que leerla no requiere aplicar deltas.
+
+Los borradores y la última versión de cada documento se indexan en una tabla
+FTS5 sin contenido (índice invertido, sin copia del texto) que mantienen
+disparadores de SQLite en cada inserción, actualización y borrado. La
+búsqueda ignora mayúsculas y tildes, se limita a los textos del usuario y
+ordena por BM25.
+"""
+
+import atexit
+import os
+import queue
+import sqlite3
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Optional
+
+from utils.delta import apply_delta, decode_delta, encode_delta, make_delta, unified_diff
+
+
+DEFAULT_DB_PATH = os.path.join('data', 'drafts.db')
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS drafts ('
+    'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+    'user_id TEXT NOT NULL, '
+    'text TEXT NOT NULL, '
+    'created_at REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS drafts_user_created ON drafts(user_id, created_at)',
+    'CREATE TABLE IF NOT EXISTS documents ('
+    'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+    'user_id TEXT NOT NULL, '
+    'title TEXT NOT NULL, '
+    'latest_text TEXT NOT NULL, '
+    'latest_version INTEGER NOT NULL, '
+    'snapshot_version INTEGER NOT NULL, '
+    'created_at REAL NOT NULL, '
+    'updated_at REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS documents_user_updated ON documents(user_id, updated_at)',
+    'CREATE TABLE IF NOT EXISTS document_versions ('
+    'document_id INTEGER NOT NULL, '
+    'version INTEGER NOT NULL, '
+    'kind TEXT NOT NULL, '
+    'data BLOB NOT NULL, '
+    'chars INTEGER NOT NULL, '
+    'created_at REAL NOT NULL, '
+    'PRIMARY KEY (document_id, version)) WITHOUT ROWID',
+)
+
+# Índice de búsqueda. rowid = 2 * id para borradores y 2 * id + 1 para
+# documentos; user_key es el usuario en hexadecimal (un único token exacto),
+# de modo que cada consulta recorre solo las listas de ese usuario.
+SEARCH_SCHEMA = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS draft_search USING fts5('
+    'user_key, body, content=\'\', '
+    'tokenize=\'unicode61 remove_diacritics 2\', prefix=\'2 3\')',
+    'CREATE TRIGGER IF NOT EXISTS drafts_search_insert AFTER INSERT ON drafts BEGIN '
+    'INSERT INTO draft_search (rowid, user_key, body) '
+    'VALUES (new.id * 2, \'u\' || hex(new.user_id), new.text); END',
+    'CREATE TRIGGER IF NOT EXISTS drafts_search_delete AFTER DELETE ON drafts BEGIN '
+    'INSERT INTO draft_search (draft_search, rowid, user_key, body) '
+    'VALUES (\'delete\', old.id * 2, \'u\' || hex(old.user_id), old.text); END',
+    'CREATE TRIGGER IF NOT EXISTS documents_search_insert AFTER INSERT ON documents BEGIN '
+    'INSERT INTO draft_search (rowid, user_key, body) '
+    'VALUES (new.id * 2 + 1, \'u\' || hex(new.user_id), new.latest_text); END',
+    'CREATE TRIGGER IF NOT EXISTS documents_search_update AFTER UPDATE OF latest_text '
+    'ON documents WHEN old.latest_text <> new.latest_text BEGIN '
+    'INSERT INTO draft_search (draft_search, rowid, user_key, body) '
+    'VALUES (\'delete\', old.id * 2 + 1, \'u\' || hex(old.user_id), old.latest_text); '
+    'INSERT INTO draft_search (rowid, user_key, body) '
+    'VALUES (new.id * 2 + 1, \'u\' || hex(new.user_id), new.latest_text); END',
+    'CREATE TRIGGER IF NOT EXISTS documents_search_delete AFTER DELETE ON documents BEGIN '
+    'INSERT INTO draft_search (draft_search, rowid, user_key, body) '
+    'VALUES (\'delete\', old.id * 2 + 1, \'u\' || hex(old.user_id), old.latest_text); END',
+)
+# Indexa los textos guardados antes de que existiera el índice.
+BACKFILL_SEARCH = (
+    'INSERT INTO draft_search (rowid, user_key, body) '
+    'SELECT id * 2, \'u\' || hex(user_id), text FROM drafts',
+    'INSERT INTO draft_search (rowid, user_key, body) '
+    'SELECT id * 2 + 1, \'u\' || hex(user_id), latest_text FROM documents',
+)
+SEARCH_INDEX_EXISTS = ('SELECT 1 FROM sqlite_master '
+                       'WHERE type = \'table\' AND name = \'draft_search\'')
+
+# Tipos de versión: texto completo comprimido o delta respecto a la anterior.
+SNAPSHOT = 'snapshot'
+DELTA = 'delta'
+# Versiones máximas entre instantáneas (acota las deltas a aplicar al leer).
+SNAPSHOT_INTERVAL = 20
+
+INSERT_DRAFT = 'INSERT INTO drafts (user_id, text, created_at) VALUES (?, ?, ?)'
+SELECT_USER_DRAFTS = (
+    'SELECT id, user_id, text, created_at FROM drafts '
+    'WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?'
+)
+SELECT_DRAFT = 'SELECT id, user_id, text, created_at FROM drafts WHERE id = ?'
+DELETE_DRAFT = 'DELETE FROM drafts WHERE id = ?'
+
+INSERT_DOCUMENT = (
+    'INSERT INTO documents (user_id, title, latest_text, latest_version, snapshot_version, '
+    'created_at, updated_at) VALUES (?, ?, ?, 0, 0, ?, ?)'
+)
+SELECT_DOCUMENT = (
+    'SELECT id, user_id, title, latest_text, latest_version, snapshot_version, created_at, '
+    'updated_at FROM documents WHERE id = ? AND user_id = ?'
+)
+SELECT_USER_DOCUMENTS = (
+    'SELECT id, user_id, title, latest_text, latest_version, snapshot_version, created_at, '
+    'updated_at FROM documents WHERE user_id = ? ORDER BY updated_at DESC, id DESC LIMIT ?'
+)
+UPDATE_DOCUMENT = (
+    'UPDATE documents SET latest_text = ?, latest_version = ?, snapshot_version = ?, '
+    'updated_at = ? WHERE id = ?'
+)
+INSERT_VERSION = (
+    'INSERT INTO document_versions (document_id, version, kind, data, chars, created_at) '
+    'VALUES (?, ?, ?, ?, ?, ?)'
+)
+SELECT_VERSIONS = (
+    'SELECT version, kind, length(data), chars, created_at FROM document_versions '
+    'WHERE document_id = ? ORDER BY version DESC'
+)
+# Instantánea más cercana y deltas hasta la versión pedida, en orden.
+DELETE_VERSIONS = 'DELETE FROM document_versions WHERE document_id = ?'
+DELETE_DOCUMENT = 'DELETE FROM documents WHERE id = ? AND user_id = ?'
+# Pesos de BM25 por columna: user_key solo filtra, no puntúa.
+SEARCH = (
+    'SELECT rowid, bm25(draft_search, 0.0, 1.0) AS score FROM draft_search '
+    'WHERE draft_search MATCH ? ORDER BY score LIMIT ?'
+)
+SELECT_DRAFTS_BY_ID = 'SELECT id, user_id, text, created_at FROM drafts WHERE id IN ({})'
+SELECT_DOCUMENTS_BY_ID = (
+    'SELECT id, user_id, title, latest_text, latest_version, snapshot_version, created_at, '
+    'updated_at FROM documents WHERE id IN ({})'
+)
+
+WORD_RE = re.compile(r'\w+')
+
+SELECT_VERSION_CHAIN = (
+    'SELECT version, kind, data, chars FROM document_versions '
+    'WHERE document_id = ? AND version <= ? AND version >= ('
+    'SELECT max(version) FROM document_versions '
+    'WHERE document_id = ? AND version <= ? AND kind = \'snapshot\') '
+    'ORDER BY version'
+)
+
+
+def _row_to_dict(row: tuple) -> dict:
+    return {'id': row[0], 'user_id': row[1], 'text': row[2], 'created_at': row[3]}
+
+
+def _document_to_dict(row: tuple) -> dict:
+    return {'id': row[0], 'user_id': row[1], 'title': row[2], 'text': row[3],
+            'version': row[4], 'created_at': row[6], 'updated_at': row[7]}
+
+
+def _fold(text: str) -> str:
+    """Minúsculas y sin tildes, conservando la longitud (una letra por letra)."""
+    return ''.join(unicodedata.normalize('NFD', char)[0] for char in text.lower())
+
+
+def build_search_query(user_id: str, query: str) -> Optional[str]:
+    """
+    Construye la expresión MATCH de FTS5 para una búsqueda de un usuario.
+
+    Cada palabra de la consulta se busca como prefijo (todas deben aparecer)
+    y solo entre los textos del usuario.
+
+    Args:
+        user_id: Identificador del usuario.
+        query: Texto de búsqueda libre.
+
+    Returns:
+        Expresión MATCH, o None si la consulta no tiene palabras.
+    """
+    words = WORD_RE.findall(query)
+    if not words:
+        return None
+    user_key = 'u' + user_id.encode('utf-8').hex().upper()
+    terms = ' '.join(f'"{word}"*' for word in words)
+    return f'user_key : "{user_key}" AND body : ({terms})'
+
+
+def _snippet(text: str, query: str, width: int = 120) -> str:
+    """Devuelve un fragmento del texto alrededor de la primera palabra buscada."""
+    folded = _fold(text)
+    positions = [folded.find(_fold(word)) for word in WORD_RE.findall(query)]
+    positions = [position for position in positions if position >= 0]
+    start = max(0, min(positions) - width // 3) if positions else 0
+    snippet = ' '.join(text[start:start + width].split())
+    return ('...' if start > 0 else '') + snippet + ('...' if start + width < len(text) else '')
+
+
+def _title(text: str, length: int = 60) -> str:
+    first_line = text.strip().split('\n', 1)[0].strip()
+    return first_line[:length] + ('...' if len(first_line) > length else '')
+
+
+@dataclass
+class _VersionWrite:
+    """Versión de documento encolada para el hilo escritor."""
+    user_id: str
+    text: str
+    document_id: Optional[int]
+    title: Optional[str]
+    created_at: float
+    result: Future = field(default_factory=Future)
+
+
+class DraftStore:
+    """
+    Almacén de borradores sobre SQLite con escritura diferida.
+
+    Hay una única conexión de escritura, usada por el hilo escritor, y una
+    conexión de lectura por hilo. Las sentencias SQL son constantes, por lo
+    que sqlite3 las reutiliza preparadas desde su caché de sentencias.
+
+    Attributes:
+        path (str): Ruta del archivo de base de datos.
+        batch_size (int): Guardados máximos por transacción.
+        flush_interval (float): Segundos máximos que un guardado espera en la cola.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_DB_PATH,
+        batch_size: int = 100,
+        flush_interval: float = 0.05
+    ) -> None:
+        """
+        Abre (o crea) la base de datos y arranca el hilo escritor.
+
+        Args:
+            path: Ruta del archivo SQLite.
+            batch_size: Guardados máximos por transacción.
+            flush_interval: Segundos que el escritor espera para agrupar guardados.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._write_conn = self._connect()
+        for statement in SCHEMA:
+            self._write_conn.execute(statement)
+        indexed = self._write_conn.execute(SEARCH_INDEX_EXISTS).fetchone() is not None
+        for statement in SEARCH_SCHEMA:
+            self._write_conn.execute(statement)
+        if not indexed:
+            for statement in BACKFILL_SEARCH:
+                self._write_conn.execute(statement)
+        self._write_conn.commit()
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._queue: queue.Queue = queue.Queue()
+        # Último lote que no se pudo confirmar: (guardados perdidos, error).
+        self._write_error: Optional[tuple[int, sqlite3.Error]] = None
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name='draft-writer',
+                                        daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=64)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _read_conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    next_item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if next_item is None:
+                    self._queue.put(None)
+                    self._queue.task_done()
+                    break
+                batch.append(next_item)
+            drafts = [item for item in batch if not isinstance(item, _VersionWrite)]
+            try:
+                if drafts:
+                    with self._write_lock:
+                        self._write_conn.executemany(INSERT_DRAFT, drafts)
+                        self._write_conn.commit()
+            except sqlite3.Error as e:
+                with self._write_lock:
+                    lost = len(drafts) + (self._write_error[0] if self._write_error else 0)
+                    self._write_error = (lost, e)
+            try:
+                # Las versiones se escriben una a una y en orden: cada delta
+                # depende de la versión anterior confirmada.
+                for item in batch:
+                    if isinstance(item, _VersionWrite):
+                        try:
+                            item.result.set_result(self._write_version(item))
+                        except Exception as e:
+                            item.result.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _raise_write_error(self) -> None:
+        """Lanza, una sola vez, el fallo pendiente del hilo escritor."""
+        with self._write_lock:
+            pending, self._write_error = self._write_error, None
+        if pending is not None:
+            lost, error = pending
+            raise RuntimeError(f"No se pudieron guardar {lost} borradores: {error}") from error
+
+    def save(self, user_id: str, text: str) -> None:
+        """
+        Encola un borrador para guardarlo sin bloquear al llamador.
+
+        Args:
+            user_id: Identificador único del usuario.
+            text: Contenido del borrador.
+
+        Raises:
+            RuntimeError: Si el almacén está cerrado o si falló la confirmación
+                de un lote anterior (este borrador no se encola).
+        """
+        if self._closed:
+            raise RuntimeError("El almacén de borradores está cerrado")
+        self._raise_write_error()
+        self._queue.put((user_id, text, time.time()))
+
+    def flush(self) -> None:
+        """
+        Espera a que todos los guardados encolados estén confirmados.
+
+        Raises:
+            RuntimeError: Si algún lote no se pudo confirmar desde el último aviso.
+        """
+        self._queue.join()
+        self._raise_write_error()
+
+    def load(self, user_id: str, limit: int = 50) -> list[dict]:
+        """
+        Devuelve los borradores de un usuario, del más reciente al más antiguo.
+
+        Args:
+            user_id: Identificador del usuario.
+            limit: Número máximo de borradores.
+
+        Returns:
+            Lista de diccionarios con 'id', 'user_id', 'text' y 'created_at'.
+        """
+        self._queue.join()
+        rows = self._read_conn().execute(SELECT_USER_DRAFTS, (user_id, limit)).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def get(self, draft_id: int) -> Optional[dict]:
+        """
+        Devuelve un borrador por su identificador.
+
+        Args:
+            draft_id: Identificador del borrador.
+
+        Returns:
+            Diccionario del borrador, o None si no existe.
+        """
+        self._queue.join()
+        row = self._read_conn().execute(SELECT_DRAFT, (draft_id,)).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def delete(self, draft_id: int) -> bool:
+        """
+        Elimina un borrador.
+
+        Args:
+            draft_id: Identificador del borrador.
+
+        Returns:
+            True si el borrador existía y se eliminó.
+        """
+        self._queue.join()
+        with self._write_lock:
+            cursor = self._write_conn.execute(DELETE_DRAFT, (draft_id,))
+            self._write_conn.commit()
+        return cursor.rowcount > 0
+
+    def search(self, user_id: str, query: str, limit: int = 10) -> list[dict]:
+        """
+        Busca entre los borradores y documentos de un usuario.
+
+        Args:
+            user_id: Identificador del usuario.
+            query: Palabras a buscar (sin distinguir mayúsculas ni tildes;
+                cada una coincide también como prefijo).
+            limit: Número máximo de resultados.
+
+        Returns:
+            Lista ordenada por relevancia (BM25) de diccionarios con 'source'
+            ('draft' o 'document'), 'id', 'title', 'text', 'snippet', 'score'
+            y 'updated_at'.
+        """
+        expression = build_search_query(user_id, query)
+        if expression is None:
+            return []
+        self._queue.join()
+        conn = self._read_conn()
+        hits = conn.execute(SEARCH, (expression, limit)).fetchall()
+        draft_ids = [rowid // 2 for rowid, _ in hits if rowid % 2 == 0]
+        document_ids = [rowid // 2 for rowid, _ in hits if rowid % 2 == 1]
+        rows = {}
+        if draft_ids:
+            placeholders = ','.join('?' * len(draft_ids))
+            for row in conn.execute(SELECT_DRAFTS_BY_ID.format(placeholders), draft_ids):
+                rows[row[0] * 2] = {'source': 'draft', 'id': row[0], 'user_id': row[1],
+                                    'title': _title(row[2]), 'text': row[2],
+                                    'updated_at': row[3]}
+        if document_ids:
+            placeholders = ','.join('?' * len(document_ids))
+            for row in conn.execute(SELECT_DOCUMENTS_BY_ID.format(placeholders), document_ids):
+                rows[row[0] * 2 + 1] = {'source': 'document', 'id': row[0], 'user_id': row[1],
+                                        'title': row[2], 'text': row[3], 'updated_at': row[7]}
+        results = []
+        for rowid, score in hits:
+            row = rows.get(rowid)
+            if row is None or row.pop('user_id') != user_id:
+                continue
+            row['snippet'] = _snippet(row['text'], query)
+            # bm25() es negativo y menor cuanto más relevante.
+            row['score'] = -score
+            results.append(row)
+        return results
+
+    def delete_document(self, user_id: str, document_id: int) -> bool:
+        """
+        Elimina un documento y todas sus versiones.
+
+        Args:
+            user_id: Identificador del usuario.
+            document_id: Identificador del documento.
+
+        Returns:
+            True si el documento existía y se eliminó.
+        """
+        with self._write_lock:
+            with self._write_conn as conn:
+                cursor = conn.execute(DELETE_DOCUMENT, (document_id, user_id))
+                if cursor.rowcount:
+                    conn.execute(DELETE_VERSIONS, (document_id,))
+        return cursor.rowcount > 0
+
+    def save_version(
+        self,
+        user_id: str,
+        text: str,
+        document_id: Optional[int] = None,
+        title: Optional[str] = None
+    ) -> dict:
+        """
+        Guarda una nueva versión de un documento.
+
+        La versión se guarda como delta respecto a la anterior, salvo la
+        primera, cada SNAPSHOT_INTERVAL versiones y cuando la delta no es menor
+        que la instantánea comprimida (reescrituras casi completas). La
+        escribe el hilo escritor, como los borradores de save(), pero la
+        llamada espera a que se confirme para devolver el número de versión.
+
+        Args:
+            user_id: Identificador del usuario.
+            text: Contenido de la versión.
+            document_id: Documento al que pertenece (None para crear uno nuevo).
+            title: Título del documento nuevo (por defecto, su primera línea).
+
+        Returns:
+            Diccionario con 'document_id', 'version', 'kind' (SNAPSHOT o DELTA),
+            'stored_bytes' y 'unchanged' (True si el texto era igual al de la
+            última versión y no se guardó nada).
+
+        Raises:
+            KeyError: Si el documento no existe o es de otro usuario.
+        """
+        if self._closed:
+            raise RuntimeError("El almacén de borradores está cerrado")
+        write = _VersionWrite(user_id, text, document_id, title, time.time())
+        self._queue.put(write)
+        return write.result.result()
+
+    def _write_version(self, write: _VersionWrite) -> dict:
+        """Escribe una versión encolada por save_version (en el hilo escritor)."""
+        user_id, text, document_id, title, now = (write.user_id, write.text, write.document_id,
+                                                  write.title, write.created_at)
+        with self._write_lock:
+            conn = self._write_conn
+            with conn:
+                if document_id is None:
+                    cursor = conn.execute(INSERT_DOCUMENT,
+                                          (user_id, title or _title(text) or 'Sin título',
+                                           text, now, now))
+                    document_id = cursor.lastrowid
+                row = conn.execute(SELECT_DOCUMENT, (document_id, user_id)).fetchone()
+                if row is None:
+                    raise KeyError(f"Documento no encontrado: {document_id}")
+                previous, latest, snapshot = row[3], row[4], row[5]
+                if latest and previous == text:
+                    return {'document_id': document_id, 'version': latest, 'kind': None,
+                            'stored_bytes': 0, 'unchanged': True}
+
+                version = latest + 1
+                kind, data = SNAPSHOT, zlib.compress(text.encode('utf-8'))
+                if latest and version - snapshot < SNAPSHOT_INTERVAL:
+                    delta = encode_delta(make_delta(previous, text))
+                    if len(delta) < len(data):
+                        kind, data = DELTA, delta
+                if kind == SNAPSHOT:
+                    snapshot = version
+                conn.execute(INSERT_VERSION, (document_id, version, kind, data, len(text), now))
+                conn.execute(UPDATE_DOCUMENT, (text, version, snapshot, now, document_id))
+        return {'document_id': document_id, 'version': version, 'kind': kind,
+                'stored_bytes': len(data), 'unchanged': False}
+
+    def list_documents(self, user_id: str, limit: int = 50) -> list[dict]:
+        """
+        Devuelve los documentos versionados de un usuario, del más reciente al más antiguo.
+
+        Args:
+            user_id: Identificador del usuario.
+            limit: Número máximo de documentos.
+
+        Returns:
+            Lista de diccionarios con 'id', 'user_id', 'title', 'text' (última
+            versión), 'version' (número de la última), 'created_at' y 'updated_at'.
+        """
+        rows = self._read_conn().execute(SELECT_USER_DOCUMENTS, (user_id, limit)).fetchall()
+        return [_document_to_dict(row) for row in rows]
+
+    def list_versions(self, user_id: str, document_id: int) -> list[dict]:
+        """
+        Devuelve las versiones de un documento, de la más reciente a la más antigua.
+
+        Args:
+            user_id: Identificador del usuario.
+            document_id: Identificador del documento.
+
+        Returns:
+            Lista de diccionarios con 'version', 'kind', 'stored_bytes',
+            'chars' y 'created_at'; vacía si el documento no existe o es de
+            otro usuario.
+        """
+        conn = self._read_conn()
+        if conn.execute(SELECT_DOCUMENT, (document_id, user_id)).fetchone() is None:
+            return []
+        return [{'version': row[0], 'kind': row[1], 'stored_bytes': row[2], 'chars': row[3],
+                 'created_at': row[4]}
+                for row in conn.execute(SELECT_VERSIONS, (document_id,))]
+
+    def get_version(
+        self,
+        user_id: str,
+        document_id: int,
+        version: Optional[int] = None
+    ) -> Optional[str]:
+        """
+        Devuelve el texto de una versión de un documento.
+
+        La última versión se lee directamente; las anteriores se reconstruyen
+        desde la instantánea más cercana aplicando como mucho
+        SNAPSHOT_INTERVAL - 1 deltas.
+
+        Args:
+            user_id: Identificador del usuario.
+            document_id: Identificador del documento.
+            version: Número de versión (None para la última).
+
+        Returns:
+            Texto de la versión, o None si no existe.
+        """
+        conn = self._read_conn()
+        row = conn.execute(SELECT_DOCUMENT, (document_id, user_id)).fetchone()
+        if row is None:
+            return None
+        if version is None or version == row[4]:
+            return row[3] if row[4] else None
+        if not 1 <= version < row[4]:
+            return None
+        text = None
+        for _, kind, data, chars in conn.execute(
+                SELECT_VERSION_CHAIN, (document_id, version, document_id, version)):
+            if kind == SNAPSHOT:
+                text = zlib.decompress(data).decode('utf-8')
+            else:
+                text = apply_delta(text, decode_delta(data))
+            if len(text) != chars:
+                raise ValueError(f"Versión dañada del documento {document_id}")
+        return text
+
+    def diff_versions(
+        self,
+        user_id: str,
+        document_id: int,
+        old_version: int,
+        new_version: Optional[int] = None
+    ) -> Optional[str]:
+        """
+        Devuelve la diferencia entre dos versiones de un documento.
+
+        Args:
+            user_id: Identificador del usuario.
+            document_id: Identificador del documento.
+            old_version: Versión anterior.
+            new_version: Versión nueva (None para la última).
+
+        Returns:
+            Diferencia en formato unificado por líneas (vacía si son
+            iguales), o None si alguna versión no existe.
+        """
+        old = self.get_version(user_id, document_id, old_version)
+        new = self.get_version(user_id, document_id, new_version)
+        if old is None or new is None:
+            return None
+        return unified_diff(old, new, f'v{old_version}',
+                            f'v{new_version}' if new_version is not None else 'última')
+
+    def close(self) -> None:
+        """Vacía la cola, detiene el hilo escritor y cierra la conexión."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        with self._write_lock:
+            self._write_conn.close()
+
+
+_store: Optional[DraftStore] = None
+_store_pid: Optional[int] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> DraftStore:
+    """
+    Devuelve el almacén de borradores del proceso.
+
+    La ruta se toma de la variable de entorno DRAFTS_DB. Si el proceso se
+    bifurca, el hijo abre sus propias conexiones.
+
+    Returns:
+        Instancia de DraftStore compartida por el proceso.
+    """
+    global _store, _store_pid
+    with _store_lock:
+        if _store is None or _store_pid != os.getpid():
+            _store = DraftStore(os.getenv('DRAFTS_DB', DEFAULT_DB_PATH))
+            _store_pid = os.getpid()
+            atexit.register(_store.close)
+        return _store
+
+
+def save_draft_to_db(user_id: str, text: str) -> bool:
+    """
+    Guarda un borrador en la base de datos.
+
+    El guardado se encola y se confirma en segundo plano junto con otros
+    guardados, por lo que la llamada vuelve de inmediato. Si falló la
+    confirmación de guardados anteriores, se informa aquí y este borrador
+    no se encola.
+
+    Args:
+        user_id: Identificador único del usuario.
+        text: Contenido del borrador a guardar.
+
+    Returns:
+        True si el borrador se aceptó para guardarse; False si hubo un error,
+        propio o de un lote anterior.
+    """
+    try:
+        get_store().save(user_id, text)
+        return True
+
+    except Exception as e:
+        print(f"❌ Error al guardar el borrador: {str(e)}\n")
+        return False
+
+
+def load_drafts(user_id: str, limit: int = 50) -> list[dict]:
+    """
+    Devuelve los borradores de un usuario, del más reciente al más antiguo.
+
+    Args:
+        user_id: Identificador del usuario.
+        limit: Número máximo de borradores.
+
+    Returns:
+        Lista de diccionarios con 'id', 'user_id', 'text' y 'created_at'.
+    """
+    return get_store().load(user_id, limit)
+
+
+def get_draft(draft_id: int) -> Optional[dict]:
+    """
+    Devuelve un borrador por su identificador.
+
+    Args:
+        draft_id: Identificador del borrador.
+
+    Returns:
+        Diccionario del borrador, o None si no existe.
+    """
+    return get_store().get(draft_id)
+
+
+def delete_draft(draft_id: int) -> bool:
+    """
+    Elimina un borrador.
+
+    Args:
+        draft_id: Identificador del borrador.
+
+    Returns:
+        True si el borrador existía y se eliminó.
+    """
+    return get_store().delete(draft_id)
+
+
+def save_document_version(
+    user_id: str,
+    text: str,
+    document_id: Optional[int] = None,
+    title: Optional[str] = None
+) -> dict:
+    """
+    Guarda una nueva versión de un documento como delta de la anterior.
+
+    Args:
+        user_id: Identificador del usuario.
+        text: Contenido de la versión.
+        document_id: Documento al que pertenece (None para crear uno nuevo).
+        title: Título del documento nuevo (por defecto, su primera línea).
+
+    Returns:
+        Diccionario con 'document_id', 'version', 'kind', 'stored_bytes' y
+        'unchanged'.
+    """
+    return get_store().save_version(user_id, text, document_id, title)
+
+
+def list_documents(user_id: str, limit: int = 50) -> list[dict]:
+    """
+    Devuelve los documentos versionados de un usuario, del más reciente al más antiguo.
+
+    Args:
+        user_id: Identificador del usuario.
+        limit: Número máximo de documentos.
+
+    Returns:
+        Lista de diccionarios con 'id', 'title', 'text' (última versión) y 'version'.
+    """
+    return get_store().list_documents(user_id, limit)
+
+
+def list_versions(user_id: str, document_id: int) -> list[dict]:
+    """
+    Devuelve las versiones de un documento, de la más reciente a la más antigua.
+
+    Args:
+        user_id: Identificador del usuario.
+        document_id: Identificador del documento.
+
+    Returns:
+        Lista de diccionarios con 'version', 'kind', 'stored_bytes', 'chars'
+        y 'created_at'.
+    """
+    return get_store().list_versions(user_id, document_id)
+
+
+def get_document_version(
+    user_id: str,
+    document_id: int,
+    version: Optional[int] = None
+) -> Optional[str]:
+    """
+    Devuelve el texto de una versión de un documento (la última si version es None).
+
+    Args:
+        user_id: Identificador del usuario.
+        document_id: Identificador del documento.
+        version: Número de versión.
+
+    Returns:
+        Texto de la versión, o None si no existe.
+    """
+    return get_store().get_version(user_id, document_id, version)
+
+
+def diff_document_versions(
+    user_id: str,
+    document_id: int,
+    old_version: int,
+    new_version: Optional[int] = None
+) -> Optional[str]:
+    """
+    Devuelve la diferencia unificada entre dos versiones de un documento.
+
+    Args:
+        user_id: Identificador del usuario.
+        document_id: Identificador del documento.
+        old_version: Versión anterior.
+        new_version: Versión nueva (None para la última).
+
+    Returns:
+        Diferencia en formato unificado, o None si alguna versión no existe.
+    """
+    return get_store().diff_versions(user_id, document_id, old_version, new_version)
+
+
+def search_drafts(user_id: str, query: str, limit: int = 10) -> list[dict]:
+    """
+    Busca entre los borradores y documentos de un usuario por palabras clave.
+
+    Args:
+        user_id: Identificador del usuario.
+        query: Palabras a buscar (sin distinguir mayúsculas ni tildes).
+        limit: Número máximo de resultados.
+
+    Returns:
+        Lista ordenada por relevancia de diccionarios con 'source', 'id',
+        'title', 'text', 'snippet', 'score' y 'updated_at'.
+    """
+    return get_store().search(user_id, query, limit)
+
+
+def delete_document(user_id: str, document_id: int) -> bool:
+    """
+    Elimina un documento y todas sus versiones.
+
+    Args:
+        user_id: Identificador del usuario.
+        document_id: Identificador del documento.
+
+    Returns:
+        True si el documento existía y se eliminó.
+    """
+    return get_store().delete_document(user_id, document_id)
@@ -4,6 +4,7 @@ Script de validación para verificar la estructura del proyecto.
 Este script comprueba que todos los archivos y dependencias estén correctamente configurados.
 """
 
+import importlib.util
 import os
 import sys
 from pathlib import Path
@@ -23,6 +24,8 @@ def check_project_structure() -> bool:
         'README.md',
         'services/ai_service.py',
         'services/__init__.py',
+        'utils/delta.py',
+        'utils/storage.py',
         'utils/storage_mock.py',
         'utils/__init__.py',
     ]
@@ -45,6 +48,9 @@ def check_dependencies() -> bool:
     """
     Verifica que las dependencias requeridas estén instaladas.
     
+    Solo se localizan los paquetes, sin importarlos, para no pagar el coste
+    de cargar el SDK de Gemini en cada validación.
+    
     Returns:
         True si todas las dependencias están instaladas.
     """
@@ -54,13 +60,14 @@ def check_dependencies() -> bool:
     all_valid = True
     
     for package in required_packages:
+        module = 'google.generativeai' if package == 'google' else package.replace('-', '_')
         try:
-            if package == 'google':
-                import google.generativeai
-            else:
-                __import__(package.replace('-', '_'))
-            print(f"✅ {package}")
+            found = importlib.util.find_spec(module) is not None
         except ImportError:
+            found = False
+        if found:
+            print(f"✅ {package}")
+        else:
             print(f"❌ {package} - NO INSTALADO")
             if package == 'google':
                 print(f"   Ejecuta: pip install google-generativeai")
@@ -98,6 +105,34 @@ def check_env_configuration() -> bool:
         return False
 
 
+def check_import_profile() -> bool:
+    """
+    Muestra el perfil de importación del servicio de IA.
+    
+    Ejecuta `python -X importtime` en un intérprete nuevo y avisa si importar
+    services.ai_service carga el SDK de Gemini, que debe cargarse solo en la
+    primera llamada al modelo.
+    
+    Returns:
+        True si el SDK no se carga al importar el servicio.
+    """
+    print("\n\n⏱️  Perfil de importación (services.ai_service)...\n")
+    
+    from benchmarks.startup import SDK_MODULE, import_profile
+    
+    profile = import_profile(['-c', 'import services.ai_service'])
+    print(f"   {profile['import_ms']:.0f} ms en importaciones, "
+          f"{profile['modules']} módulos")
+    for entry in profile['top']:
+        print(f"   {entry['ms']:8.1f} ms  {entry['module']}")
+    
+    if profile['sdk_loaded']:
+        print(f"❌ {SDK_MODULE} se importa al arrancar; debe importarse al crear el modelo")
+        return False
+    print(f"✅ {SDK_MODULE} no se importa hasta la primera llamada")
+    return True
+
+
 def main() -> None:
     """
     Ejecuta todas las validaciones.
@@ -109,10 +144,11 @@ def main() -> None:
     structure_valid = check_project_structure()
     dependencies_valid = check_dependencies()
     env_valid = check_env_configuration()
+    profile_valid = '--no-profile' in sys.argv[1:] or check_import_profile()
     
     print("\n" + "="*60)
     
-    if structure_valid and dependencies_valid and env_valid:
+    if structure_valid and dependencies_valid and env_valid and profile_valid:
         print("\n✅ ¡TODO ESTÁ LISTO! Puedes ejecutar:")
         print("\n   streamlit run app.py\n")
     else: